@@ -5,7 +5,11 @@ to enable easy management through the Django admin interface.
 
 
 from django.contrib import admin
-from app.models import Comments,Post, Tag, Profile, WebSiteMeta, Category, Transaction
+from app.models import (
+    Comments, Post, Tag, Profile, WebSiteMeta, Category, Transaction,
+    UserTransactionSummary, MonthlyTransactionSummary, DailyTransactionRollup,
+    ExchangeRateSnapshot, ExchangeRate,
+)
 
 # Register models with the Django admin site
 admin.site.register(Post)
@@ -15,3 +19,8 @@ admin.site.register(Profile)
 admin.site.register(WebSiteMeta)
 admin.site.register(Category)
 admin.site.register(Transaction)
+admin.site.register(UserTransactionSummary)
+admin.site.register(MonthlyTransactionSummary)
+admin.site.register(DailyTransactionRollup)
+admin.site.register(ExchangeRateSnapshot)
+admin.site.register(ExchangeRate)
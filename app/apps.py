@@ -2,7 +2,8 @@
 App configuration for the 'app' Django application.
 
 This module defines the configuration for the 'app' app, including the default
-auto field type for model primary keys.
+auto field type for model primary keys and the registration of signal handlers
+and system checks.
 """
 
 
@@ -16,3 +17,10 @@ class AppConfig(AppConfig):
 
     # Define the name of the app, which Django uses for routing and configuration
     name = "app"
+
+    def ready(self):
+        """
+        Connect the signal handlers and register the system checks of the app.
+        """
+
+        from app import checks, signals  # noqa: F401
@@ -0,0 +1,56 @@
+"""
+Module with the system checks of the app.
+
+The buffered post views (`app/view_counter.py`), the per-user reaction sets
+(`app/reactions.py`), the rendered comment threads (`app/comments.py`) and
+the exchange rates (`app/utils.py`, `app/rate_history.py`) are kept in
+Django's cache and invalidated there. With a per-process backend each worker
+has its own copy: views buffered by one worker are never flushed by the
+`flush_view_counts` command and are lost when the worker restarts, and an
+invalidation only reaches the worker that made it. A deployment therefore
+needs a cache shared by all processes (Redis or memcached), which
+`manage.py check --deploy` enforces.
+"""
+
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Cache backends whose data only lives in the current process
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """
+    Returns whether a cache is shared by all processes.
+
+    Args:
+        alias (str, optional): The alias of the cache in `settings.CACHES`.
+
+    Returns:
+        bool: False for the in-memory and dummy backends.
+    """
+
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Fails the deployment checks if the default cache is not shared by the worker processes.
+    """
+
+    if cache_is_shared():
+        return []
+    return [
+        Error(
+            'The default cache is local to each process.',
+            hint='Set CACHE_URL to a shared cache, e.g. redis://host:6379/0.',
+            obj='CACHES',
+            id='app.E001',
+        )
+    ]
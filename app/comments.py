@@ -0,0 +1,172 @@
+"""
+Module to load and render the comment thread of a post.
+
+All comments of a post are fetched with a single query and assembled into a
+tree in memory, so replies can be nested to any depth without a query per
+comment. The tree is flattened into display order and rendered by a single
+template loop, which closes the markup of each reply level as it goes, so deep
+threads never recurse in the template engine. The rendered thread is cached
+per post in the shared cache and dropped whenever a comment of the post is
+saved or deleted (see `app/signals.py`); it also expires after
+`settings.COMMENT_THREAD_CACHE_TIMEOUT` seconds.
+
+The cached HTML contains a placeholder instead of the CSRF token of the reply
+forms, which is replaced with the token of the current request when the
+thread is served.
+"""
+
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from app.forms import CommentForm
+from app.instrumentation import record_cache
+from app.models import Comments
+
+
+CACHE_KEY_PREFIX = 'comment_thread'
+
+# Stands in for the CSRF token in the cached HTML
+CSRF_PLACEHOLDER = '__comment_thread_csrf_token__'
+
+
+class CommentNode:
+    """
+    A comment with its replies, holding only the fields the thread shows.
+
+    `closes` is set by `flatten()`: the levels of markup to close after the comment.
+    """
+
+    __slots__ = ('id', 'name', 'date', 'content', 'depth', 'replies', 'closes')
+
+    def __init__(self, id, name, date, content):
+        self.id = id
+        self.name = name
+        self.date = date
+        self.content = content
+        self.depth = 0
+        self.replies = []
+        self.closes = range(0)
+
+
+def build_comment_tree(post_id):
+    """
+    Loads all comments of a post with one query and nests them under their parents.
+
+    Args:
+        post_id (int): The ID of the post.
+
+    Returns:
+        tuple: The list of top-level `CommentNode`s, oldest first, and the total number of comments.
+    """
+
+    rows = (
+        Comments.objects
+        .filter(post_id=post_id)
+        .order_by('date', 'id')
+        .values_list('id', 'parent_id', 'name', 'date', 'content')
+    )
+
+    nodes = {}
+    parents = {}
+    for id, parent_id, name, date, content in rows:
+        nodes[id] = CommentNode(id, name, date, content)
+        parents[id] = parent_id
+
+    roots = []
+    for id, node in nodes.items():
+        parent = nodes.get(parents[id])
+        # Replies whose parent was deleted are shown at the top level
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.replies.append(node)
+
+    # Set the depth of every node, iteratively so deep threads cannot exhaust the stack
+    stack = [(root, 0) for root in roots]
+    while stack:
+        node, depth = stack.pop()
+        node.depth = depth
+        stack.extend((reply, depth + 1) for reply in node.replies)
+
+    return roots, len(nodes)
+
+
+def flatten(roots):
+    """
+    Lists the comments of a tree in display order, each followed by its replies.
+
+    Every node gets the number of levels of markup to close after it: its own
+    and those of its ancestors that have no further replies.
+
+    Args:
+        roots (list): The top-level `CommentNode`s.
+
+    Returns:
+        list: The `CommentNode`s in display order.
+    """
+
+    ordered = []
+    stack = roots[::-1]
+    while stack:
+        node = stack.pop()
+        ordered.append(node)
+        stack.extend(node.replies[::-1])
+
+    # A reply opens a level inside its parent, a sibling closes the level of the previous
+    # comment, and the last comment closes every level still open
+    for node, following in zip(ordered, ordered[1:] + [None]):
+        next_depth = following.depth if following is not None else 0
+        node.closes = range(node.depth - next_depth + 1)
+
+    return ordered
+
+
+def _cache_key(post_id):
+    """
+    Build the cache key holding the rendered thread of a post.
+    """
+
+    return f'{CACHE_KEY_PREFIX}:{post_id}'
+
+
+def get_thread(request, post):
+    """
+    Returns the rendered comment thread of a post, from the cache if possible.
+
+    Args:
+        request: The HTTP request, whose CSRF token is put into the reply forms.
+        post (Post): The post.
+
+    Returns:
+        tuple: The thread HTML (a safe string) and the number of comments.
+    """
+
+    key = _cache_key(post.pk)
+    thread = cache.get(key)
+    record_cache(thread is not None)
+
+    if thread is None:
+        roots, count = build_comment_tree(post.pk)
+        html = render_to_string('app/partials/comment_thread.html', {
+            'nodes': flatten(roots),
+            'post': post,
+            'form': CommentForm(),
+            'csrf_token': CSRF_PLACEHOLDER,
+        })
+        thread = {'html': html, 'count': count}
+        cache.set(key, thread, timeout=settings.COMMENT_THREAD_CACHE_TIMEOUT)
+
+    html = thread['html'].replace(CSRF_PLACEHOLDER, get_token(request))
+    return mark_safe(html), thread['count']
+
+
+def invalidate(post_id):
+    """
+    Drops the cached thread of a post, so it is rendered again on the next view.
+    """
+
+    cache.delete(_cache_key(post_id))
@@ -0,0 +1,133 @@
+"""
+Module to build the currency choices of the transaction form.
+
+The currencies offered are the ones in the current exchange rate table, about
+160 of them. `CurrencyCatalogue` builds their sorted choices, display names and
+rendered `<option>` elements once, and `get_currency_catalogue()` memoizes the
+catalogue per version of the rate table, so opening the transaction form does
+not rebuild the choice list or render every option on each request.
+"""
+
+
+import threading
+
+from django import forms
+from django.forms.utils import flatatt
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from app.utils import get_rate_table
+
+
+# Currencies offered when no exchange rates are available
+DEFAULT_CURRENCIES = [
+    ('USD', 'US Dollar'),
+    ('EUR', 'Euro'),
+    ('GBP', 'British Pound'),
+    ('JPY', 'Japanese Yen'),
+    ('AUD', 'Australian Dollar'),
+    ('CAD', 'Canadian Dollar'),
+    ('CHF', 'Swiss Franc'),
+    ('CNY', 'Chinese Yuan'),
+    ('INR', 'Indian Rupee'),
+    ]
+
+CURRENCY_NAMES = dict(DEFAULT_CURRENCIES)
+
+_catalogue = None
+_catalogue_version = None
+_catalogue_lock = threading.Lock()
+
+
+class CurrencyCatalogue:
+    """
+    The currencies of a rate table with their choices and rendered options.
+
+    Args:
+        codes (iterable): The currency codes.
+
+    Attributes:
+        codes (list): The currency codes, sorted.
+        display_names (dict): Currency codes mapped to their labels, e.g. 'USD - US Dollar'.
+        choices (list): (code, label) tuples for a `ChoiceField`.
+        options_html (str): The rendered `<option>` elements of all currencies.
+    """
+
+    def __init__(self, codes):
+        self.codes = sorted(codes)
+        self.display_names = {
+            code: f'{code} - {CURRENCY_NAMES[code]}' if code in CURRENCY_NAMES else code
+            for code in self.codes
+        }
+        self.choices = list(self.display_names.items())
+        self.options_html = ''.join(
+            format_html('<option value="{}">{}</option>', code, label) for code, label in self.choices
+        )
+
+    def render_options(self, selected=None):
+        """
+        Returns the `<option>` elements with the given currency selected.
+
+        Args:
+            selected (str, optional): The code of the selected currency.
+
+        Returns:
+            SafeString: The rendered options.
+        """
+
+        options = self.options_html
+        if selected:
+            option = f'<option value="{escape(selected)}">'
+            options = options.replace(option, f'{option[:-1]} selected>', 1)
+        return mark_safe(options)
+
+
+class CurrencySelect(forms.Select):
+    """
+    Select widget that renders its options from a `CurrencyCatalogue`.
+
+    Without a catalogue it renders like a regular `Select`.
+    """
+
+    catalogue = None
+
+    def render(self, name, value, attrs=None, renderer=None):
+        """
+        Render the select element with the memoized options of the catalogue.
+        """
+
+        if self.catalogue is None:
+            return super().render(name, value, attrs, renderer)
+
+        final_attrs = self.build_attrs(self.attrs, attrs)
+        final_attrs['name'] = name
+        values = self.format_value(value)
+        options = self.catalogue.render_options(values[0] if values else None)
+        return format_html('<select{}>{}</select>', flatatt(final_attrs), options)
+
+
+def get_currency_catalogue():
+    """
+    Returns the catalogue of the current rate table, building it once per table version.
+
+    Falls back to `DEFAULT_CURRENCIES` if no exchange rates are available.
+
+    Returns:
+        CurrencyCatalogue: The catalogue of the offered currencies.
+    """
+
+    global _catalogue, _catalogue_version
+
+    table = get_rate_table()
+    version = table['fetched_at'] if table else None
+
+    if _catalogue is not None and _catalogue_version == version:
+        return _catalogue
+
+    with _catalogue_lock:
+        if _catalogue is None or _catalogue_version != version:
+            codes = table['rates'].keys() if table else CURRENCY_NAMES.keys()
+            _catalogue = CurrencyCatalogue(codes)
+            _catalogue_version = version
+
+    return _catalogue
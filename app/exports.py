@@ -0,0 +1,135 @@
+"""
+Module to export transactions as CSV or NDJSON without loading them into memory.
+
+The transactions are read with `QuerySet.iterator()`, which uses a server-side
+cursor on PostgreSQL and fetches `EXPORT_CHUNK_SIZE` rows at a time, and every
+chunk is encoded and handed to the `StreamingHttpResponse` before the next one
+is read. Memory use therefore stays the same whether a user exports one month
+or ten years of transactions.
+"""
+
+
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Exported columns: header names and the fields they are read from
+COLUMNS = (
+    ('id', 'id'),
+    ('date', 'date'),
+    ('type', 'type'),
+    ('category', 'category__name'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('amount_in_eur', 'amount_in_usd'),
+)
+
+# Export formats: content type and file extension of each
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+
+class _LineBuffer:
+    """
+    File-like object that hands back what is written to it, so `csv.writer` can encode single rows.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(transactions):
+    """
+    Yields the exported columns of the transactions, oldest first.
+
+    Args:
+        transactions (QuerySet): The transactions to export.
+
+    Yields:
+        tuple: The values of one transaction, in `COLUMNS` order.
+    """
+
+    fields = [field for _, field in COLUMNS]
+    rows = transactions.order_by('date', 'id').values_list(*fields)
+    yield from rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _in_chunks(lines):
+    """
+    Joins encoded lines into chunks of `EXPORT_CHUNK_SIZE` lines, so the response is not written line by line.
+    """
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= settings.EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_csv(transactions):
+    """
+    Yields the transactions encoded as CSV, starting with a header row.
+
+    Args:
+        transactions (QuerySet): The transactions to export.
+
+    Yields:
+        str: Chunks of CSV lines.
+    """
+
+    writer = csv.writer(_LineBuffer())
+
+    def lines():
+        yield writer.writerow([name for name, _ in COLUMNS])
+        for row in iter_rows(transactions):
+            yield writer.writerow(row)
+
+    return _in_chunks(lines())
+
+
+def stream_ndjson(transactions):
+    """
+    Yields the transactions encoded as newline-delimited JSON, one object per transaction.
+
+    Args:
+        transactions (QuerySet): The transactions to export.
+
+    Yields:
+        str: Chunks of JSON lines.
+    """
+
+    names = [name for name, _ in COLUMNS]
+    encoder = DjangoJSONEncoder()
+
+    def lines():
+        for row in iter_rows(transactions):
+            yield encoder.encode(dict(zip(names, row))) + '\n'
+
+    return _in_chunks(lines())
+
+
+def stream(transactions, format):
+    """
+    Returns the encoded chunks of the transactions in the given format.
+
+    Args:
+        transactions (QuerySet): The transactions to export.
+        format (str): 'csv' or 'ndjson'.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+
+    if format == 'csv':
+        return stream_csv(transactions)
+    if format == 'ndjson':
+        return stream_ndjson(transactions)
+    raise ValueError(f'Unsupported export format: {format}. Use one of: {", ".join(FORMATS)}.')
@@ -1,5 +1,6 @@
 """
-Factories for generating test data for the User, Category, and Transaction models.
+Factories for generating test data for the User, Category, Transaction, Tag, Profile,
+Post and Comments models.
 
 This module uses the `factory_boy` package to define factories for the models in the app,
 which will help generate mock data for testing purposes.
@@ -8,7 +9,7 @@ which will help generate mock data for testing purposes.
 
 from datetime import datetime
 import factory 
-from app.models import Category, Transaction, User
+from app.models import Category, Comments, Transaction, User, Tag, Profile, Post
 
 
 class UserFactory(factory.django.DjangoModelFactory):
@@ -69,3 +70,74 @@ class TransactionFactory(factory.django.DjangoModelFactory):
             x[0] for x in Transaction.TRANSACTION_TYPE_CHOICES  # Random transaction type
         ]
     )
+
+
+class TagFactory(factory.django.DjangoModelFactory):
+    """
+    Factory for creating instances of the Tag model for testing purposes.
+    """
+
+    class Meta:
+        model = Tag  # The model this factory creates instances of.
+
+    name = factory.Sequence(lambda n: 'tag%d' % n)  # Generate unique tag names (slug is derived from it)
+    description = factory.Faker('sentence', nb_words=4)
+
+
+class ProfileFactory(factory.django.DjangoModelFactory):
+    """
+    Factory for creating instances of the Profile model for testing purposes.
+    """
+
+    class Meta:
+        model = Profile  # The model this factory creates instances of.
+
+    user = factory.SubFactory(UserFactory)  # Link to a randomly generated user
+    profile_image = 'images/user-23874_640.png'  # Existing image from the upload folder
+    bio = factory.Faker('sentence', nb_words=6)
+
+
+class PostFactory(factory.django.DjangoModelFactory):
+    """
+    Factory for creating instances of the Post model for testing purposes.
+
+    The author gets a profile, and a tag can be attached with `tags=[...]`.
+    """
+
+    class Meta:
+        model = Post  # The model this factory creates instances of.
+        skip_postgeneration_save = True  # Tags are added through the M2M manager, no re-save needed
+
+    title = factory.Faker('sentence', nb_words=5)
+    content = factory.Faker('paragraph', nb_sentences=8)
+    slug = factory.Sequence(lambda n: 'post-%d' % n)  # Generate unique slugs
+    image = 'images/post.png'  # Existing image from the upload folder
+    view_count = 0
+    author = factory.LazyFunction(lambda: ProfileFactory().user)  # Author with a profile
+
+    @factory.post_generation
+    def tags(self, create, extracted, **kwargs):
+        """
+        Attach the given tags to the post after it is created.
+        """
+
+        if create and extracted:
+            self.tags.add(*extracted)
+
+
+class CommentFactory(factory.django.DjangoModelFactory):
+    """
+    Factory for creating instances of the Comments model for testing purposes.
+
+    Replies are created by passing `parent=...`.
+    """
+
+    class Meta:
+        model = Comments  # The model this factory creates instances of.
+
+    content = factory.Faker('paragraph', nb_sentences=3)
+    name = factory.Faker('name')
+    email = factory.Faker('email')
+    website = ''
+    post = factory.SubFactory(PostFactory)  # Link to a randomly generated post
+
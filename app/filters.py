@@ -56,3 +56,14 @@ class TransactionFilter(django_filters.FilterSet):
     class Meta:
         model = Transaction
         fields = ('transaction_type',)  # Only include transaction_type in the filter form
+
+    def has_active_filters(self):
+        """
+        Returns True if any filter of the form has a value in the request data.
+        """
+
+        for name in self.filters:
+            values = self.data.getlist(name) if hasattr(self.data, 'getlist') else [self.data.get(name)]
+            if any(values):
+                return True
+        return False
@@ -8,6 +8,8 @@ Classes:
     - SubscribeForm: A form for subscribing with an email address.
     - NewUserForm: A form for user registration, extending Django's UserCreationForm.
     - TransactionForm: A form for submitting financial transactions.
+    - TransactionImportRowForm: Validates one row of an imported file with the TransactionForm rules.
+    - TransactionImportForm: A form for uploading a file of transactions.
 """
 
 
@@ -21,6 +23,7 @@ from django.contrib.auth.models import User
 
 # Local imports
 from app.models import Comments, Subscribe, Transaction, Category
+from app.currencies import DEFAULT_CURRENCIES, CurrencySelect
 
 
 class CommentForm(forms.ModelForm):
@@ -152,20 +155,6 @@ class NewUserForm(UserCreationForm):
         return password2
 
 
-# Define a default list of currencies
-DEFAULT_CURRENCIES = [
-    ('USD', 'US Dollar'),
-    ('EUR', 'Euro'),
-    ('GBP', 'British Pound'),
-    ('JPY', 'Japanese Yen'),
-    ('AUD', 'Australian Dollar'),
-    ('CAD', 'Canadian Dollar'),
-    ('CHF', 'Swiss Franc'),
-    ('CNY', 'Chinese Yuan'),
-    ('INR', 'Indian Rupee'),
-    ]
-
-
 class TransactionForm(forms.ModelForm):
     """
     A form for creating and submitting a transaction.
@@ -184,16 +173,20 @@ class TransactionForm(forms.ModelForm):
     )
 
     # Empty by default, populated in the view
-    currency = forms.ChoiceField(choices=DEFAULT_CURRENCIES, required=True)
+    currency = forms.ChoiceField(choices=DEFAULT_CURRENCIES, required=True, widget=CurrencySelect)
 
-    def __init__(self, *args, currencies=None, **kwargs):
+    def __init__(self, *args, currencies=None, catalogue=None, **kwargs):
         """
-        Initialize the form with dynamic currency choices if provided,
-        otherwise use the default list of currencies.
+        Initialize the form with the currencies of a `CurrencyCatalogue` or
+        dynamic currency choices if provided, otherwise use the default list of currencies.
         """
 
         super(TransactionForm, self).__init__(*args, **kwargs)
-        if currencies:
+        if catalogue is not None:
+            # Reuse the memoized choices and rendered options of the catalogue
+            self.fields['currency'].choices = catalogue.choices
+            self.fields['currency'].widget.catalogue = catalogue
+        elif currencies:
             # If dynamic currencies are passed, override default choices
             self.fields['currency'].choices = currencies
         else:
@@ -229,3 +222,71 @@ class TransactionForm(forms.ModelForm):
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date'})
         }
+
+
+class TransactionImportRowForm(TransactionForm):
+    """
+    Validates one row of an imported file with the rules of `TransactionForm`.
+
+    The category is given by name and resolved through an in-memory map of the
+    categories instead of a query per row.
+    """
+
+    category = forms.CharField(max_length=50)
+
+    def __init__(self, *args, categories=None, **kwargs):
+        """
+        Initialize the form with the categories mapped by their lower-cased names.
+        """
+
+        super().__init__(*args, **kwargs)
+        self.categories = categories or {}
+
+    def clean_category(self):
+        """
+        Resolve the category name to a category.
+
+        Returns:
+            Category: The category with the given name, ignoring case.
+
+        Raises:
+            forms.ValidationError: If there is no such category.
+        """
+
+        name = self.cleaned_data['category'].strip()
+        category = self.categories.get(name.lower())
+
+        if category is None:
+            raise forms.ValidationError(f'Unknown category "{name}".')
+        return category
+
+    def _get_validation_exclusions(self):
+        """
+        Skip the model validation of the category, which would check with a query per row
+        that the category resolved from the map exists.
+        """
+
+        exclude = super()._get_validation_exclusions()
+        exclude.add('category')
+        return exclude
+
+
+class TransactionImportForm(forms.Form):
+    """
+    A form for uploading a CSV or OFX file of transactions.
+
+    Fields:
+        file: The file to import.
+        format: The format of the file, guessed from the file name if empty.
+        default_category: The category of rows without one (OFX statements have none).
+
+    Categories are shared by all users, so rows with an unknown category are
+    rejected; only the `import_transactions` command can create categories.
+    """
+
+    file = forms.FileField()
+    format = forms.ChoiceField(
+        choices=[('', 'From file name'), ('csv', 'CSV'), ('ofx', 'OFX')], required=False,
+    )
+    default_category = forms.CharField(max_length=50, required=False)
+
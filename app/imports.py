@@ -0,0 +1,366 @@
+"""
+Module to import transactions in bulk from CSV files and OFX bank statements.
+
+Files are parsed as a stream, one row at a time, and every row is validated
+with the rules of `TransactionForm` (see `TransactionImportRowForm`), with the
+categories resolved by name through an in-memory map. Valid rows are collected
+into chunks of `IMPORT_CHUNK_SIZE`; each chunk is converted to EUR in one pass,
+with the rate of every currency and date looked up once in the rate history
+(see `app/rate_history.py`), and written with a single `bulk_create`.
+
+Rows with an external ID (a CSV 'external_id' column or the FITID of an OFX
+transaction) are imported once per user: rows whose ID was already imported
+are skipped, so a file can be imported again safely. Rows without one are
+always imported.
+
+A file is imported in a single database transaction: if it cannot be read to
+the end (e.g. an encoding error in a later block), nothing is kept. `bulk_create`
+skips the signals that maintain the summaries, so the summaries and daily
+rollups of the user are rebuilt at the end of that transaction.
+
+CSV files have the columns date, type, category, amount and currency, and
+optionally external_id. Invalid rows are reported with their line number and
+do not stop the import.
+"""
+
+
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+
+from app import rate_history
+from app.currencies import get_currency_catalogue
+from app.forms import TransactionImportRowForm
+from app.models import Category, Transaction
+from app.summaries import rebuild_daily_rollups, rebuild_summaries
+from app.utils import get_exchange_rates
+
+
+CENT = Decimal('0.01')
+
+FORMATS = ('csv', 'ofx')
+
+# Number of row errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Tags of an OFX file: SGML (without closing tags) and XML
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+def guess_format(file_name):
+    """
+    Returns the format of a file from its extension: 'ofx' for .ofx and .qfx files, otherwise 'csv'.
+    """
+
+    return 'ofx' if file_name.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def open_text(file):
+    """
+    Wraps a binary file (e.g. an upload) for reading text, with or without a UTF-8 byte order mark.
+    """
+
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+
+def read_csv(file, default_category=None):
+    """
+    Yields the rows of a CSV file of transactions.
+
+    Args:
+        file: A text file with a header row.
+        default_category (str, optional): The category of rows without one.
+
+    Yields:
+        tuple: The line number and the row as a dict with lower-cased column names.
+    """
+
+    reader = csv.DictReader(file)
+    for row in reader:
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        if default_category and not row.get('category'):
+            row['category'] = default_category
+        yield reader.line_num, row
+
+
+def _ofx_row(fields, currency, default_category):
+    """
+    Converts the fields of an OFX transaction to an import row.
+
+    The sign of the amount gives the type: credits are income, debits are expenses.
+    """
+
+    amount = fields.get('TRNAMT', '')
+    try:
+        value = Decimal(amount)
+    except InvalidOperation:
+        transaction_type = ''
+    else:
+        transaction_type = 'income' if value > 0 else 'expense'
+        amount = str(abs(value))
+
+    # Dates look like 20240131 or 20240131120000[-5:EST]; only the day is kept
+    posted = fields.get('DTPOSTED', '')
+    date = f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}' if len(posted) >= 8 else posted
+
+    return {
+        'date': date,
+        'type': transaction_type,
+        'category': default_category or '',
+        'amount': amount,
+        'currency': fields.get('CURRENCY') or currency,
+        'external_id': fields.get('FITID', ''),
+    }
+
+
+def read_ofx(file, default_category=None):
+    """
+    Yields the transactions of an OFX bank statement (SGML or XML).
+
+    OFX transactions have no category, so all rows get the default category.
+
+    Args:
+        file: A text file.
+        default_category (str, optional): The category of the rows.
+
+    Yields:
+        tuple: The line number of the transaction and the row as a dict.
+    """
+
+    currency = ''
+    fields = None
+    start_line = 0
+
+    for line_number, line in enumerate(file, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            value = value.strip()
+
+            if tag == 'STMTTRN':
+                if closing and fields is not None:
+                    yield start_line, _ofx_row(fields, currency, default_category)
+                    fields = None
+                elif not closing:
+                    fields, start_line = {}, line_number
+            elif closing:
+                continue
+            elif tag == 'CURDEF':
+                currency = value
+            elif fields is not None and value:
+                # The currency of a single transaction is its <CURSYM>
+                fields['CURRENCY' if tag == 'CURSYM' else tag] = value
+
+
+def read_file(file, format, default_category=None):
+    """
+    Returns the rows of a CSV or OFX text file.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+
+    if format == 'csv':
+        return read_csv(file, default_category)
+    if format == 'ofx':
+        return read_ofx(file, default_category)
+    raise ValueError(f'Unsupported import format: {format}. Use one of: {", ".join(FORMATS)}.')
+
+
+class ImportReport:
+    """
+    The outcome of an import.
+
+    Attributes:
+        created (int): Transactions created (or that would be, in a dry run).
+        duplicates (int): Rows skipped because their external ID was already imported.
+        unconverted (int): Transactions stored with 0 EUR for lack of an exchange rate.
+        error_count (int): Rows rejected by the validation.
+        errors (list): (line number, message) of the first `MAX_REPORTED_ERRORS` rejected rows.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.unconverted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        """
+        Counts a rejected row and keeps its message if the report is not full.
+        """
+
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class TransactionImporter:
+    """
+    Validates, converts and stores the rows of an imported file for a user.
+
+    Args:
+        user (User): The owner of the imported transactions.
+        chunk_size (int, optional): Rows converted and written at a time. Defaults to `IMPORT_CHUNK_SIZE`.
+        create_categories (bool): Create the categories that do not exist yet instead of rejecting their rows.
+            Categories are shared by all users, so only the `import_transactions` command sets it.
+        dry_run (bool): Validate and count the rows without writing anything.
+    """
+
+    def __init__(self, user, chunk_size=None, create_categories=False, dry_run=False):
+        self.user = user
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+
+        # Everything the rows are checked and converted with is loaded once
+        self.catalogue = get_currency_catalogue()
+        self.categories = {category.name.lower(): category for category in Category.objects.all()}
+        self.history = rate_history.get_history()
+        self.latest_rates = get_exchange_rates() or {}
+
+        # External IDs of the rows of this file kept so far, so a dry run skips repeats across chunks too
+        self.seen = set()
+
+    def run(self, rows):
+        """
+        Imports the rows chunk by chunk and rebuilds the user's summaries, all in one transaction.
+
+        Args:
+            rows (iterable): (line number, row dict) tuples, as yielded by `read_file()`.
+
+        Returns:
+            ImportReport: The numbers of created, skipped and rejected rows.
+
+        Raises:
+            UnicodeDecodeError, csv.Error: If the file cannot be read to the end; nothing is imported then.
+        """
+
+        report = ImportReport()
+        chunk = []
+
+        with db_transaction.atomic():
+            for line, row in rows:
+                transaction = self.validate(line, row, report)
+                if transaction is not None:
+                    chunk.append(transaction)
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk, report)
+                    chunk = []
+
+            if chunk:
+                self.write_chunk(chunk, report)
+
+            # bulk_create skips the signals that maintain the summaries
+            if report.created and not self.dry_run:
+                rebuild_summaries([self.user.pk])
+                rebuild_daily_rollups([self.user.pk])
+
+        return report
+
+    def validate(self, line, row, report):
+        """
+        Validates a row with the `TransactionForm` rules.
+
+        Returns:
+            Transaction or None: The unsaved transaction, or None if the row was rejected.
+        """
+
+        data = dict(row, type=row.get('type', '').lower(), currency=row.get('currency', '').upper())
+
+        name = data.get('category', '').strip()
+        if self.create_categories and name and name.lower() not in self.categories:
+            category = Category(name=name)
+            if not self.dry_run:
+                category, _ = Category.objects.get_or_create(name=name)
+            self.categories[name.lower()] = category
+
+        form = TransactionImportRowForm(data, catalogue=self.catalogue, categories=self.categories)
+        if not form.is_valid():
+            messages = [f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()]
+            report.add_error(line, '; '.join(messages))
+            return None
+
+        transaction = form.save(commit=False)
+        transaction.user = self.user
+        transaction.external_id = data.get('external_id') or None
+        return transaction
+
+    def convert(self, chunk, report):
+        """
+        Sets the amount in EUR of every transaction of a chunk, looking up each currency and date once.
+        """
+
+        rates = {}
+        for transaction in chunk:
+            key = (transaction.currency, transaction.date)
+            if key not in rates:
+                rate = self.history.get_rate(*key) or self.latest_rates.get(transaction.currency)
+                rates[key] = Decimal(str(rate)) if rate else None
+
+            rate = rates[key]
+            if rate:
+                transaction.amount_in_usd = (transaction.amount / rate).quantize(CENT)
+            else:
+                # Like `convert_to_EUR`, store 0 if the exchange rate is unavailable
+                transaction.amount_in_usd = Decimal('0.00')
+                report.unconverted += 1
+
+    def write_chunk(self, chunk, report):
+        """
+        Drops the already imported transactions of a chunk, then converts and inserts the rest.
+        """
+
+        external_ids = {transaction.external_id for transaction in chunk if transaction.external_id} - self.seen
+        imported = set(
+            Transaction.objects
+            .filter(user=self.user, external_id__in=external_ids)
+            .values_list('external_id', flat=True)
+        ) if external_ids else set()
+
+        new = []
+        for transaction in chunk:
+            if transaction.external_id:
+                if transaction.external_id in self.seen or transaction.external_id in imported:
+                    report.duplicates += 1
+                    continue
+                self.seen.add(transaction.external_id)
+            new.append(transaction)
+
+        self.convert(new, report)
+        if not self.dry_run:
+            new = self.insert(new, report)
+        report.created += len(new)
+
+    def insert(self, transactions, report):
+        """
+        Inserts transactions, skipping those whose external ID a concurrent import inserted first.
+
+        Returns:
+            list: The transactions actually inserted.
+        """
+
+        try:
+            with db_transaction.atomic():
+                Transaction.objects.bulk_create(transactions, batch_size=self.chunk_size)
+            return transactions
+        except IntegrityError:
+            pass
+
+        # The same file is being imported concurrently: drop the rows it already inserted
+        external_ids = {transaction.external_id for transaction in transactions if transaction.external_id}
+        taken = set(
+            Transaction.objects
+            .filter(user=self.user, external_id__in=external_ids)
+            .values_list('external_id', flat=True)
+        )
+        inserted = [transaction for transaction in transactions if transaction.external_id not in taken]
+        report.duplicates += len(transactions) - len(inserted)
+
+        with db_transaction.atomic():
+            Transaction.objects.bulk_create(inserted, batch_size=self.chunk_size)
+        return inserted
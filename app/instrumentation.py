@@ -0,0 +1,427 @@
+"""
+Module to measure the time, queries and cache lookups of every request.
+
+`RequestMetricsMiddleware` wraps each request in a database execute wrapper
+that times every query and spots exact duplicates (the same SQL with the same
+parameters run more than once, usually a missing `select_related` or a lookup
+repeated in a loop). The app's caches (site blocks, comment threads, reaction
+sets and exchange rates) report their hits and misses with `record_cache()`.
+
+Each query is also reduced to its shape with `fingerprint()` (literals,
+parameters and IN lists replaced by placeholders). A SELECT shape repeated
+`settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD` times in one request is an
+N+1 pattern, e.g. a related object loaded once per row of a list; it is
+reported with the first frame of the project's code that ran it. Queries
+slower than `settings.REQUEST_METRICS_SLOW_QUERY_MS` are logged right away,
+with the same origin.
+
+For every request the middleware:
+    - adds a `Server-Timing` header (total, db and cache), shown by the
+      browser's developer tools;
+    - writes a structured log line (JSON) to the 'app.instrumentation' logger,
+      as a warning if the request is slow, ran duplicate queries or an N+1 pattern;
+    - adds the request to an in-memory histogram per view, served to staff
+      users by the `performance_stats` view.
+
+The histogram belongs to the process, so each worker reports its own
+requests. The middleware sits after the session and authentication
+middleware, so their queries (e.g. saving the session) are not counted, and
+queries run while a streamed response is consumed happen after it is measured.
+
+Tests enforce query budgets with `capture_queries()`, through the
+`query_budget` fixture of `app/tests/conftest.py`.
+"""
+
+
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the response time buckets of the histogram; the last bucket is unbounded
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Metrics of the request being handled by the current thread, if any
+_current = ContextVar('request_metrics', default=None)
+
+_views = {}
+_views_lock = threading.Lock()
+
+# Patterns replaced, in order, to reduce a query to its shape
+_FINGERPRINT_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                   # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),               # numbers
+    (re.compile(r'%s|%\(\w+\)s'), '?'),                    # parameter placeholders
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),  # IN lists and rows of values
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),   # several rows of values
+    (re.compile(r'\s+'), ' '),
+)
+
+# Directory of the project's code, and the installed packages that may sit inside it
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIPPED_DIRS = ('site-packages', 'dist-packages')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    Reduces a query to its shape, so the same query run with different values can be grouped.
+
+    Args:
+        sql (str): The SQL of the query.
+
+    Returns:
+        str: The SQL with its literals and parameters replaced by '?' and IN lists by '(...)'.
+    """
+
+    for pattern, replacement in _FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def query_origin():
+    """
+    Returns the first frame of the project's code in the current stack.
+
+    Frames of this module and of installed packages are skipped, so the origin
+    is the view, template tag or helper that ran the query.
+
+    Returns:
+        str: 'path:line in function', the path relative to the project, or None if no frame matches.
+    """
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_PROJECT_DIR) and filename != __file__
+                and not any(part in filename for part in _SKIPPED_DIRS)):
+            return f'{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestMetrics:
+    """
+    The measurements of a single request.
+
+    Args:
+        n_plus_one_threshold (int, optional): Repetitions of a SELECT shape reported as
+            an N+1 pattern. Defaults to `settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD`.
+
+    Attributes:
+        db_time (float): Seconds spent executing queries.
+        queries (int): Number of queries.
+        duplicates (int): Number of queries repeating an earlier query of the request.
+        cache (Counter): Number of cache 'hits' and 'misses'.
+        shapes (Counter): Number of queries of each shape (see `fingerprint()`).
+        slow_queries (list): Dicts with the 'sql', 'ms' and 'origin' of each slow query.
+    """
+
+    def __init__(self, n_plus_one_threshold=None):
+        self.db_time = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.cache = Counter()
+        self.shapes = Counter()
+        self.slow_queries = []
+        self._seen = Counter()
+        self._origins = {}
+        # Read once, as the wrapper runs for every query
+        self._threshold = n_plus_one_threshold or settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD
+        self._slow_ms = settings.REQUEST_METRICS_SLOW_QUERY_MS
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Execute wrapper timing a query and checking whether it repeats an earlier one or its shape.
+        """
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries += 1
+
+            key = (sql, repr(params))
+            self._seen[key] += 1
+            if self._seen[key] > 1:
+                self.duplicates += 1
+
+            shape = fingerprint(sql)
+            self.shapes[shape] += 1
+            # The stack is only walked once per repeated shape, and for slow queries
+            if self.shapes[shape] == self._threshold and shape.startswith('SELECT'):
+                self._origins[shape] = query_origin()
+            if duration * 1000 >= self._slow_ms:
+                self.log_slow_query(sql, duration * 1000)
+
+    def log_slow_query(self, sql, ms):
+        """
+        Logs a slow query with the code that ran it.
+        """
+
+        record = {'event': 'slow_query', 'ms': round(ms, 3), 'sql': sql, 'origin': query_origin()}
+        self.slow_queries.append(record)
+        logger.warning(json.dumps(record), extra={'slow_query': record})
+
+    def n_plus_one(self):
+        """
+        Returns the SELECT shapes run at least the N+1 threshold number of times.
+
+        Returns:
+            list: Dicts with the 'sql' shape, its 'count' and the 'origin' of
+                  the query that reached the threshold, most repeated first.
+        """
+
+        return [
+            {'sql': shape, 'count': count, 'origin': self._origins[shape]}
+            for shape, count in self.shapes.most_common()
+            if shape in self._origins
+        ]
+
+    def duplicated_queries(self, limit=3):
+        """
+        Returns the SQL of the most repeated queries, for the log.
+        """
+
+        return [sql for (sql, _), count in self._seen.most_common(limit) if count > 1]
+
+
+@contextmanager
+def capture_queries(n_plus_one_threshold=None):
+    """
+    Measures the queries run inside the block, as the middleware does for a request.
+
+    Args:
+        n_plus_one_threshold (int, optional): See `RequestMetrics`.
+
+    Yields:
+        RequestMetrics: The measurements, complete once the block exits.
+    """
+
+    metrics = RequestMetrics(n_plus_one_threshold)
+    with connection.execute_wrapper(metrics):
+        yield metrics
+
+
+def record_cache(hit):
+    """
+    Counts a cache lookup of the current request, if there is one.
+
+    Args:
+        hit (bool): True if the value was found in the cache.
+    """
+
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache['hits' if hit else 'misses'] += 1
+
+
+class _ViewStats:
+    """
+    Aggregated measurements of a view, with a histogram of its response times.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.duplicates = 0
+        self.n_plus_one = 0
+        self.cache = Counter()
+        self.statuses = Counter()
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, total_ms, metrics, status):
+        """
+        Adds the measurements of a request.
+        """
+
+        self.requests += 1
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, total_ms)
+        self.db_ms += metrics.db_time * 1000
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.duplicates += metrics.duplicates
+        self.n_plus_one += bool(metrics.n_plus_one())
+        self.cache.update(metrics.cache)
+        self.statuses[f'{status // 100}xx'] += 1
+        self.buckets[bisect_left(BUCKETS_MS, total_ms)] += 1
+
+    def percentile(self, share):
+        """
+        Returns the upper bound of the bucket holding the given share of the requests (None if unbounded).
+        """
+
+        target = share * self.requests
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + (None,), self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def as_dict(self):
+        """
+        Returns the aggregated measurements, with the percentiles as bucket upper bounds.
+        """
+
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_ms / requests, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 3),
+            'mean_db_ms': round(self.db_ms / requests, 3),
+            'mean_queries': round(self.queries / requests, 2),
+            'max_queries': self.max_queries,
+            'duplicate_queries': self.duplicates,
+            'n_plus_one_requests': self.n_plus_one,
+            'cache_hits': self.cache['hits'],
+            'cache_misses': self.cache['misses'],
+            'statuses': dict(self.statuses),
+            'histogram_ms': {
+                f'<={bound}' if bound else f'>{BUCKETS_MS[-1]}': count
+                for bound, count in zip(BUCKETS_MS + (None,), self.buckets)
+            },
+        }
+
+
+def percentile(samples, share):
+    """
+    Returns the nearest-rank percentile of a list of samples.
+
+    Args:
+        samples (list): The measured values, in any order.
+        share (float): The share of the samples at or below the result, e.g. 0.95 for p95.
+
+    Returns:
+        float: The smallest sample that at least `share` of the samples do not exceed.
+    """
+
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def get_view_stats():
+    """
+    Returns the aggregated measurements of every view handled by this process.
+
+    Returns:
+        dict: View names mapped to their request count, mean and maximum times,
+              p50 and p95 (the upper bound of the histogram bucket they fall in,
+              None if above the last bound), query and cache counts and response
+              time histogram.
+    """
+
+    with _views_lock:
+        return {name: stats.as_dict() for name, stats in sorted(_views.items())}
+
+
+def reset_view_stats():
+    """
+    Clears the aggregated measurements of this process.
+    """
+
+    with _views_lock:
+        _views.clear()
+
+
+def _server_timing(total_ms, metrics):
+    """
+    Builds the `Server-Timing` header of a request.
+    """
+
+    return (
+        f'total;dur={total_ms:.1f}, '
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries, {metrics.duplicates} duplicates", '
+        f'cache;desc="{metrics.cache["hits"]} hits, {metrics.cache["misses"]} misses"'
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware measuring each request and reporting it through headers, logs and the view histogram.
+
+    Disabled with `settings.REQUEST_METRICS_ENABLED`; the `Server-Timing` header
+    is left out if `settings.REQUEST_METRICS_SERVER_TIMING` is off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_METRICS_ENABLED:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+
+        with _views_lock:
+            _views.setdefault(view, _ViewStats()).add(total_ms, metrics, response.status_code)
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = _server_timing(total_ms, metrics)
+
+        self.log(request, response, view, total_ms, metrics)
+        return response
+
+    def log(self, request, response, view, total_ms, metrics):
+        """
+        Write the measurements of a request as a JSON log line.
+        """
+
+        record = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'db_ms': round(metrics.db_time * 1000, 3),
+            'queries': metrics.queries,
+            'duplicate_queries': metrics.duplicates,
+            'cache_hits': metrics.cache['hits'],
+            'cache_misses': metrics.cache['misses'],
+        }
+
+        slow = total_ms >= settings.REQUEST_METRICS_SLOW_MS
+        if metrics.duplicates:
+            record['duplicated_sql'] = metrics.duplicated_queries()
+        n_plus_one = metrics.n_plus_one()
+        if n_plus_one:
+            record['n_plus_one'] = n_plus_one[:3]
+        if metrics.slow_queries:
+            record['slow_queries'] = len(metrics.slow_queries)
+        level = logging.WARNING if slow or metrics.duplicates or n_plus_one else logging.INFO
+        logger.log(level, json.dumps(record), extra={'request_metrics': record})
@@ -0,0 +1,36 @@
+"""
+Management command to backfill the daily transaction rollup used by the statistics dashboard.
+
+Usage:
+    python manage.py backfill_daily_rollups
+    python manage.py backfill_daily_rollups --user 3 --user 7
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from app.summaries import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the per-day, per-category and per-type transaction totals from the transactions.
+    """
+
+    help = 'Backfill the daily transaction rollup from the transactions.'
+
+    def add_arguments(self, parser):
+        """
+        Add the optional list of users to backfill.
+        """
+
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='ID of a user to backfill (repeatable). Defaults to all users.')
+
+    def handle(self, *args, user_ids=None, **options):
+        """
+        Rebuild the rollup and report how many rows were written.
+        """
+
+        rows = rebuild_daily_rollups(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {rows} daily rollup rows.'))
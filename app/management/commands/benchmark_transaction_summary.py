@@ -0,0 +1,110 @@
+"""
+Management command to compare `TransactionQuerySet.summary()` with the separate
+total queries it replaces.
+
+The command creates a temporary user with the requested number of transactions
+inside a database transaction, runs both variants a few times, prints the
+number of queries and the best wall time of each, and rolls everything back.
+
+Usage:
+    python manage.py benchmark_transaction_summary --rows 100000
+"""
+
+
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from app.models import Category, Transaction
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the single-query summary against the per-total aggregate queries.
+    """
+
+    help = 'Compare TransactionQuerySet.summary() with separate total queries.'
+
+    def add_arguments(self, parser):
+        """
+        Add the options for the data size and the number of repeats.
+        """
+
+        parser.add_argument('--rows', type=int, default=100_000, help='Number of transactions to create.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each variant.')
+
+    def handle(self, *args, rows, repeat, **options):
+        """
+        Seed the data, run both variants and print the comparison.
+        """
+
+        with transaction.atomic():
+            queryset = self._seed(rows)
+            start_date = date.today() - timedelta(days=90)
+            filtered = queryset.filter(date__gte=start_date)
+
+            def separate_queries():
+                # What the tracker views did before: overall and filtered totals, one query each
+                return (
+                    queryset.get_total_income(), queryset.get_total_expenses(),
+                    filtered.get_total_income(), filtered.get_total_expenses(),
+                )
+
+            def summary_queries():
+                return queryset.summary(), filtered.summary()
+
+            self.stdout.write(f'{rows} transactions, best of {repeat} runs:')
+            for name, variant in (('separate totals', separate_queries), ('summary()', summary_queries)):
+                queries, seconds = self._measure(variant, repeat)
+                self.stdout.write(f'  {name:<16} {queries} queries  {seconds * 1000:.1f} ms')
+
+            # Discard the benchmark data
+            transaction.set_rollback(True)
+
+    def _seed(self, rows):
+        """
+        Create a benchmark user with `rows` random transactions.
+        """
+
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        categories = [
+            Category.objects.get_or_create(name=name)[0]
+            for name in ('Bills', 'Rent', 'Salary', 'Food', 'Subscriptions')
+        ]
+        today = date.today()
+
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    user=user,
+                    category=random.choice(categories),
+                    type=random.choice(('income', 'expense')),
+                    amount=Decimal(random.randint(100, 100_000)) / 100,
+                    amount_in_usd=Decimal(random.randint(100, 100_000)) / 100,
+                    currency='EUR',
+                    date=today - timedelta(days=random.randint(0, 3650)),
+                )
+                for _ in range(rows)
+            ),
+            batch_size=5000,
+        )
+        return Transaction.objects.filter(user=user)
+
+    def _measure(self, variant, repeat):
+        """
+        Return the number of queries and the best wall time of a variant.
+        """
+
+        best = float('inf')
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                variant()
+                best = min(best, time.perf_counter() - start)
+        return len(context.captured_queries), best
@@ -0,0 +1,57 @@
+"""
+Management command to verify the materialized transaction summaries.
+
+Compares the stored per-user and per-month totals with totals computed from
+the transactions and lists every mismatch. With --fix the affected users are
+rebuilt. Exits with status 1 if mismatches were found and not fixed.
+
+Usage:
+    python manage.py check_transaction_summaries
+    python manage.py check_transaction_summaries --fix
+"""
+
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.summaries import find_inconsistencies, rebuild_summaries
+
+
+class Command(BaseCommand):
+    """
+    Checks the transaction summaries against the transactions.
+    """
+
+    help = 'Check the per-user and per-month transaction summaries for inconsistencies.'
+
+    def add_arguments(self, parser):
+        """
+        Add the options to limit the check to some users and to fix mismatches.
+        """
+
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='ID of a user to check (repeatable). Defaults to all users.')
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the summaries of users with mismatches.')
+
+    def handle(self, *args, user_ids=None, fix=False, **options):
+        """
+        Report mismatches and optionally rebuild the affected users.
+        """
+
+        mismatches = find_inconsistencies(user_ids)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All transaction summaries are consistent.'))
+            return
+
+        for user_id, month, stored, expected in mismatches:
+            period = f'{month:%Y-%m}' if month else 'all time'
+            self.stdout.write(f'user {user_id} ({period}): stored {stored}, expected {expected}')
+
+        affected_users = sorted({user_id for user_id, *_ in mismatches})
+
+        if not fix:
+            raise CommandError(f'{len(mismatches)} inconsistent summaries for {len(affected_users)} users.')
+
+        rebuild_summaries(affected_users)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt summaries of {len(affected_users)} users.'))
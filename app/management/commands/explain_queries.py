@@ -0,0 +1,138 @@
+"""
+Management command to check that the app's canonical queries use indexes.
+
+Runs EXPLAIN for the queries behind the blog listings and the expense tracker
+and reports every query whose plan reads a table sequentially instead of
+through an index.
+
+On small tables the database may rightly prefer a sequential scan. With
+--force-index (PostgreSQL only), sequential scans are disabled for the session,
+so a remaining sequential scan means no index can serve the query at all.
+
+Usage:
+    python manage.py explain_queries
+    python manage.py explain_queries --user 3 --verbose
+    python manage.py explain_queries --force-index --strict
+"""
+
+
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Q, Sum
+
+from app.models import Category, DailyTransactionRollup, Post, Transaction
+
+
+# Plan lines of a sequential table scan: PostgreSQL and SQLite
+SEQUENTIAL_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'(?:^|\s)SCAN (?:TABLE )?(\w+)\s*$'),
+)
+
+
+def canonical_queries(user_id, category_id, author_id):
+    """
+    Returns the queries whose plans are checked.
+
+    Args:
+        user_id (int): The user of the tracker queries.
+        category_id (int): The category of the tracker queries.
+        author_id (int): The author of the blog queries.
+
+    Returns:
+        list: (name, queryset) tuples.
+    """
+
+    transactions = Transaction.objects.filter(user_id=user_id)
+
+    return [
+        ('top posts', Post.objects.order_by('-view_count')[:3]),
+        ('recent posts', Post.objects.order_by('-last_updated', '-id')[:settings.POSTS_PAGE_SIZE]),
+        ('author posts', Post.objects.filter(author_id=author_id).order_by('-last_updated', '-id')[:3]),
+        ('featured post', Post.objects.filter(is_featured=True).order_by('id')[:1]),
+        ('tracker page', transactions.order_by('-date', '-id')[:settings.PAGE_SIZE]),
+        ('tracker page by type', transactions.filter(type='income').order_by('-date', '-id')[:settings.PAGE_SIZE]),
+        ('expenses page', transactions.filter(type='expense').order_by('-date', '-id')[:settings.PAGE_SIZE]),
+        ('tracker page by category', transactions.filter(category_id=category_id).order_by('-date')[:settings.PAGE_SIZE]),
+        ('transaction summary', transactions.order_by().values('category_id').annotate(
+            income=Sum('amount_in_usd', filter=Q(type='income')),
+            expenses=Sum('amount_in_usd', filter=Q(type='expense')),
+            count=Count('id'),
+        )),
+        ('statistics window', DailyTransactionRollup.objects.filter(user_id=user_id, date__gte='2024-01-01')),
+    ]
+
+
+def find_sequential_scans(plan):
+    """
+    Returns the names of the tables that a query plan scans sequentially.
+
+    Args:
+        plan (str): The output of `QuerySet.explain()`.
+
+    Returns:
+        list: The table names, in plan order.
+    """
+
+    tables = []
+    for line in plan.splitlines():
+        for pattern in SEQUENTIAL_SCAN_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+class Command(BaseCommand):
+    """
+    Explains the canonical queries and reports those falling back to sequential scans.
+    """
+
+    help = 'EXPLAIN the canonical queries and report sequential scans.'
+
+    def add_arguments(self, parser):
+        """
+        Add the sample user, the output and the strictness options.
+        """
+
+        parser.add_argument('--user', type=int, dest='user_id',
+                            help='ID of the user of the tracker queries. Defaults to the first user.')
+        parser.add_argument('--force-index', action='store_true',
+                            help='Disable sequential scans while explaining (PostgreSQL only).')
+        parser.add_argument('--strict', action='store_true',
+                            help='Exit with an error if any query uses a sequential scan.')
+        parser.add_argument('--verbose', action='store_true', help='Print every query plan.')
+
+    def handle(self, *args, user_id=None, force_index=False, strict=False, verbose=False, **options):
+        """
+        Explain every query and write a report line per query.
+        """
+
+        user_id = user_id or User.objects.order_by('id').values_list('id', flat=True).first() or 0
+        category_id = Category.objects.order_by('id').values_list('id', flat=True).first() or 0
+        author_id = Post.objects.order_by('id').values_list('author_id', flat=True).first() or 0
+
+        flagged = []
+        with db_transaction.atomic():
+            if force_index and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in canonical_queries(user_id, category_id, author_id):
+                plan = queryset.explain()
+                tables = find_sequential_scans(plan)
+
+                if tables:
+                    flagged.append(name)
+                    self.stdout.write(self.style.WARNING(f'{name}: sequential scan on {", ".join(tables)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+                if verbose or tables:
+                    self.stdout.write(f'    {plan}'.replace('\n', '\n    '))
+
+        if flagged and strict:
+            raise CommandError(f'{len(flagged)} queries use sequential scans: {", ".join(flagged)}')
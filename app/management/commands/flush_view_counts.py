@@ -0,0 +1,36 @@
+"""
+Management command to write all buffered post views to the database.
+
+The views are buffered in the cache, so the command only sees the views
+recorded by the web workers if the cache is shared (see `app/checks.py`).
+
+Usage:
+    python manage.py flush_view_counts
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from app.checks import cache_is_shared
+from app.view_counter import flush_view_counts
+
+
+class Command(BaseCommand):
+    """
+    Forces a flush of the buffered post view counters to `Post.view_count`.
+    """
+
+    help = 'Write buffered post views to the database.'
+
+    def handle(self, *args, **options):
+        """
+        Flush the pending views of all posts and report how many were written.
+        """
+
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process, so the views buffered by the web workers are not seen.'
+            ))
+
+        total = flush_view_counts()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} buffered views.'))
@@ -0,0 +1,65 @@
+"""
+Management command to load historical exchange rates into the rate history.
+
+Usage:
+    python manage.py import_exchange_rates rates.csv
+    python manage.py import_exchange_rates rates.json
+    python manage.py import_exchange_rates --latest
+"""
+
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import rate_history
+from app.utils import fetch_exchange_rates
+
+
+class Command(BaseCommand):
+    """
+    Imports exchange rates from a CSV or JSON dump, or the latest rates from the API.
+
+    CSV files need the columns 'date', 'currency' and 'rate'. JSON files map ISO
+    dates to objects of currency codes and rates. Existing rates of the same
+    currency and date are overwritten, so imports can be repeated safely.
+    """
+
+    help = 'Import historical exchange rates from a CSV/JSON dump or the API.'
+
+    def add_arguments(self, parser):
+        """
+        Add the dump file and the options to choose its format or fetch from the API.
+        """
+
+        parser.add_argument('path', nargs='?', help='CSV or JSON file with the rates.')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='Format of the file. Defaults to its extension.')
+        parser.add_argument('--latest', action='store_true',
+                            help="Fetch the latest rates from the API and store them as today's rates.")
+
+    def handle(self, *args, path=None, format=None, latest=False, **options):
+        """
+        Store the rates and report how many were written.
+        """
+
+        if latest:
+            rates = fetch_exchange_rates()
+            if not rates:
+                raise CommandError('The exchange rate API did not return any rates.')
+            written = rate_history.record_rates(rates)
+
+        elif path:
+            format = format or path.rsplit('.', 1)[-1].lower()
+            readers = {'csv': rate_history.read_csv, 'json': rate_history.read_json}
+            if format not in readers:
+                raise CommandError(f'Unknown format: {format}. Use --format csv or --format json.')
+
+            try:
+                with open(path, newline='', encoding='utf-8') as file:
+                    written = rate_history.store_rates(readers[format](file))
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f'Could not import {path}: {error}') from error
+
+        else:
+            raise CommandError('Pass a file to import or --latest.')
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {written} exchange rates.'))
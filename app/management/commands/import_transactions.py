@@ -0,0 +1,89 @@
+"""
+Management command to import a user's transactions from a CSV file or an OFX bank statement.
+
+Usage:
+    python manage.py import_transactions statement.csv --user alice
+    python manage.py import_transactions statement.ofx --user 3 --default-category Bank --create-categories
+    python manage.py import_transactions statement.csv --user alice --dry-run
+"""
+
+
+import csv
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app import imports
+
+
+class Command(BaseCommand):
+    """
+    Imports transactions in bulk and reports the created, skipped and rejected rows.
+
+    See `app/imports.py` for the file formats. Rows whose external ID was
+    already imported for the user are skipped, so imports can be repeated safely.
+    """
+
+    help = 'Import transactions of a user from a CSV file or an OFX bank statement.'
+
+    def add_arguments(self, parser):
+        """
+        Add the file, the owner and the import options.
+        """
+
+        parser.add_argument('path', help='CSV or OFX file with the transactions.')
+        parser.add_argument('--user', required=True, help='Username or ID of the owner of the transactions.')
+        parser.add_argument('--format', choices=imports.FORMATS,
+                            help='Format of the file. Defaults to its extension.')
+        parser.add_argument('--default-category',
+                            help='Category of the rows without one (OFX statements have none).')
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create the categories that do not exist yet instead of rejecting their rows.')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Number of rows converted and inserted per chunk.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the rows and report the outcome without writing anything.')
+
+    def handle(self, *args, path, user, format=None, default_category=None, create_categories=False,
+               chunk_size=None, dry_run=False, **options):
+        """
+        Import the file and write the report.
+        """
+
+        lookup = {'pk': user} if user.isdigit() else {'username': user}
+        try:
+            owner = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f'User not found: {user}')
+
+        if chunk_size is not None and chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        importer = imports.TransactionImporter(
+            owner, chunk_size=chunk_size, create_categories=create_categories, dry_run=dry_run,
+        )
+
+        started = time.perf_counter()
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as file:
+                rows = imports.read_file(file, format or imports.guess_format(path), default_category)
+                report = importer.run(rows)
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(f'Could not import {path}, nothing was imported: {error}') from error
+        elapsed = time.perf_counter() - started
+
+        for line, message in report.errors:
+            self.stdout.write(self.style.WARNING(f'  line {line}: {message}'))
+        if report.error_count > len(report.errors):
+            self.stdout.write(self.style.WARNING(f'  ... and {report.error_count - len(report.errors)} more'))
+
+        verb = 'would be created' if dry_run else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} transactions {verb} in {elapsed:.1f}s, '
+            f'{report.duplicates} already imported, {report.error_count} rejected.'
+        ))
+        if report.unconverted:
+            self.stdout.write(self.style.WARNING(
+                f'{report.unconverted} transactions stored with 0 EUR for lack of an exchange rate.'
+            ))
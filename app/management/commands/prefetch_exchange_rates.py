@@ -0,0 +1,93 @@
+"""
+Management command to refresh the exchange rates outside of the request cycle.
+
+Run it from cron more often than `EXCHANGE_RATES_TTL`, or as a long-lived
+process with --loop, so the cached rates never go stale on the request path.
+The web workers see the new rates through the shared cache, or through the
+database snapshot once their cached copy of it expires
+(`EXCHANGE_RATES_SNAPSHOT_TIMEOUT`).
+
+Usage:
+    python manage.py prefetch_exchange_rates
+    python manage.py prefetch_exchange_rates --loop
+    python manage.py prefetch_exchange_rates --loop --interval 600
+"""
+
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.utils import get_fetch_stats, prefetch_exchange_rates
+
+
+# Seconds to wait before retrying a failed fetch, doubled after every further failure
+RETRY_DELAY = 30
+
+
+class Command(BaseCommand):
+    """
+    Fetches the exchange rates into the cache, once or in a loop, and reports latency and failures.
+    """
+
+    help = 'Refresh the cached exchange rates, once (for cron) or in a loop.'
+
+    def add_arguments(self, parser):
+        """
+        Add the loop mode, its interval and an optional number of refreshes.
+        """
+
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and refresh the rates every --interval seconds.')
+        parser.add_argument('--interval', type=int, default=settings.EXCHANGE_RATES_PREFETCH_INTERVAL,
+                            help='Seconds between refreshes in loop mode.')
+        parser.add_argument('--count', type=int, default=None,
+                            help='Stop the loop after this many refreshes. Defaults to running forever.')
+
+    def handle(self, *args, loop=False, interval=None, count=None, **options):
+        """
+        Refresh the rates and report the outcome of every fetch.
+        """
+
+        if not loop:
+            if not self.refresh():
+                raise CommandError('Fetching the exchange rates failed.')
+            return
+
+        runs = 0
+        while count is None or runs < count:
+            success = self.refresh()
+            runs += 1
+            if count is not None and runs >= count:
+                break
+
+            if success:
+                delay = interval
+            else:
+                # Retry sooner after a failure, backing off while the API keeps failing
+                failures = get_fetch_stats()['consecutive_failures']
+                delay = min(interval, RETRY_DELAY * 2 ** (failures - 1))
+            time.sleep(delay)
+
+    def refresh(self):
+        """
+        Fetch the rates once and write the latency and failure counts.
+
+        Returns:
+            bool: True if the rates were refreshed.
+        """
+
+        rates = prefetch_exchange_rates()
+        stats = get_fetch_stats()
+
+        if rates:
+            self.stdout.write(self.style.SUCCESS(
+                f"Fetched {len(rates)} exchange rates in {stats['last_latency']:.3f}s."
+            ))
+        else:
+            self.stderr.write(self.style.ERROR(
+                f"Fetching the exchange rates failed after {stats['last_latency']:.3f}s "
+                f"({stats['consecutive_failures']} consecutive failures, {stats['failures']} in total)."
+            ))
+        return bool(rates)
@@ -0,0 +1,30 @@
+"""
+Management command to recompute the post search index.
+
+Useful after posts were changed without sending model signals
+(e.g. by `QuerySet.update()` or raw SQL).
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the full-text search index of all posts.
+    """
+
+    help = 'Rebuild the full-text search index of all posts.'
+
+    def handle(self, *args, **options):
+        """
+        Recompute the search vector (or in-memory index) of every post.
+        """
+
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
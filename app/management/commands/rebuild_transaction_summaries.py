@@ -0,0 +1,36 @@
+"""
+Management command to recompute the materialized transaction summaries.
+
+Usage:
+    python manage.py rebuild_transaction_summaries
+    python manage.py rebuild_transaction_summaries --user 3 --user 7
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from app.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the per-user and per-month transaction totals from the transactions.
+    """
+
+    help = 'Rebuild the per-user and per-month transaction summaries.'
+
+    def add_arguments(self, parser):
+        """
+        Add the optional list of users to rebuild.
+        """
+
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='ID of a user to rebuild (repeatable). Defaults to all users.')
+
+    def handle(self, *args, user_ids=None, **options):
+        """
+        Rebuild the summaries and report how many monthly rows were written.
+        """
+
+        rows = rebuild_summaries(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} monthly summaries.'))
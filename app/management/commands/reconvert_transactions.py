@@ -0,0 +1,187 @@
+"""
+Management command to recompute `amount_in_usd` of the transactions in bulk.
+
+Run it after exchange rates were corrected or imported. Transactions are
+streamed in chunks of ascending id, grouped by currency and converted with the
+rate in effect on their date (see `app/rate_history.py`), falling back to the
+latest rates for currencies without history. Only changed rows are written,
+with `bulk_update`, and the summaries of the affected users are rebuilt (of
+all users at once when no currency filter is given).
+
+Usage:
+    python manage.py reconvert_transactions
+    python manage.py reconvert_transactions --dry-run
+    python manage.py reconvert_transactions --currency SEK --chunk-size 5000
+"""
+
+
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+
+from app import rate_history
+from app.models import Transaction
+from app.summaries import rebuild_daily_rollups, rebuild_summaries
+from app.utils import get_exchange_rates
+
+
+CENT = Decimal('0.01')
+
+# Users whose summaries are rebuilt together, to keep the IN lists of the rebuild short
+USERS_PER_REBUILD = 500
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the converted amounts of all transactions, reporting progress and throughput.
+    """
+
+    help = 'Recompute amount_in_usd of all transactions with the stored exchange rates.'
+
+    def add_arguments(self, parser):
+        """
+        Add the chunk size, currency filter and dry-run options.
+        """
+
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of transactions read and written per chunk.')
+        parser.add_argument('--currency', action='append', dest='currencies',
+                            help='Only reconvert transactions in this currency (repeatable).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the changes without writing them.')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Number of changed transactions listed in a dry run.')
+
+    def handle(self, *args, chunk_size=2000, currencies=None, dry_run=False, show=20, **options):
+        """
+        Reconvert the transactions chunk by chunk and report the totals.
+        """
+
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        self.history = rate_history.get_history()
+        self.latest_rates = get_exchange_rates() or {}
+
+        transactions = Transaction.objects.only('id', 'user_id', 'amount', 'currency', 'date', 'amount_in_usd')
+        if currencies:
+            transactions = transactions.filter(currency__in=currencies)
+
+        started = time.perf_counter()
+        processed = changed = missing = 0
+        affected_users = set()
+        last_id = 0
+
+        while True:
+            chunk = list(transactions.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            updates, chunk_missing = self.convert_chunk(chunk)
+            processed += len(chunk)
+            changed += len(updates)
+            missing += chunk_missing
+
+            if dry_run:
+                for transaction, old in updates:
+                    if show > 0:
+                        self.stdout.write(
+                            f'  #{transaction.id} {transaction.amount} {transaction.currency} '
+                            f'on {transaction.date}: {old} -> {transaction.amount_in_usd}'
+                        )
+                        show -= 1
+            elif updates:
+                Transaction.objects.bulk_update(
+                    [transaction for transaction, _ in updates], ['amount_in_usd'], batch_size=chunk_size,
+                )
+                affected_users.update(transaction.user_id for transaction, _ in updates)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{processed} processed, {changed} changed ({processed / elapsed:.0f} rows/s)'
+            )
+
+        # bulk_update skips the signals that maintain the summaries
+        if affected_users:
+            self.rebuild(sorted(affected_users) if currencies else None)
+
+        elapsed = time.perf_counter() - started
+        verb = 'would change' if dry_run else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} transactions processed in {elapsed:.1f}s '
+            f'({processed / elapsed if elapsed else 0:.0f} rows/s), {changed} {verb}.'
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} transactions skipped without an exchange rate.'))
+
+    def rebuild(self, user_ids):
+        """
+        Rebuilds the summaries and daily rollups of the affected users.
+
+        Without a currency filter most users are usually affected, so everything
+        is rebuilt at once; otherwise the users are rebuilt `USERS_PER_REBUILD`
+        at a time.
+
+        Args:
+            user_ids (list or None): The affected users, or None to rebuild all users.
+        """
+
+        if user_ids is None:
+            with db_transaction.atomic():
+                rebuild_summaries()
+                rebuild_daily_rollups()
+            return
+
+        for start in range(0, len(user_ids), USERS_PER_REBUILD):
+            chunk = user_ids[start:start + USERS_PER_REBUILD]
+            with db_transaction.atomic():
+                rebuild_summaries(chunk)
+                rebuild_daily_rollups(chunk)
+
+    def convert_chunk(self, chunk):
+        """
+        Converts a chunk of transactions, one pass per currency.
+
+        Args:
+            chunk (list): The transactions to convert.
+
+        Returns:
+            tuple: A list of (transaction, old amount_in_usd) for every changed
+                   transaction, and the number of transactions without a rate.
+        """
+
+        by_currency = defaultdict(list)
+        for transaction in chunk:
+            by_currency[transaction.currency].append(transaction)
+
+        updates = []
+        missing = 0
+
+        for currency, transactions in by_currency.items():
+            latest = self.latest_rates.get(currency)
+            latest = Decimal(str(latest)) if latest else None
+
+            # Rates per date of this currency, looked up once per distinct date
+            rates = {}
+            for transaction in transactions:
+                if transaction.date not in rates:
+                    rates[transaction.date] = self.history.get_rate(currency, transaction.date) or latest
+
+            converted = [
+                (transaction, (transaction.amount / rates[transaction.date]).quantize(CENT))
+                if rates[transaction.date] else (transaction, None)
+                for transaction in transactions
+            ]
+
+            for transaction, amount_in_usd in converted:
+                if amount_in_usd is None:
+                    missing += 1
+                elif amount_in_usd != transaction.amount_in_usd:
+                    updates.append((transaction, transaction.amount_in_usd))
+                    transaction.amount_in_usd = amount_in_usd
+
+        return updates, missing
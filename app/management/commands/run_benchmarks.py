@@ -0,0 +1,238 @@
+"""
+Management command to benchmark every view and `TransactionQuerySet` method at several data scales.
+
+For each scale, a synthetic dataset is seeded (see `app/seeding.py`) inside a
+database transaction. Every URL of `app/urls.py` is then requested a number of
+rounds as one of the seeded users, and every `TransactionQuerySet` method is
+run on that user's transactions. The median, 95th percentile and mean time and
+the number of queries of each are written to a JSON file, so runs can be
+compared over time. The dataset is rolled back afterwards.
+
+Usage:
+    python manage.py run_benchmarks
+    python manage.py run_benchmarks --scales small medium --rounds 20 --output results.json
+"""
+
+
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from app.instrumentation import percentile
+from app.models import Transaction
+from app.seeding import SCALES, DatasetSeeder
+from app.urls import urlpatterns
+
+
+def _measure(run, rounds):
+    """
+    Runs a callable a number of rounds after one warm-up run.
+
+    Returns:
+        tuple: A dict with the median, 95th percentile and mean time in milliseconds
+               and the largest number of queries of a run, and the result of the last run.
+    """
+
+    result = run()
+
+    timings = []
+    queries = 0
+    for _ in range(rounds):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            result = run()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(context.captured_queries))
+
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': queries,
+    }, result
+
+
+def view_requests(client, seeder, user):
+    """
+    Returns the callables sending the request of each URL name, with arguments from the seeded data.
+
+    The delete requests remove the transactions of another seeded user, so the
+    views and methods timed afterwards see the same data as the ones before.
+
+    Args:
+        client (Client): The client, logged in as `user`.
+        seeder (DatasetSeeder): The seeder of the dataset, with at least two users.
+        user (User): The user whose transactions are requested.
+
+    Returns:
+        dict: URL names mapped to callables returning the response.
+    """
+
+    post = seeder.posts[0]
+    tag = seeder.tags[0]
+    transaction = Transaction.objects.filter(user=user).order_by('id').first()
+
+    # Each delete request removes the other user's newest transaction left
+    other_user = next(seeded for seeded in seeder.users if seeded.pk != user.pk)
+    delete_client = Client()
+    delete_client.force_login(other_user)
+    deletable = list(
+        Transaction.objects.filter(user=other_user).order_by('-id').values_list('id', flat=True)[:1000]
+    )[::-1]
+
+    def export():
+        response = client.get(reverse('export-transactions'), {'transaction_type': 'expense'})
+        b''.join(response.streaming_content)
+        return response
+
+    requests = {
+        'post_page': lambda: client.get(reverse('post_page', args=[post.slug])),
+        'tag_page': lambda: client.get(reverse('tag_page', args=[tag.slug])),
+        'author_page': lambda: client.get(reverse('author_page', args=[post.author.profile.slug])),
+        'search': lambda: client.get(reverse('search'), {'q': post.title.split()[0]}),
+        'bookmark_post': lambda: client.post(reverse('bookmark_post', args=[post.slug]), {'post_id': post.pk}),
+        'like_post': lambda: client.post(reverse('like_post', args=[post.slug]), {'post_id': post.pk}),
+        'update-transaction': lambda: client.get(reverse('update-transaction', args=[transaction.pk])),
+        'delete-transaction': lambda: delete_client.delete(reverse('delete-transaction', args=[deletable.pop()])),
+        'get-transactions': lambda: client.get(reverse('get-transactions'), headers={'HX-Request': 'true'}),
+        'statistic-data': lambda: client.get(reverse('statistic-data'), {'days': 365}),
+        'export-transactions': export,
+    }
+
+    # URLs without arguments are requested with a plain GET
+    for pattern in urlpatterns:
+        if pattern.name not in requests:
+            requests[pattern.name] = lambda name=pattern.name: client.get(reverse(name))
+    return requests
+
+
+def queryset_methods(user):
+    """
+    Returns the callables running each `TransactionQuerySet` method on the user's transactions.
+
+    The filtering methods are evaluated with `count()`.
+    """
+
+    transactions = Transaction.objects.filter(user=user)
+    return {
+        'get_expenses': lambda: transactions.get_expenses().count(),
+        'get_income': lambda: transactions.get_income().count(),
+        'get_total_expenses': transactions.get_total_expenses,
+        'get_total_income': transactions.get_total_income,
+        'summary': transactions.summary,
+    }
+
+
+class Command(BaseCommand):
+    """
+    Times the views and the transaction queryset methods at several data scales and writes JSON results.
+    """
+
+    help = 'Benchmark every view and TransactionQuerySet method at several data scales.'
+
+    def add_arguments(self, parser):
+        """
+        Add the scales, the number of rounds, the seed and the output file.
+        """
+
+        parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small'],
+                            help='Dataset sizes to benchmark. Defaults to small.')
+        parser.add_argument('--rounds', type=int, default=10, help='Timed runs of each view and method.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the datasets.')
+        parser.add_argument('--output', help='JSON file to write. Defaults to benchmarks/<timestamp>.json.')
+
+    def handle(self, *args, scales, rounds=10, seed=0, output=None, **options):
+        """
+        Benchmark each scale and write the results.
+        """
+
+        if rounds < 1:
+            raise CommandError('--rounds must be positive.')
+
+        started_at = datetime.now()
+        results = {
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'rounds': rounds,
+            'seed': seed,
+            'scales': [],
+        }
+
+        for name in scales:
+            self.stdout.write(f'Scale {name}:')
+            results['scales'].append(self.benchmark_scale(name, rounds, seed))
+
+        path = Path(output or Path('benchmarks') / f'{started_at:%Y%m%d-%H%M%S}.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {path}.'))
+
+    def benchmark_scale(self, name, rounds, seed):
+        """
+        Seed a dataset of a scale, time the views and methods on it and roll it back.
+
+        Returns:
+            dict: The counts and seeding times of the dataset and the results of each view and method.
+        """
+
+        with db_transaction.atomic():
+            seeder = DatasetSeeder(SCALES[name], seed=seed, log=lambda message: self.stdout.write(f'  {message}'))
+            seeder.seed()
+            user = seeder.users[0]
+
+            # The test client's host has to be allowed
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                client = Client()
+                client.force_login(user)
+
+                views = {}
+                for view, request in sorted(view_requests(client, seeder, user).items()):
+                    views[view], response = _measure(request, rounds)
+                    views[view]['status'] = response.status_code
+                    self._report(view, views[view])
+
+            methods = {}
+            for method, run in queryset_methods(user).items():
+                methods[method], _ = _measure(run, rounds)
+                self._report(method, methods[method])
+
+            # Discard the benchmark data
+            db_transaction.set_rollback(True)
+
+        seeder.forget_cached_data()
+
+        return {
+            'scale': name,
+            'counts': SCALES[name]._asdict(),
+            'user_transactions': SCALES[name].transactions // SCALES[name].users,
+            'seed_seconds': {step: round(seconds, 3) for step, seconds in seeder.timings.items()},
+            'views': views,
+            'queryset_methods': methods,
+        }
+
+    def _report(self, name, result):
+        """
+        Write the p95 time and queries of a view or method, warning about failed requests.
+        """
+
+        line = f'  {name:<24} {result["p95_ms"]:>9.1f} ms p95  {result["queries"]} queries'
+        if result.get('status', 200) >= 400:
+            self.stdout.write(self.style.WARNING(f'{line}  (status {result["status"]})'))
+        else:
+            self.stdout.write(line)
+
@@ -0,0 +1,61 @@
+"""
+Management command to seed a large synthetic dataset (see `app/seeding.py`).
+
+Usage:
+    python manage.py seed_data --scale small
+    python manage.py seed_data --scale large --seed 42
+    python manage.py seed_data --scale medium --transactions 5000000 --batch-size 10000
+"""
+
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+
+from app.seeding import SCALES, DatasetSeeder
+
+
+class Command(BaseCommand):
+    """
+    Seeds users, posts, tags, comments, likes, bookmarks and transactions with bulk inserts.
+    """
+
+    help = 'Seed a large synthetic dataset of users, blog posts and transactions.'
+
+    def add_arguments(self, parser):
+        """
+        Add the scale, the per-kind overrides, the seed and the batch size.
+        """
+
+        parser.add_argument('--scale', choices=SCALES, default='small',
+                            help='Predefined dataset size. Defaults to small.')
+        for field in SCALES['small']._fields:
+            parser.add_argument(f'--{field}', type=int, help=f'Number of {field}, overriding the scale.')
+        parser.add_argument('--seed', type=int, help='Seed of the random values, for repeatable datasets.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per batch.')
+
+    def handle(self, *args, scale, seed=None, batch_size=5000, **options):
+        """
+        Seed the dataset in one database transaction and report the time of each step.
+        """
+
+        overrides = {field: options[field] for field in SCALES[scale]._fields if options.get(field) is not None}
+        counts = SCALES[scale]._replace(**overrides)
+
+        if counts.users < 1:
+            raise CommandError('At least one user is needed.')
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        self.stdout.write(', '.join(f'{count} {field}' for field, count in counts._asdict().items()))
+
+        seeder = DatasetSeeder(counts, batch_size=batch_size, seed=seed, log=self.stdout.write)
+        started = time.perf_counter()
+        with db_transaction.atomic():
+            seeder.seed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded the dataset in {time.perf_counter() - started:.1f}s '
+            f'(users are named {seeder.prefix}-user<N>).'
+        ))
@@ -1,8 +1,12 @@
 """
-Custom QuerySet for filtering and aggregating transaction data.
+Custom QuerySets for filtering and aggregating transaction data and for
+loading blog posts efficiently.
 """
 
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Coalesce
 
 
 class TransactionQuerySet(models.QuerySet):
@@ -62,3 +66,129 @@ class TransactionQuerySet(models.QuerySet):
         return self.get_income().aggregate(
             total=models.Sum('amount_in_usd')
         )['total'] or 0
+
+
+    def summary(self):
+        """
+        Calculates all headline figures of the transactions in a single query.
+
+        The transactions are grouped by category once, with conditional sums for
+        income and expenses; the overall totals are then added up from the
+        per-category rows in Python.
+
+        Returns:
+            dict: A dictionary with the keys:
+                income (Decimal): Total income in EUR.
+                expenses (Decimal): Total expenses in EUR.
+                net (Decimal): Income minus expenses.
+                count (int): Number of transactions.
+                first_date (date or None): Date of the earliest transaction.
+                last_date (date or None): Date of the latest transaction.
+                categories (list): One dict per category with 'category_id',
+                    'name', 'income', 'expenses' and 'count', ordered by name.
+        """
+
+        zero = models.Value(0, output_field=models.DecimalField(max_digits=14, decimal_places=2))
+
+        rows = list(
+            self.order_by()  # the default ordering would add 'date' to the GROUP BY
+            .values('category_id', 'category__name')
+            .annotate(
+                income=Coalesce(models.Sum('amount_in_usd', filter=models.Q(type='income')), zero),
+                expenses=Coalesce(models.Sum('amount_in_usd', filter=models.Q(type='expense')), zero),
+                count=models.Count('id'),
+                first_date=models.Min('date'),
+                last_date=models.Max('date'),
+            )
+            .order_by('category__name')
+        )
+
+        categories = [
+            {
+                'category_id': row['category_id'],
+                'name': row['category__name'],
+                'income': row['income'],
+                'expenses': row['expenses'],
+                'count': row['count'],
+            }
+            for row in rows
+        ]
+
+        income = sum((row['income'] for row in rows), Decimal('0.00'))
+        expenses = sum((row['expenses'] for row in rows), Decimal('0.00'))
+
+        return {
+            'income': income,
+            'expenses': expenses,
+            'net': income - expenses,
+            'count': sum(row['count'] for row in rows),
+            'first_date': min((row['first_date'] for row in rows), default=None),
+            'last_date': max((row['last_date'] for row in rows), default=None),
+            'categories': categories,
+        }
+
+
+class PostQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for loading blog posts.
+
+    This class provides a helper method that loads everything a post card
+    template needs (author, author profile and tags) up front, so rendering
+    a list of cards does not run extra queries per post.
+    """
+
+    def for_cards(self):
+        """
+        Eagerly loads the author, the author's profile and the tags of each post.
+
+        The author and profile are joined in the same query, and the tags of all
+        posts are fetched with one extra query, so `post.tags.all.0.name`,
+        `post.author.first_name` and `post.author.profile.profile_image.url`
+        are served from memory in the templates.
+
+        Returns:
+            QuerySet: A QuerySet of posts ready to be rendered as cards.
+        """
+
+        return self.select_related('author__profile').prefetch_related('tags')
+
+    def for_listing(self):
+        """
+        Loads post cards with only the columns the listing templates display.
+
+        The post content and search vector, which can be large, are not loaded.
+
+        Returns:
+            QuerySet: A QuerySet of posts ready to be rendered in listings.
+        """
+
+        return self.for_cards().only(
+            'title', 'slug', 'image', 'last_updated', 'author',
+            'author__first_name', 'author__profile__profile_image',
+        )
+
+    def top(self, limit=3):
+        """
+        Returns the most viewed posts as cards.
+
+        Args:
+            limit (int): The number of posts to return.
+
+        Returns:
+            QuerySet: The posts ordered by view count in descending order.
+        """
+
+        return self.for_cards().order_by('-view_count')[:limit]
+
+    def recent(self, limit=3):
+        """
+        Returns the most recently updated posts as cards.
+
+        Args:
+            limit (int): The number of posts to return.
+
+        Returns:
+            QuerySet: The posts ordered by last update in descending order.
+        """
+
+        return self.for_cards().order_by('-last_updated')[:limit]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:22
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    """
+    Fill the search vector of existing posts (PostgreSQL only).
+    """
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        "UPDATE app_post SET search_vector = "
+        "setweight(to_tsvector('english', COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector('english', COALESCE(content, '')), 'B')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_delete_expense_alter_transaction_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='app_post_search_vector_gin'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
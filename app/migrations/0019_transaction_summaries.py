@@ -0,0 +1,83 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncMonth
+
+
+def backfill_summaries(apps, schema_editor):
+    """
+    Compute the summaries of the existing transactions.
+    """
+
+    Transaction = apps.get_model('app', 'Transaction')
+    UserTransactionSummary = apps.get_model('app', 'UserTransactionSummary')
+    MonthlyTransactionSummary = apps.get_model('app', 'MonthlyTransactionSummary')
+
+    rows = (
+        Transaction.objects
+        .annotate(month=TruncMonth('date'))
+        .order_by()
+        .values('user_id', 'month')
+        .annotate(
+            income=models.Sum('amount_in_usd', filter=models.Q(type='income')),
+            expenses=models.Sum('amount_in_usd', filter=models.Q(type='expense')),
+            count=models.Count('id'),
+        )
+    )
+
+    totals = {}
+    monthly = []
+    for row in rows:
+        income, expenses = row['income'] or 0, row['expenses'] or 0
+        monthly.append(MonthlyTransactionSummary(
+            user_id=row['user_id'], month=row['month'], income=income, expenses=expenses, count=row['count'],
+        ))
+        total = totals.setdefault(row['user_id'], UserTransactionSummary(user_id=row['user_id']))
+        total.income += income
+        total.expenses += expenses
+        total.count += row['count']
+
+    MonthlyTransactionSummary.objects.bulk_create(monthly)
+    UserTransactionSummary.objects.bulk_create(totals.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0018_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTransactionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyTransactionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_transaction_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlytransactionsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_monthly_summary_per_user'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
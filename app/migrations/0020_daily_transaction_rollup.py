@@ -0,0 +1,52 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Compute the daily rollup of the existing transactions.
+    """
+
+    Transaction = apps.get_model('app', 'Transaction')
+    DailyTransactionRollup = apps.get_model('app', 'DailyTransactionRollup')
+
+    rows = (
+        Transaction.objects
+        .order_by()
+        .values('user_id', 'date', 'category_id', 'type')
+        .annotate(total=models.Sum('amount_in_usd'), count=models.Count('id'))
+    )
+    DailyTransactionRollup.objects.bulk_create(
+        (DailyTransactionRollup(**row) for row in rows.iterator()), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0019_transaction_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=7)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_transaction_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailytransactionrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'category', 'type'), name='unique_daily_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
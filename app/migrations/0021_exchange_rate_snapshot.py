@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_daily_transaction_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rates', models.JSONField()),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
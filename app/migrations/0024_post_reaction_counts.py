@@ -0,0 +1,45 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:41
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    """
+    Count the existing likes and bookmarks of every post.
+    """
+
+    Post = apps.get_model('app', 'Post')
+
+    for field, counter in (('likes', 'like_count'), ('bookmarks', 'bookmark_count')):
+        through = getattr(Post, field).through
+        counts = (
+            through.objects
+            .filter(post_id=models.OuterRef('pk'))
+            .order_by()
+            .values('post_id')
+            .annotate(count=models.Count('id'))
+            .values('count')
+        )
+        Post.objects.update(**{counter: Coalesce(models.Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_listing_and_tracker_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.16 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_post_reaction_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id__isnull', False)), fields=('user', 'external_id'), name='unique_transaction_external_id'),
+        ),
+    ]
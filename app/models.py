@@ -2,18 +2,21 @@
 Django models for user profiles, blog posts, subscriptions, transactions, and website metadata.
 
 This module includes models for user profiles, subscription management, blog posts,
-comments, transaction records, and website metadata for a finance or blogging application.
+comments, transaction records, materialized transaction summaries, and website metadata
+for a finance or blogging application.
 It also includes custom managers and methods to handle functionality such as slug generation,
 like counts, and transaction filtering.
 """
 
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 
 # Local import
-from .managers import TransactionQuerySet
+from .managers import TransactionQuerySet, PostQuerySet
 
 
 class Profile(models.Model):
@@ -96,13 +99,37 @@ class Post(models.Model):
     bookmarks = models.ManyToManyField(User, related_name='bookmarks', default=None, blank=True)
     likes = models.ManyToManyField(User, related_name='likes', default=None, blank=True)
 
+    # Denormalized numbers of likes and bookmarks, kept in sync by app/reactions.py
+    like_count = models.PositiveIntegerField(default=0)
+    bookmark_count = models.PositiveIntegerField(default=0)
+
+    # Precomputed full-text search vector of title and content (PostgreSQL only, see app/search.py)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    # Using custom manager for loading post cards
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        """
+        Meta options with the indexes of the post listings: most viewed, most
+        recently updated (overall and per author) and featured posts, and the
+        GIN index of the full-text search.
+        """
+
+        indexes = [
+            models.Index(fields=['-view_count'], name='post_view_count_idx'),
+            models.Index(fields=['-last_updated', '-id'], name='post_last_updated_idx'),
+            models.Index(fields=['author', '-last_updated', '-id'], name='post_author_updated_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_featured=True), name='post_featured_idx'),
+            GinIndex(fields=['search_vector'], name='app_post_search_vector_gin'),
+        ]
 
     def number_of_likes(self):
         """
         Return the number of likes the post has received.
         """
 
-        return self.likes.count
+        return self.like_count
 
     def __str__(self):
         """
@@ -180,6 +207,9 @@ class Transaction(models.Model):
     amount_in_usd = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     date = models.DateField()
 
+    # ID of the transaction in an imported file (e.g. the bank's FITID), so re-imports skip it
+    external_id = models.CharField(max_length=255, null=True, blank=True)
+
     # Using custom manager for transaction filtering
     objects = TransactionQuerySet.as_manager()
 
@@ -193,7 +223,167 @@ class Transaction(models.Model):
 
     class Meta:
         """
-        Meta options for ordering transactions by date in descending order.
+        Meta options for ordering transactions by date in descending order, with
+        the indexes of the tracker queries, which always filter by user, and
+        one imported transaction per external ID and user.
         """
 
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', '-date', '-id'], name='txn_user_date_idx'),
+            models.Index(fields=['user', 'type', '-date', '-id'], name='txn_user_type_date_idx'),
+            models.Index(fields=['user', 'category', '-date'], name='txn_user_category_date_idx'),
+            models.Index(
+                fields=['user', '-date', '-id'], condition=models.Q(type='expense'), name='txn_user_expense_idx',
+            ),
+            # Covering indexes of the aggregates (index-only scans on PostgreSQL): totals per category
+            # for TransactionQuerySet.summary(), totals per date for the summary and rollup rebuilds
+            models.Index(
+                fields=['user', 'category'], include=['type', 'amount_in_usd', 'date'],
+                name='app_txn_user_category_cover',
+            ),
+            models.Index(
+                fields=['user', 'date'], include=['type', 'category', 'amount_in_usd'],
+                name='app_txn_user_date_cover',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'external_id'],
+                condition=models.Q(external_id__isnull=False),
+                name='unique_transaction_external_id',
+            ),
+        ]
+
+
+class UserTransactionSummary(models.Model):
+    """
+    Model to store the running income and expense totals of a user.
+
+    Kept up to date incrementally on every transaction change (see `app/summaries.py`),
+    so headline totals do not need an aggregate over all the user's transactions.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='transaction_summary')
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """
+        Return a string representation of the summary, including totals and user.
+        """
+
+        return f"{self.user}: income {self.income}, expenses {self.expenses}"
+
+
+class MonthlyTransactionSummary(models.Model):
+    """
+    Model to store the income and expense totals of a user for one month.
+
+    The month is stored as the first day of the month.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_transaction_summaries')
+    month = models.DateField()
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        Meta options for one summary per user and month, ordered by month in descending order.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_monthly_summary_per_user'),
+        ]
+        ordering = ['-month']
+
+    def __str__(self):
+        """
+        Return a string representation of the summary, including month, totals and user.
+        """
+
+        return f"{self.user} {self.month:%Y-%m}: income {self.income}, expenses {self.expenses}"
+
+
+class DailyTransactionRollup(models.Model):
+    """
+    Model to store the pre-aggregated transactions of a user per day, category and type.
+
+    Kept up to date incrementally on every transaction change (see `app/summaries.py`)
+    and read by the statistics dashboard instead of the raw transactions.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_transaction_rollups')
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    type = models.CharField(max_length=7, choices=Transaction.TRANSACTION_TYPE_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        Meta options for one rollup row per user, day, category and type.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'category', 'type'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        """
+        Return a string representation of the rollup, including date, type, category and total.
+        """
+
+        return f"{self.user} {self.date}: {self.type} {self.category} {self.total}"
+
+
+class ExchangeRateSnapshot(models.Model):
+    """
+    Model to store the last exchange rate table successfully fetched from the API.
+
+    Used as the last-known-good fallback when the cache is cold or the API is down
+    (see `app/utils.py`). Only a single row (pk=1) is kept.
+    """
+
+    rates = models.JSONField()
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        Return a string representation of the snapshot, including the fetch time.
+        """
+
+        return f"Exchange rates fetched at {self.fetched_at}"
+
+
+class ExchangeRate(models.Model):
+    """
+    Model to store the historical exchange rate of a currency on a given date.
+
+    Rates are relative to the base currency of the API (EUR), so an amount is
+    converted to EUR by dividing it by the rate. Looked up in memory by
+    `app/rate_history.py`.
+    """
+
+    date = models.DateField()
+    currency = models.CharField(max_length=10)
+    rate = models.DecimalField(max_digits=20, decimal_places=8)
+
+    class Meta:
+        """
+        Meta options for one rate per currency and date.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate_per_day'),
+        ]
+
+    def __str__(self):
+        """
+        Return a string representation of the rate, including date, currency and rate.
+        """
+
+        return f"{self.currency} on {self.date}: {self.rate}"
@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination for querysets.
+
+Unlike `django.core.paginator.Paginator`, the keyset paginator never runs a
+`COUNT(*)` and never uses `OFFSET`. Each page continues from the sort key of the
+last row of the previous page, which is passed around as an opaque cursor
+string, so every page costs the same single indexed query no matter how deep
+the user scrolls.
+"""
+
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor string cannot be decoded.
+    """
+
+
+class KeysetPage:
+    """
+    A single page of results returned by `KeysetPaginator`.
+
+    Attributes:
+        object_list (list): The objects on this page.
+        next_cursor (str or None): The cursor of the next page, or None on the last page.
+    """
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        """
+        Return True if there is a page after this one.
+        """
+
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by a unique, descending sort key.
+
+    Args:
+        queryset (QuerySet): The queryset to paginate.
+        ordering (tuple): Field names of the sort key, in descending order. The
+            last field must be unique (usually 'id') to break ties.
+        per_page (int): The number of objects per page.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self._fields = [queryset.model._meta.get_field(name) for name in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Returns the page that starts after the given cursor.
+
+        Args:
+            cursor (str, optional): The cursor of the page, or None for the first page.
+
+        Returns:
+            KeysetPage: The objects of the page and the cursor of the next one.
+
+        Raises:
+            InvalidCursor: If the cursor cannot be decoded.
+        """
+
+        queryset = self.queryset.order_by(*[f'-{name}' for name in self.ordering])
+
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+
+        # Fetch one extra row to know whether there is a next page
+        objects = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[:self.per_page]
+            next_cursor = self.encode_cursor(objects[-1])
+
+        return KeysetPage(objects, next_cursor)
+
+    def encode_cursor(self, obj):
+        """
+        Encodes the sort key of an object into a URL-safe cursor string.
+        """
+
+        values = [
+            field.value_to_string(obj) for field in self._fields
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Decodes a cursor string back into the values of the sort key.
+        """
+
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self._fields):
+                raise InvalidCursor('Cursor does not match the ordering.')
+            return [field.to_python(value) for field, value in zip(self._fields, values)]
+        except (ValueError, TypeError, ValidationError) as error:
+            raise InvalidCursor(f'Invalid cursor: {cursor}') from error
+
+    def _after(self, values):
+        """
+        Builds the filter selecting rows that sort after the given key.
+
+        For a key (a, b) in descending order this is `a < va OR (a = va AND b < vb)`.
+        """
+
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            equal_prefix = {self.ordering[j]: values[j] for j in range(i)}
+            condition |= Q(**equal_prefix, **{f'{name}__lt': values[i]})
+        return condition
@@ -0,0 +1,329 @@
+"""
+Module to store and look up historical exchange rates.
+
+The `ExchangeRate` table holds one rate per currency and date, ingested from
+the API whenever the rates are refreshed (see `app/utils.py`) or in bulk from a
+CSV or JSON dump (see the `import_exchange_rates` command).
+
+Lookups never hit the database on the request path: each process keeps the
+whole history in memory as per-currency sorted arrays of dates and rates, and
+finds the rate in effect on a date with a binary search.
+
+Changes are signalled through a version number in the shared cache, so that
+all processes pick up new rates. Every write bumps the version and stores the
+rows it wrote under that version, and a process applies the rows of the
+versions it missed to its arrays, e.g. the day's rates fetched from the API.
+The whole history is only read from the database on the first lookup, and
+again if the rows of a missed version are no longer in the cache or were too
+many to be stored there (a large import).
+"""
+
+
+import bisect
+import csv
+import datetime
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from app.models import ExchangeRate
+
+
+VERSION_KEY = 'rate_history:version'
+CHANGES_KEY_PREFIX = 'rate_history:changes'
+
+# Number of rates written per INSERT when ingesting
+BATCH_SIZE = 1000
+
+# Largest number of rows of a write kept in the cache for the other processes,
+# and seconds they are kept; a process missing them reloads the whole history
+MAX_CHANGES = 5000
+CHANGES_TIMEOUT = 86400
+
+# Number of missed versions above which a process reloads the history instead of applying them
+MAX_MISSED_VERSIONS = 100
+
+_history = None
+_history_version = None
+_history_lock = threading.Lock()
+
+
+class RateHistory:
+    """
+    In-memory lookup of exchange rates by currency and date.
+
+    Args:
+        rows (iterable): Tuples of (currency, date, rate), sorted by currency and date.
+    """
+
+    def __init__(self, rows):
+        # Currency -> (sorted date ordinals, rates), replaced as a whole on changes
+        self._series = {}
+        for currency, date, rate in rows:
+            dates, rates = self._series.setdefault(currency, ([], []))
+            dates.append(date.toordinal())
+            rates.append(rate)
+
+    def __len__(self):
+        return sum(len(dates) for dates, _ in self._series.values())
+
+    def get_rate(self, currency, date):
+        """
+        Returns the rate of a currency in effect on a date.
+
+        That is the rate of the latest date on or before the given one. Dates
+        before the start of the history use the earliest known rate.
+
+        Args:
+            currency (str): The currency code.
+            date (date): The date of the transaction.
+
+        Returns:
+            Decimal or None: The rate, or None if the currency has no history.
+        """
+
+        series = self._series.get(currency)
+        if not series:
+            return None
+
+        dates, rates = series
+        index = bisect.bisect_right(dates, date.toordinal()) - 1
+        return rates[max(index, 0)]
+
+    def latest_rates(self):
+        """
+        Returns the rate of the latest date of every currency.
+
+        Returns:
+            dict: Currency codes mapped to their latest rate.
+        """
+
+        return {currency: rates[-1] for currency, (_, rates) in self._series.items()}
+
+    def apply(self, rows):
+        """
+        Adds or replaces rates, keeping the dates of each currency sorted.
+
+        The arrays of a changed currency are copied and swapped in, so lookups
+        running in other threads never see them half updated.
+
+        Args:
+            rows (iterable): Tuples of (currency, date, rate).
+        """
+
+        by_currency = {}
+        for currency, date, rate in rows:
+            by_currency.setdefault(currency, []).append((date.toordinal(), rate))
+
+        for currency, changes in by_currency.items():
+            dates, rates = self._series.get(currency, ([], []))
+            dates, rates = list(dates), list(rates)
+            for ordinal, rate in changes:
+                index = bisect.bisect_left(dates, ordinal)
+                if index < len(dates) and dates[index] == ordinal:
+                    rates[index] = rate
+                else:
+                    dates.insert(index, ordinal)
+                    rates.insert(index, rate)
+            self._series[currency] = (dates, rates)
+
+
+def _as_date(value):
+    """
+    Returns the value as a date, parsing ISO strings.
+    """
+
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def _current_version():
+    """
+    Returns the current version of the rate history.
+    """
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _changes_key(version):
+    """
+    Build the cache key holding the rows written by a version of the history.
+    """
+
+    return f'{CHANGES_KEY_PREFIX}:{version}'
+
+
+def invalidate(rows=None):
+    """
+    Bumps the version of the rate history, so every process updates it on its next lookup.
+
+    Args:
+        rows (list, optional): Tuples of (currency, date, rate) written by this
+            version, applied by the other processes instead of reloading the
+            whole history. Without them, or if there are more than `MAX_CHANGES`,
+            every process reloads the history.
+    """
+
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # No version stored yet, so no process holds a history to update
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        return
+
+    if rows is not None and len(rows) <= MAX_CHANGES:
+        cache.set(_changes_key(version), rows, timeout=CHANGES_TIMEOUT)
+
+
+def _load():
+    """
+    Reads the whole rate history from the database.
+    """
+
+    rows = ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate')
+    return RateHistory(rows.iterator(chunk_size=BATCH_SIZE))
+
+
+def get_history():
+    """
+    Returns the in-memory rate history, updating it if it changed since it was loaded.
+
+    Returns:
+        RateHistory: The rate history of this process.
+    """
+
+    global _history, _history_version
+
+    version = _current_version()
+    if _history is not None and _history_version == version:
+        return _history
+
+    with _history_lock:
+        if _history is None or _history_version != version:
+            # Apply the rows of the missed versions, or reload if any of them is unknown
+            missed = range(_history_version + 1, version + 1) if _history is not None else range(0)
+            changes = {}
+            if 0 < len(missed) <= MAX_MISSED_VERSIONS:
+                changes = cache.get_many([_changes_key(number) for number in missed])
+
+            if _history is not None and 0 < len(missed) == len(changes):
+                for number in missed:
+                    _history.apply(changes[_changes_key(number)])
+            else:
+                _history = _load()
+            _history_version = version
+
+    return _history
+
+
+def get_rate(currency, date):
+    """
+    Returns the rate of a currency in effect on a date, or None if the currency has no history.
+    """
+
+    return get_history().get_rate(currency, _as_date(date))
+
+
+def store_rates(rows):
+    """
+    Inserts or updates historical rates in batches.
+
+    Args:
+        rows (iterable): Tuples of (date, currency, rate). Dates may be ISO strings.
+
+    Returns:
+        int: The number of rates written.
+    """
+
+    written = 0
+    # Rates by (currency, date): a row repeated in a batch would make the upsert fail on PostgreSQL
+    # ("ON CONFLICT DO UPDATE command cannot affect row a second time"), so the last one wins
+    batch = {}
+    # The rows written, for the other processes, until there are too many to share
+    changes = []
+
+    def flush():
+        nonlocal written, changes
+        ExchangeRate.objects.bulk_create(
+            batch.values(),
+            update_conflicts=True,
+            unique_fields=['currency', 'date'],
+            update_fields=['rate'],
+        )
+        written += len(batch)
+        if changes is not None:
+            changes.extend((rate.currency, rate.date, rate.rate) for rate in batch.values())
+            changes = changes if len(changes) <= MAX_CHANGES else None
+
+    for date, currency, rate in rows:
+        date = _as_date(date)
+        batch[currency, date] = ExchangeRate(date=date, currency=currency, rate=Decimal(str(rate)))
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            batch = {}
+
+    if batch:
+        flush()
+
+    if written:
+        invalidate(changes)
+    return written
+
+
+def record_rates(rates, date=None):
+    """
+    Stores a table of rates fetched from the API as the rates of a date.
+
+    Args:
+        rates (dict): Currency codes mapped to rates.
+        date (date, optional): The date of the rates. Defaults to today.
+
+    Returns:
+        int: The number of rates written.
+    """
+
+    date = date or datetime.date.today()
+    return store_rates((date, currency, rate) for currency, rate in rates.items())
+
+
+def read_csv(file):
+    """
+    Reads rates from a CSV file with the columns 'date', 'currency' and 'rate'.
+
+    Args:
+        file (file): A text file object.
+
+    Yields:
+        tuple: (date, currency, rate) for every row.
+    """
+
+    for row in csv.DictReader(file):
+        yield row['date'], row['currency'].strip().upper(), row['rate']
+
+
+def read_json(file):
+    """
+    Reads rates from a JSON object mapping ISO dates to tables of rates.
+
+    Example: {"2024-01-31": {"USD": 1.08, "SEK": 11.2}}
+
+    Args:
+        file (file): A text file object.
+
+    Yields:
+        tuple: (date, currency, rate) for every rate.
+    """
+
+    for date, rates in json.load(file).items():
+        for currency, rate in rates.items():
+            yield date, currency.upper(), rate
@@ -0,0 +1,192 @@
+"""
+Module to toggle likes and bookmarks and to look them up without per-post queries.
+
+`Post.like_count` and `Post.bookmark_count` hold the number of likes and
+bookmarks of each post. Toggling locks the post row, deletes the membership
+row or inserts it if there was none (instead of an exists-then-add round trip)
+and adjusts the counter with an atomic `F()` update in the same transaction,
+so concurrent toggles on a post are serialized and keep the counters exact.
+
+The IDs of the posts a user liked or bookmarked are cached per user, so pages
+can show the liked and bookmarked state of any number of posts with at most
+one query per user and kind. Changes made directly through the M2M managers
+(e.g. in the admin) are picked up by the signal handlers in `app/signals.py`.
+The sets are dropped from the shared cache on every change, and also expire
+after `settings.REACTIONS_CACHE_TIMEOUT` seconds, so a missed invalidation
+never shows a stale state for long.
+"""
+
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.instrumentation import record_cache
+from app.models import Post
+
+
+CACHE_KEY_PREFIX = 'post_reactions'
+
+# Kinds of reactions: the M2M field and the counter column of each
+KINDS = {
+    'like': ('likes', 'like_count'),
+    'bookmark': ('bookmarks', 'bookmark_count'),
+}
+
+
+def _through(kind):
+    """
+    Returns the M2M table model of a kind of reaction.
+    """
+
+    return getattr(Post, KINDS[kind][0]).through
+
+
+def _cache_key(kind, user_id):
+    """
+    Build the cache key holding the post IDs a user reacted to.
+    """
+
+    return f'{CACHE_KEY_PREFIX}:{kind}:{user_id}'
+
+
+def toggle(kind, post, user):
+    """
+    Adds the user's reaction to a post, or removes it if it already exists.
+
+    Args:
+        kind (str): 'like' or 'bookmark'.
+        post (Post): The post.
+        user (User): The user reacting.
+
+    Returns:
+        tuple: (active, count) - whether the reaction now exists and the new counter value.
+    """
+
+    through = _through(kind)
+    counter = KINDS[kind][1]
+    membership = {'post_id': post.pk, 'user_id': user.pk}
+
+    with transaction.atomic():
+        # Lock the post, so toggles on it run one after the other
+        count = Post.objects.select_for_update().filter(pk=post.pk).values_list(counter, flat=True).get()
+
+        deleted, _ = through.objects.filter(**membership).delete()
+        if deleted:
+            active, change = False, -1
+        else:
+            through.objects.create(**membership)
+            active, change = True, 1
+
+        Post.objects.filter(pk=post.pk).update(**{counter: F(counter) + change})
+        count += change
+
+    invalidate_user(kind, user.pk)
+    setattr(post, counter, count)
+    return active, count
+
+
+def get_post_ids(kind, user):
+    """
+    Returns the IDs of the posts a user reacted to, from the cache.
+
+    Args:
+        kind (str): 'like' or 'bookmark'.
+        user (User): The user, possibly anonymous.
+
+    Returns:
+        set: The post IDs (empty for anonymous users).
+    """
+
+    if not user.is_authenticated:
+        return set()
+
+    key = _cache_key(kind, user.pk)
+    post_ids = cache.get(key)
+    record_cache(post_ids is not None)
+    if post_ids is None:
+        post_ids = set(_through(kind).objects.filter(user_id=user.pk).values_list('post_id', flat=True))
+        cache.set(key, post_ids, timeout=settings.REACTIONS_CACHE_TIMEOUT)
+    return post_ids
+
+
+def get_liked_post_ids(user):
+    """
+    Returns the IDs of the posts the user liked.
+    """
+
+    return get_post_ids('like', user)
+
+
+def get_bookmarked_post_ids(user):
+    """
+    Returns the IDs of the posts the user bookmarked.
+    """
+
+    return get_post_ids('bookmark', user)
+
+
+def invalidate_user(kind, user_id):
+    """
+    Drops the cached post IDs of a user, so they are reloaded on the next lookup.
+    """
+
+    cache.delete(_cache_key(kind, user_id))
+
+
+def recount(kind, post_ids=None):
+    """
+    Recomputes the counters of a kind of reaction from the M2M table.
+
+    Args:
+        kind (str): 'like' or 'bookmark'.
+        post_ids (iterable, optional): Only recount these posts. Defaults to all posts.
+    """
+
+    counter = KINDS[kind][1]
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=list(post_ids))
+
+    counts = (
+        _through(kind).objects
+        .filter(post_id=OuterRef('pk'))
+        .order_by()
+        .values('post_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    posts.update(**{counter: Coalesce(Subquery(counts), 0)})
+
+
+def handle_m2m_change(kind, instance, action, reverse, pk_set):
+    """
+    Keeps the counters and cached post IDs in sync with changes made through the M2M managers.
+
+    Args:
+        kind (str): 'like' or 'bookmark'.
+        instance (Post or User): The instance whose M2M manager was used.
+        action (str): The `m2m_changed` action.
+        reverse (bool): True if the change was made from the user's side.
+        pk_set (set): The primary keys added or removed (None when clearing).
+    """
+
+    own_field, other_field = ('user_id', 'post_id') if reverse else ('post_id', 'user_id')
+    cleared_attribute = f'_cleared_{kind}_ids'
+
+    if action == 'pre_clear':
+        # Remember the related rows, which are gone once the clear is done
+        rows = _through(kind).objects.filter(**{own_field: instance.pk}).values_list(other_field, flat=True)
+        setattr(instance, cleared_attribute, set(rows))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    related_ids = getattr(instance, cleared_attribute, set()) if action == 'post_clear' else pk_set
+    post_ids, user_ids = (related_ids, [instance.pk]) if reverse else ([instance.pk], related_ids)
+
+    recount(kind, post_ids)
+    for user_id in user_ids:
+        invalidate_user(kind, user_id)
@@ -0,0 +1,342 @@
+"""
+Module to search blog posts by their title and content.
+
+On PostgreSQL the search uses the precomputed `Post.search_vector` column
+(indexed with GIN), ranks results with `SearchRank` and builds highlighted
+snippets with `SearchHeadline`. On other databases (e.g. SQLite in tests and
+local development) it falls back to an in-memory inverted index with the same
+weighting of title and content.
+
+Both backends are kept up to date incrementally when posts are saved or deleted
+(see `app/signals.py`), and can be rebuilt with the `rebuild_search_index`
+management command.
+"""
+
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Func, TextField, Value
+from django.utils.html import escape, strip_tags
+
+from app.models import Post
+
+
+# Text search configuration used to build and query the search vector
+SEARCH_CONFIG = 'english'
+
+# Relative weights of the title and the content, matching PostgreSQL's 'A' and 'B' ranks
+TITLE_WEIGHT = 1.0
+CONTENT_WEIGHT = 0.4
+
+# Number of words shown in a search result snippet
+SNIPPET_WORDS = 35
+
+WORD_RE = re.compile(r'\w+')
+
+# Plain text markers of the words matched by `SearchHeadline`, replaced by `<mark>` tags once the
+# headline is escaped
+HEADLINE_START = '[[mark]]'
+HEADLINE_STOP = '[[/mark]]'
+
+
+def uses_postgres_search():
+    """
+    Returns True if the database supports PostgreSQL full-text search.
+    """
+
+    return connection.vendor == 'postgresql'
+
+
+def post_search_vector():
+    """
+    Builds the weighted search vector expression for a post (title 'A', content 'B').
+    """
+
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('content', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase words, ignoring any HTML markup.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The words of the text.
+    """
+
+    return WORD_RE.findall(strip_tags(text or '').lower())
+
+
+def highlight(text, terms, max_words=SNIPPET_WORDS):
+    """
+    Builds an HTML snippet of the text around the first matching term.
+
+    The text is stripped of markup and escaped, and every matching word is
+    wrapped in a `<mark>` tag.
+
+    Args:
+        text (str): The text to build the snippet from.
+        terms (iterable): The lowercase search terms to highlight.
+        max_words (int): The maximum number of words in the snippet.
+
+    Returns:
+        str: The highlighted snippet.
+    """
+
+    terms = set(terms)
+    words = strip_tags(text or '').split()
+    normalized = [''.join(WORD_RE.findall(word.lower())) for word in words]
+
+    # Start the snippet a few words before the first match
+    first_match = next((i for i, word in enumerate(normalized) if word in terms), 0)
+    start = max(first_match - 5, 0)
+    window = range(start, min(start + max_words, len(words)))
+
+    snippet = ' '.join(
+        f'<mark>{escape(words[i])}</mark>' if normalized[i] in terms else escape(words[i])
+        for i in window
+    )
+
+    if start > 0:
+        snippet = '... ' + snippet
+    if window and window[-1] < len(words) - 1:
+        snippet += ' ...'
+    return snippet
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index of post titles and content.
+
+    Maps every word to the posts containing it together with the weighted
+    number of occurrences, so a search only touches the posts that contain
+    the query words. The index is built lazily on the first search and then
+    updated one post at a time.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # word -> {post_id: weighted frequency}
+        self._documents = {}  # post_id -> words of the post
+        self._built = False
+        self._lock = threading.RLock()
+
+    def build(self):
+        """
+        Rebuilds the index from all posts in the database.
+        """
+
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for post_id, title, content in Post.objects.values_list('id', 'title', 'content').iterator():
+                self._add(post_id, title, content)
+            self._built = True
+
+    def add(self, post_id, title, content):
+        """
+        Adds or replaces a post in the index. Does nothing until the index is built.
+        """
+
+        with self._lock:
+            if self._built:
+                self._remove(post_id)
+                self._add(post_id, title, content)
+
+    def remove(self, post_id):
+        """
+        Removes a post from the index.
+        """
+
+        with self._lock:
+            self._remove(post_id)
+
+    def search(self, query, limit=None):
+        """
+        Finds the posts containing all words of the query, ranked by relevance.
+
+        The score of a post is the sum of the weighted frequencies of the query
+        words, each scaled by how rare the word is across all posts.
+
+        Args:
+            query (str): The search query.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: Tuples of (post_id, score), best match first.
+        """
+
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            if not self._built:
+                self.build()
+
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+
+            # Intersect starting from the rarest word
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+
+            total = len(self._documents)
+            scores = {
+                post_id: sum(
+                    frequencies[post_id] * math.log(1 + total / len(frequencies))
+                    for frequencies in postings
+                )
+                for post_id in candidates
+            }
+
+        results = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return results[:limit] if limit else results
+
+    def _add(self, post_id, title, content):
+        weights = Counter()
+        for word in tokenize(title):
+            weights[word] += TITLE_WEIGHT
+        for word in tokenize(content):
+            weights[word] += CONTENT_WEIGHT
+
+        for word, weight in weights.items():
+            self._postings[word][post_id] = weight
+        self._documents[post_id] = set(weights)
+
+    def _remove(self, post_id):
+        for word in self._documents.pop(post_id, ()):
+            frequencies = self._postings[word]
+            frequencies.pop(post_id, None)
+            if not frequencies:
+                del self._postings[word]
+
+
+# Index used when the database does not support full-text search
+inverted_index = InvertedIndex()
+
+
+def update_post_index(post):
+    """
+    Updates the search index entry of a single post.
+
+    Args:
+        post (Post): The saved post.
+    """
+
+    if uses_postgres_search():
+        # update() does not send post_save, so this does not re-trigger indexing
+        Post.objects.filter(pk=post.pk).update(search_vector=post_search_vector())
+    else:
+        inverted_index.add(post.pk, post.title, post.content)
+
+
+def remove_post_from_index(post):
+    """
+    Removes a deleted post from the search index.
+
+    Args:
+        post (Post): The deleted post.
+    """
+
+    if not uses_postgres_search():
+        inverted_index.remove(post.pk)
+
+
+def rebuild_index():
+    """
+    Recomputes the search index for all posts.
+    """
+
+    if uses_postgres_search():
+        Post.objects.update(search_vector=post_search_vector())
+    else:
+        inverted_index.build()
+
+
+def search_posts(query, limit=None):
+    """
+    Searches posts by title and content.
+
+    Args:
+        query (str): The search query.
+        limit (int, optional): The maximum number of results. Defaults to
+            `settings.SEARCH_RESULTS_LIMIT`.
+
+    Returns:
+        list: Posts ordered by relevance, each with a `rank` and an HTML `snippet`
+              attribute highlighting the matched words.
+    """
+
+    if not query or not query.strip():
+        return []
+
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+
+    if uses_postgres_search():
+        return _search_postgres(query, limit)
+    return _search_inverted_index(query, limit)
+
+
+def _search_postgres(query, limit):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+    # The headline is built from the content without its markup, as cutting
+    # the raw HTML into fragments could leave broken tags
+    plain_content = Func(
+        F('content'), Value('<[^>]*>'), Value(' '), Value('g'),
+        function='REGEXP_REPLACE', output_field=TextField(),
+    )
+
+    posts = list(
+        Post.objects.for_cards()
+        .filter(search_vector=search_query)
+        .annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            snippet=SearchHeadline(
+                plain_content,
+                search_query,
+                config=SEARCH_CONFIG,
+                start_sel=HEADLINE_START,
+                stop_sel=HEADLINE_STOP,
+                max_words=SNIPPET_WORDS,
+            ),
+        )
+        .order_by('-rank', '-last_updated')[:limit]
+    )
+
+    # Escape the headline like the fallback snippet, then turn the markers into tags
+    for post in posts:
+        post.snippet = (
+            escape(post.snippet or '')
+            .replace(HEADLINE_START, '<mark>')
+            .replace(HEADLINE_STOP, '</mark>')
+        )
+    return posts
+
+
+def _search_inverted_index(query, limit):
+    results = inverted_index.search(query, limit)
+    posts = Post.objects.for_cards().in_bulk([post_id for post_id, _ in results])
+    terms = tokenize(query)
+
+    ranked_posts = []
+    for post_id, score in results:
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        post.rank = score
+        post.snippet = highlight(post.content, terms)
+        ranked_posts.append(post)
+    return ranked_posts
@@ -0,0 +1,321 @@
+"""
+Module to generate large synthetic datasets for benchmarks and manual testing.
+
+`DatasetSeeder` writes users with profiles, categories, tags, posts, comments,
+likes, bookmarks and transactions with `bulk_create` in batches, so millions of
+rows can be seeded in minutes. The blog objects are built with the factories in
+`app/factories.py`, which give them realistic text. Transactions are generated
+with plain random values instead, as building millions of them through the
+factories would take far longer than inserting them.
+
+Usernames and slugs get a unique prefix, so datasets can be added to a
+database that already has data. `bulk_create` skips the model signals, so the
+derived data (reaction counters, transaction summaries and daily rollups, the
+search index and the cached sidebar blocks) is rebuilt once at the end.
+
+Passing the same `seed` generates the same values (only the prefix differs).
+"""
+
+
+import random
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+import factory.random
+from django.utils.text import slugify
+
+from app import comments, reactions, search, site_cache
+from app.factories import CommentFactory, PostFactory, ProfileFactory, TagFactory, UserFactory
+from app.models import Category, Comments, Post, Profile, Tag, Transaction, User
+from app.summaries import rebuild_daily_rollups, rebuild_summaries
+
+
+Scale = namedtuple('Scale', ['users', 'transactions', 'posts', 'tags', 'comments', 'likes', 'bookmarks'])
+
+# Predefined dataset sizes
+SCALES = {
+    'small': Scale(users=20, transactions=20_000, posts=200, tags=30, comments=2_000, likes=2_000, bookmarks=1_000),
+    'medium': Scale(users=200, transactions=200_000, posts=2_000, tags=100, comments=20_000, likes=20_000, bookmarks=10_000),
+    'large': Scale(users=2_000, transactions=2_000_000, posts=20_000, tags=300, comments=200_000, likes=200_000, bookmarks=100_000),
+}
+
+CATEGORY_NAMES = (
+    'Bills', 'Rent', 'Salary', 'Food', 'Subscriptions', 'Transport', 'Health', 'Travel',
+    'Entertainment', 'Education', 'Gifts', 'Savings',
+)
+
+# Currencies of the seeded transactions with their rough rates to EUR, EUR being the most frequent
+CURRENCY_RATES = {'EUR': 1, 'USD': Decimal('1.10'), 'GBP': Decimal('0.85'), 'SEK': Decimal('11.50')}
+CURRENCY_WEIGHTS = (70, 20, 5, 5)
+
+# Share of the transactions that are expenses, and of the comments that are replies
+EXPENSE_SHARE = 0.8
+REPLY_SHARE = 0.3
+
+HISTORY_DAYS = 3650
+
+
+class DatasetSeeder:
+    """
+    Seeds a synthetic dataset of a given size.
+
+    Args:
+        scale (Scale): The number of rows of each kind.
+        batch_size (int): Rows inserted per `bulk_create` batch.
+        seed (int, optional): Seed of the random values, for repeatable datasets.
+        log (callable, optional): Called with a progress message after each step.
+
+    Attributes:
+        users (list): The seeded users, once `seed()` ran.
+        posts (list): The seeded posts, once `seed()` ran.
+        timings (dict): Seconds spent on each step.
+    """
+
+    def __init__(self, scale, batch_size=5000, seed=None, log=None):
+        self.scale = scale
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.prefix = f'seed{time.time_ns():x}'
+        self.log = log or (lambda message: None)
+        self.users = []
+        self.posts = []
+        self.timings = {}
+
+        if seed is not None:
+            factory.random.reseed_random(seed)
+
+    def seed(self):
+        """
+        Seeds every kind of row, then rebuilds the derived data.
+
+        Returns:
+            dict: The seconds spent on each step.
+        """
+
+        steps = (
+            ('users', self.seed_users),
+            ('categories', self.seed_categories),
+            ('tags', self.seed_tags),
+            ('posts', self.seed_posts),
+            ('comments', self.seed_comments),
+            ('reactions', self.seed_reactions),
+            ('transactions', self.seed_transactions),
+            ('derived data', self.rebuild_derived_data),
+        )
+
+        for name, step in steps:
+            started = time.perf_counter()
+            count = step()
+            self.timings[name] = time.perf_counter() - started
+            rate = f' ({count / self.timings[name]:.0f} rows/s)' if count and self.timings[name] else ''
+            self.log(f'{name}: {count or 0} rows in {self.timings[name]:.1f}s{rate}')
+
+        return self.timings
+
+    def _insert(self, model, objects):
+        """
+        Inserts objects batch by batch, never building more than a batch at a time.
+
+        Yields:
+            list: The created objects of each batch.
+        """
+
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                yield model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            yield model.objects.bulk_create(batch)
+
+    def _create(self, model, objects):
+        """
+        Inserts objects in batches and returns them all.
+        """
+
+        return [obj for batch in self._insert(model, objects) for obj in batch]
+
+    def _count(self, model, objects):
+        """
+        Inserts objects in batches, keeping none of them, and returns their number.
+        """
+
+        return sum(len(batch) for batch in self._insert(model, objects))
+
+    def seed_users(self):
+        """
+        Creates the users, each with a profile.
+        """
+
+        users = (
+            UserFactory.build(username=f'{self.prefix}-user{i}', password='!')
+            for i in range(self.scale.users)
+        )
+        self.users = self._create(User, users)
+
+        profiles = (ProfileFactory.build(user=user, slug=slugify(user.username)) for user in self.users)
+        self._count(Profile, profiles)
+        return len(self.users) * 2
+
+    def seed_categories(self):
+        """
+        Creates the transaction categories that do not exist yet.
+        """
+
+        self.categories = [Category.objects.get_or_create(name=name)[0] for name in CATEGORY_NAMES]
+        return len(self.categories)
+
+    def seed_tags(self):
+        """
+        Creates the tags.
+        """
+
+        tags = (
+            TagFactory.build(name=f'{self.prefix} tag {i}', slug=f'{self.prefix}-tag-{i}')
+            for i in range(self.scale.tags)
+        )
+        self.tags = self._create(Tag, tags)
+        return len(self.tags)
+
+    def seed_posts(self):
+        """
+        Creates the posts with one to three tags each; the first post is featured.
+        """
+
+        posts = (
+            PostFactory.build(
+                author=self.random.choice(self.users),
+                slug=f'{self.prefix}-post-{i}',
+                view_count=self.random.randint(0, 10_000),
+                is_featured=i == 0,
+            )
+            for i in range(self.scale.posts)
+        )
+        self.posts = self._create(Post, posts)
+
+        post_tags = (
+            Post.tags.through(post_id=post.pk, tag_id=tag.pk)
+            for post in self.posts
+            if self.tags
+            for tag in self.random.sample(self.tags, min(len(self.tags), self.random.randint(1, 3)))
+        )
+        return len(self.posts) + self._count(Post.tags.through, post_tags)
+
+    def seed_comments(self):
+        """
+        Creates the comments, a share of them as replies to the comments created before.
+        """
+
+        replies = int(self.scale.comments * REPLY_SHARE) if self.posts else 0
+        roots = self.scale.comments - replies if self.posts else 0
+
+        comments = self._create(Comments, (
+            CommentFactory.build(post=self.random.choice(self.posts), author=self.random.choice(self.users))
+            for _ in range(roots)
+        ))
+
+        # Replies are added in rounds, each answering a third of the comments of the round before,
+        # so the threads are several levels deep
+        created = len(comments)
+        while replies and comments:
+            count = min(replies, max(len(comments) // 3, 1))
+            parents = [self.random.choice(comments) for _ in range(count)]
+            comments = self._create(Comments, (
+                CommentFactory.build(post=parent.post, parent=parent, author=self.random.choice(self.users))
+                for parent in parents
+            ))
+            replies -= count
+            created += count
+        return created
+
+    def _random_pairs(self, count):
+        """
+        Returns up to `count` distinct (post ID, user ID) pairs.
+        """
+
+        count = min(count, len(self.posts) * len(self.users))
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add((self.random.choice(self.posts).pk, self.random.choice(self.users).pk))
+        return pairs
+
+    def seed_reactions(self):
+        """
+        Creates the likes and bookmarks.
+        """
+
+        created = 0
+        for kind, count in (('like', self.scale.likes), ('bookmark', self.scale.bookmarks)):
+            through = getattr(Post, reactions.KINDS[kind][0]).through
+            rows = (through(post_id=post_id, user_id=user_id) for post_id, user_id in self._random_pairs(count))
+            created += self._count(through, rows)
+        return created
+
+    def _transactions(self):
+        """
+        Yields the random transactions, spread evenly over the users and the last ten years.
+        """
+
+        today = date.today()
+        currencies = list(CURRENCY_RATES)
+
+        for i in range(self.scale.transactions):
+            currency = self.random.choices(currencies, CURRENCY_WEIGHTS)[0]
+            expense = self.random.random() < EXPENSE_SHARE
+            amount = Decimal(self.random.randint(100, 50_000 if expense else 500_000)) / 100
+
+            yield Transaction(
+                user=self.users[i % len(self.users)],
+                category=self.random.choice(self.categories),
+                type='expense' if expense else 'income',
+                amount=amount,
+                currency=currency,
+                amount_in_usd=(amount / CURRENCY_RATES[currency]).quantize(Decimal('0.01')),
+                date=today - timedelta(days=self.random.randint(0, HISTORY_DAYS)),
+            )
+
+    def seed_transactions(self):
+        """
+        Creates the transactions.
+        """
+
+        if not self.users:
+            return 0
+        return self._count(Transaction, self._transactions())
+
+    def rebuild_derived_data(self):
+        """
+        Rebuilds what the model signals would have kept up to date.
+        """
+
+        post_ids = [post.pk for post in self.posts]
+        user_ids = [user.pk for user in self.users]
+
+        for kind in reactions.KINDS:
+            reactions.recount(kind, post_ids)
+            for user_id in user_ids:
+                reactions.invalidate_user(kind, user_id)
+
+        rebuild_summaries(user_ids)
+        rebuild_daily_rollups(user_ids)
+        search.rebuild_index()
+        site_cache.invalidate()
+        return 0
+
+    def forget_cached_data(self):
+        """
+        Drops the cached data of the dataset after it was rolled back.
+        """
+
+        for post in self.posts:
+            comments.invalidate(post.pk)
+        for kind in reactions.KINDS:
+            for user in self.users:
+                reactions.invalidate_user(kind, user.pk)
+
+        search.rebuild_index()
+        site_cache.invalidate()
+
@@ -0,0 +1,113 @@
+"""
+Signal handlers that keep derived data in sync with the models.
+
+Handlers in this module are connected when the app is ready (see `app/apps.py`).
+"""
+
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from app import comments, reactions, site_cache, summaries
+from app.models import Comments, Post, Profile, Tag, WebSiteMeta, Transaction
+from app.search import remove_post_from_index, update_post_index
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    """
+    Update the search index entry of a post after it is created or edited.
+    """
+
+    update_post_index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    """
+    Remove a deleted post from the search index.
+    """
+
+    remove_post_from_index(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=WebSiteMeta)
+@receiver(post_delete, sender=WebSiteMeta)
+def invalidate_site_cache(sender, **kwargs):
+    """
+    Mark the cached sidebar blocks as stale when the content they show changes.
+    """
+
+    site_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def sync_like_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the like counters and cached liked posts after likes are changed through the M2M manager.
+    """
+
+    reactions.handle_m2m_change('like', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Post.bookmarks.through)
+def sync_bookmark_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the bookmark counters and cached bookmarked posts after bookmarks are changed through the M2M manager.
+    """
+
+    reactions.handle_m2m_change('bookmark', instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Comments)
+@receiver(post_delete, sender=Comments)
+def invalidate_comment_thread(sender, instance, **kwargs):
+    """
+    Drop the cached comment thread of the post after one of its comments is saved or deleted.
+    """
+
+    comments.invalidate(instance.post_id)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, **kwargs):
+    """
+    Store the saved values of an edited transaction, so they can be removed from the summaries.
+    """
+
+    instance._summary_previous = None
+    if instance.pk:
+        previous = Transaction.objects.filter(pk=instance.pk).only('user', 'category', 'date', 'type', 'amount_in_usd').first()
+        if previous:
+            instance._summary_previous = summaries.snapshot(previous)
+
+
+@receiver(post_save, sender=Transaction)
+def update_summaries_on_save(sender, instance, **kwargs):
+    """
+    Move the transaction's amount from its previous values to its new values in the summaries.
+    """
+
+    previous = getattr(instance, '_summary_previous', None)
+    current = summaries.snapshot(instance)
+
+    if previous == current:
+        return
+    if previous:
+        summaries.apply_change(previous, -1)
+    summaries.apply_change(current, 1)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_summaries_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted transaction from the summaries.
+    """
+
+    summaries.apply_change(summaries.snapshot(instance), -1)
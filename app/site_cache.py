@@ -0,0 +1,171 @@
+"""
+Module to cache the blocks shared by the blog pages ("site chrome").
+
+The homepage, post, tag and about pages all show the same top posts, recent
+posts, featured post and website metadata. This module serves them from
+Django's cache and recomputes them only when the underlying content changes.
+
+All cache keys contain a version number. Saving or deleting a post, tag,
+profile or the website metadata bumps the version (see `app/signals.py`), which
+makes every cached block stale at once without having to know its key.
+Blocks also expire after `settings.SITE_CACHE_TIMEOUT` seconds, so rankings by
+view count (which change without a model save) are refreshed regularly.
+"""
+
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app.instrumentation import record_cache
+from app.models import Post, WebSiteMeta
+
+
+CACHE_KEY_PREFIX = 'site_chrome'
+VERSION_KEY = f'{CACHE_KEY_PREFIX}:version'
+
+# Hit and miss counters of this process, exposed for monitoring
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+# Marker for values missing from the cache, since None is a valid cached value
+_MISSING = object()
+
+
+def _current_version():
+    """
+    Returns the current version of the cached blocks.
+    """
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the current time, so blocks cached under an evicted version are not reused
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _new_version():
+    """
+    Returns a version number that is higher than any previously used one.
+    """
+
+    return int(time.time() * 1000)
+
+
+def _get_or_compute(name, compute):
+    """
+    Returns a cached block, computing and caching it on a miss.
+
+    Args:
+        name (str): The name of the block, unique per content shown.
+        compute (callable): Function returning the value of the block.
+
+    Returns:
+        The cached or freshly computed value.
+    """
+
+    key = f'{CACHE_KEY_PREFIX}:{_current_version()}:{name}'
+    value = cache.get(key, _MISSING)
+
+    if value is not _MISSING:
+        _count('hits')
+        return value
+
+    _count('misses')
+    value = compute()
+    cache.set(key, value, timeout=settings.SITE_CACHE_TIMEOUT)
+    return value
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+    record_cache(event == 'hits')
+
+
+def get_top_posts(tag=None, limit=3):
+    """
+    Returns the most viewed posts, optionally limited to a tag.
+
+    Args:
+        tag (Tag, optional): Only include posts with this tag.
+        limit (int): The number of posts to return.
+
+    Returns:
+        list: The posts, with author, profile and tags loaded.
+    """
+
+    posts = Post.objects.filter(tags__in=[tag.id]) if tag else Post.objects.all()
+    name = f'top_posts:{tag.id if tag else "all"}:{limit}'
+    return _get_or_compute(name, lambda: list(posts.top(limit)))
+
+
+def get_recent_posts(tag=None, limit=3):
+    """
+    Returns the most recently updated posts, optionally limited to a tag.
+
+    Args:
+        tag (Tag, optional): Only include posts with this tag.
+        limit (int): The number of posts to return.
+
+    Returns:
+        list: The posts, with author, profile and tags loaded.
+    """
+
+    posts = Post.objects.filter(tags__in=[tag.id]) if tag else Post.objects.all()
+    name = f'recent_posts:{tag.id if tag else "all"}:{limit}'
+    return _get_or_compute(name, lambda: list(posts.recent(limit)))
+
+
+def get_featured_post():
+    """
+    Returns the first featured post, or None if no post is featured.
+    """
+
+    return _get_or_compute(
+        'featured_post',
+        lambda: Post.objects.for_cards().filter(is_featured=True).first(),
+    )
+
+
+def get_website_info():
+    """
+    Returns the website metadata, or None if it has not been created yet.
+    """
+
+    return _get_or_compute('website_info', lambda: WebSiteMeta.objects.first())
+
+
+def invalidate():
+    """
+    Marks all cached blocks as stale by bumping the cache version.
+    """
+
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # No version stored yet
+        cache.set(VERSION_KEY, _new_version(), timeout=None)
+
+
+def get_stats():
+    """
+    Returns the hit and miss counters of this process.
+
+    Returns:
+        dict: The number of 'hits' and 'misses' and the 'hit_ratio'.
+    """
+
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
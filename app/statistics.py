@@ -0,0 +1,116 @@
+"""
+Module to compute the expense tracker statistics shown on the dashboard.
+
+All series of the statistics page (income and expense totals, expenses per
+category with names, and daily expenses with zero-filled gaps) are computed
+from a single query over the pre-aggregated `DailyTransactionRollup` rows of
+the requested date window, so the cost depends on the number of active days
+and categories rather than on the number of transactions. The result is a
+JSON-serializable payload that the page loads asynchronously.
+"""
+
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from app.models import DailyTransactionRollup
+
+
+# Windows (in days) offered on the statistics page
+WINDOW_CHOICES = (7, 30, 90, 365)
+DEFAULT_WINDOW = 30
+
+# Longest custom range accepted, to keep the daily series bounded
+MAX_WINDOW_DAYS = 3660
+
+
+def parse_window(params, today=None):
+    """
+    Reads the date window from request parameters.
+
+    Either 'days' (one of `WINDOW_CHOICES`) selects a window ending today, or
+    'start' and 'end' (ISO dates, inclusive) select a custom range.
+
+    Args:
+        params (QueryDict): The request GET parameters.
+        today (date, optional): The current date, for testing.
+
+    Returns:
+        tuple: (start, end) dates, both inclusive.
+
+    Raises:
+        ValueError: If the parameters are invalid.
+    """
+
+    today = today or datetime.date.today()
+
+    if params.get('start') or params.get('end'):
+        start = datetime.date.fromisoformat(params.get('start', ''))
+        end = datetime.date.fromisoformat(params.get('end', ''))
+        if start > end:
+            raise ValueError('The start date must not be after the end date.')
+        if (end - start).days >= MAX_WINDOW_DAYS:
+            raise ValueError(f'The date range must be shorter than {MAX_WINDOW_DAYS} days.')
+        return start, end
+
+    days = int(params.get('days', DEFAULT_WINDOW))
+    if days not in WINDOW_CHOICES:
+        raise ValueError(f'The window must be one of {WINDOW_CHOICES} days.')
+    return today - datetime.timedelta(days=days - 1), today
+
+
+def compute_statistics(user, start, end):
+    """
+    Computes all dashboard series for a user and date window.
+
+    Args:
+        user (User): The user whose transactions are summarized.
+        start (date): The first day of the window.
+        end (date): The last day of the window.
+
+    Returns:
+        dict: A JSON-serializable dictionary with the keys:
+            start, end (str): The window as ISO dates.
+            total_income, total_expenses, net (float): Totals over the window.
+            categories (list): Expense totals per category, as {'name', 'total'},
+                largest first.
+            daily (dict): 'dates' (ISO strings for every day of the window) and
+                'expenses' (the expense total of each day, 0 if none).
+    """
+
+    # One query over the rollup, which already holds the sums per day, type and category
+    rows = (
+        DailyTransactionRollup.objects
+        .filter(user=user, date__gte=start, date__lte=end, count__gt=0)
+        .order_by()
+        .values('date', 'type', 'category__name', 'total')
+    )
+
+    totals = defaultdict(Decimal)
+    category_totals = defaultdict(Decimal)
+    daily_expenses = defaultdict(Decimal)
+
+    for row in rows:
+        totals[row['type']] += row['total']
+        if row['type'] == 'expense':
+            category_totals[row['category__name']] += row['total']
+            daily_expenses[row['date']] += row['total']
+
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total_income': float(totals['income']),
+        'total_expenses': float(totals['expense']),
+        'net': float(totals['income'] - totals['expense']),
+        'categories': [
+            {'name': name, 'total': float(total)}
+            for name, total in sorted(category_totals.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'daily': {
+            'dates': [day.isoformat() for day in days],
+            'expenses': [float(daily_expenses.get(day, 0)) for day in days],
+        },
+    }
@@ -0,0 +1,293 @@
+"""
+Module to maintain the materialized transaction totals of each user.
+
+`UserTransactionSummary` holds the all-time income and expense totals of a user,
+`MonthlyTransactionSummary` the totals per month and `DailyTransactionRollup`
+the totals per day, category and type. All of them are updated incrementally
+with atomic `F()` updates whenever a transaction is created, changed or deleted
+(see `app/signals.py`), so the headline totals of the expense tracker and the
+statistics dashboard do not aggregate over years of raw transactions.
+
+Writes that bypass model signals (`bulk_create`, `QuerySet.update`, raw SQL)
+must be followed by `rebuild_summaries()` and `rebuild_daily_rollups()` for
+the affected users.
+"""
+
+
+import datetime
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from app.models import DailyTransactionRollup, MonthlyTransactionSummary, Transaction, UserTransactionSummary
+
+
+ZERO = Decimal('0.00')
+
+
+def _as_date(value):
+    """
+    Returns the value as a date, parsing ISO strings assigned before the model cleaned them.
+    """
+
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def snapshot(transaction):
+    """
+    Returns the values of a transaction that the summaries depend on.
+
+    Args:
+        transaction (Transaction): The transaction.
+
+    Returns:
+        dict: The user id, category id, date, type and converted amount of the transaction.
+    """
+
+    return {
+        'user_id': transaction.user_id,
+        'category_id': transaction.category_id,
+        'date': _as_date(transaction.date),
+        'type': transaction.type,
+        'amount_in_usd': Decimal(str(transaction.amount_in_usd or 0)),
+    }
+
+
+def apply_change(values, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) a transaction from the user's summaries and daily rollup.
+
+    Adding creates the summary rows if needed. Removing only updates existing
+    rows, so it is a no-op if the rows were already deleted along with the user.
+
+    Args:
+        values (dict): The transaction values, as returned by `snapshot()`.
+        sign (int): 1 to add the transaction, -1 to remove it.
+    """
+
+    amount = values['amount_in_usd'] * sign
+    income = amount if values['type'] == 'income' else ZERO
+    expenses = amount if values['type'] == 'expense' else ZERO
+
+    lookups = (
+        (UserTransactionSummary, {'user_id': values['user_id']}),
+        (MonthlyTransactionSummary, {'user_id': values['user_id'], 'month': values['date'].replace(day=1)}),
+    )
+
+    with db_transaction.atomic():
+        for model, lookup in lookups:
+            if sign > 0:
+                model.objects.get_or_create(**lookup)
+            model.objects.filter(**lookup).update(
+                income=F('income') + income,
+                expenses=F('expenses') + expenses,
+                count=F('count') + sign,
+            )
+
+        rollup = {
+            'user_id': values['user_id'],
+            'date': values['date'],
+            'category_id': values['category_id'],
+            'type': values['type'],
+        }
+        if sign > 0:
+            DailyTransactionRollup.objects.get_or_create(**rollup)
+        DailyTransactionRollup.objects.filter(**rollup).update(
+            total=F('total') + amount,
+            count=F('count') + sign,
+        )
+
+
+def get_user_totals(user):
+    """
+    Returns the all-time income and expense totals of a user.
+
+    Args:
+        user (User): The user.
+
+    Returns:
+        tuple: (total_income, total_expenses) in EUR.
+    """
+
+    summary = UserTransactionSummary.objects.filter(user=user).values_list('income', 'expenses').first()
+    return summary or (ZERO, ZERO)
+
+
+def _aggregate_monthly(user_ids=None):
+    """
+    Computes the monthly totals directly from the transactions.
+
+    Returns:
+        dict: (user_id, month) -> {'income', 'expenses', 'count'}.
+    """
+
+    transactions = Transaction.objects.all()
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+
+    zero = Value(ZERO, output_field=DecimalField(max_digits=14, decimal_places=2))
+    rows = (
+        transactions
+        .annotate(month=TruncMonth('date'))
+        .order_by()
+        .values('user_id', 'month')
+        .annotate(
+            income=Coalesce(Sum('amount_in_usd', filter=Q(type='income')), zero),
+            expenses=Coalesce(Sum('amount_in_usd', filter=Q(type='expense')), zero),
+            count=Count('id'),
+        )
+    )
+
+    return {
+        (row['user_id'], _as_date(row['month'])): {
+            'income': row['income'],
+            'expenses': row['expenses'],
+            'count': row['count'],
+        }
+        for row in rows
+    }
+
+
+def _sum_months(monthly):
+    """
+    Adds up monthly totals into all-time totals per user.
+
+    Returns:
+        dict: user_id -> {'income', 'expenses', 'count'}.
+    """
+
+    totals = {}
+    for (user_id, _), values in monthly.items():
+        total = totals.setdefault(user_id, {'income': ZERO, 'expenses': ZERO, 'count': 0})
+        for field in total:
+            total[field] += values[field]
+    return totals
+
+
+def rebuild_summaries(user_ids=None):
+    """
+    Recomputes the summaries from scratch.
+
+    Args:
+        user_ids (iterable, optional): Only rebuild these users. Defaults to all users.
+
+    Returns:
+        int: The number of monthly summary rows written.
+    """
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+
+    monthly = _aggregate_monthly(user_ids)
+    totals = _sum_months(monthly)
+
+    with db_transaction.atomic():
+        user_summaries = UserTransactionSummary.objects.all()
+        monthly_summaries = MonthlyTransactionSummary.objects.all()
+        if user_ids is not None:
+            user_summaries = user_summaries.filter(user_id__in=user_ids)
+            monthly_summaries = monthly_summaries.filter(user_id__in=user_ids)
+        user_summaries.delete()
+        monthly_summaries.delete()
+
+        UserTransactionSummary.objects.bulk_create(
+            UserTransactionSummary(user_id=user_id, **values) for user_id, values in totals.items()
+        )
+        MonthlyTransactionSummary.objects.bulk_create(
+            MonthlyTransactionSummary(user_id=user_id, month=month, **values)
+            for (user_id, month), values in monthly.items()
+        )
+
+    return len(monthly)
+
+
+def find_inconsistencies(user_ids=None):
+    """
+    Compares the stored summaries with totals computed from the transactions.
+
+    Args:
+        user_ids (iterable, optional): Only check these users. Defaults to all users.
+
+    Returns:
+        list: Tuples of (user_id, month, stored, expected) for every mismatch,
+              where month is None for the all-time summary and stored/expected
+              are dicts of income, expenses and count (None if the row is missing).
+    """
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+
+    expected_monthly = _aggregate_monthly(user_ids)
+    expected_totals = _sum_months(expected_monthly)
+
+    user_summaries = UserTransactionSummary.objects.all()
+    monthly_summaries = MonthlyTransactionSummary.objects.all()
+    if user_ids is not None:
+        user_summaries = user_summaries.filter(user_id__in=user_ids)
+        monthly_summaries = monthly_summaries.filter(user_id__in=user_ids)
+
+    stored_totals = {
+        row.pop('user_id'): row
+        for row in user_summaries.values('user_id', 'income', 'expenses', 'count')
+    }
+    stored_monthly = {
+        (row.pop('user_id'), row.pop('month')): row
+        for row in monthly_summaries.values('user_id', 'month', 'income', 'expenses', 'count')
+    }
+
+    # A stored row of zeros is equivalent to a missing one (e.g. after all transactions were deleted)
+    empty = {'income': ZERO, 'expenses': ZERO, 'count': 0}
+    mismatches = []
+
+    for user_id in stored_totals.keys() | expected_totals.keys():
+        stored, expected = stored_totals.get(user_id), expected_totals.get(user_id)
+        if (stored or empty) != (expected or empty):
+            mismatches.append((user_id, None, stored, expected))
+
+    for user_id, month in stored_monthly.keys() | expected_monthly.keys():
+        stored, expected = stored_monthly.get((user_id, month)), expected_monthly.get((user_id, month))
+        if (stored or empty) != (expected or empty):
+            mismatches.append((user_id, month, stored, expected))
+
+    return sorted(mismatches, key=lambda item: (item[0], item[1] or datetime.date.min))
+
+
+def rebuild_daily_rollups(user_ids=None):
+    """
+    Recomputes the daily rollup rows from the transactions.
+
+    Args:
+        user_ids (iterable, optional): Only rebuild these users. Defaults to all users.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+
+    transactions = Transaction.objects.all()
+    rollups = DailyTransactionRollup.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        transactions = transactions.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    rows = (
+        transactions
+        .order_by()
+        .values('user_id', 'date', 'category_id', 'type')
+        .annotate(total=Sum('amount_in_usd'), count=Count('id'))
+    )
+
+    with db_transaction.atomic():
+        rollups.delete()
+        created = DailyTransactionRollup.objects.bulk_create(
+            (DailyTransactionRollup(**row) for row in rows.iterator()),
+            batch_size=1000,
+        )
+
+    return len(created)
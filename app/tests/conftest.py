@@ -7,11 +7,20 @@ Fixtures in this file provide reusable data setups for testing, including:
     - User-specific transaction setups for testing user-associated functionality.
     - A dictionary of transaction parameters for testing functions or views that
       require transaction details
+    - Blog posts with an author profile and a tag.
+    - A local HTTP server standing in for the exchange rate API.
+    - A query budget that fails a test on too many queries or an N+1 pattern.
 """
 
 
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
-from app.factories import TransactionFactory, UserFactory
+from app.instrumentation import capture_queries
+from app.factories import TransactionFactory, UserFactory, PostFactory, TagFactory
 
 @pytest.fixture
 def transactions():
@@ -62,3 +71,82 @@ def transaction_dict_params(user):
     }
 
 
+@pytest.fixture
+def post():
+    """
+    Fixture to create a single post with an author profile and one tag.
+    """
+    return PostFactory(tags=[TagFactory()])
+
+
+@pytest.fixture
+def rates_api(settings):
+    """
+    Fixture running a local HTTP server that stands in for the exchange rate API.
+
+    The server answers every GET with `rates_api.rates` as 'conversion_rates'.
+    Set `rates_api.status` to an error code to simulate an outage;
+    `rates_api.requests` counts the requests received.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.requests += 1
+            body = json.dumps({'result': 'success', 'conversion_rates': self.server.rates}).encode()
+            self.send_response(self.server.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.rates = {'EUR': 1, 'USD': 1.1, 'SEK': 11.5}
+    server.status = 200
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.API_URL = f'http://127.0.0.1:{server.server_port}/'
+    settings.API_KEY = 'test-key'
+    settings.API_ENDPOINT = '/latest/EUR'
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fixture failing the test if a block runs more queries than its budget or an N+1 pattern.
+
+    Usage:
+        with query_budget(5):
+            client.get(url)
+
+    Args (of the returned context manager):
+        max_queries (int): The largest number of queries allowed in the block.
+        n_plus_one_threshold (int, optional): Repetitions of a SELECT shape reported as
+            an N+1 pattern. Defaults to `settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD`.
+
+    Yields:
+        RequestMetrics: The measurements of the block.
+    """
+
+    @contextmanager
+    def budget(max_queries, n_plus_one_threshold=None):
+        with capture_queries(n_plus_one_threshold) as metrics:
+            yield metrics
+
+        problems = []
+        if metrics.queries > max_queries:
+            problems.append(f'{metrics.queries} queries run, the budget is {max_queries}')
+        for pattern in metrics.n_plus_one():
+            problems.append(f'N+1: {pattern["count"]} x {pattern["sql"]} (from {pattern["origin"]})')
+        if problems:
+            pytest.fail('\n'.join(problems), pytrace=False)
+
+    return budget
@@ -0,0 +1,188 @@
+"""
+Tests for the bulk transaction import in `app/imports.py`.
+"""
+
+
+import io
+import time
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app import imports, rate_history
+from app.factories import CategoryFactory
+from app.models import Category, Transaction
+from app.summaries import find_inconsistencies
+from app.utils import RATES_CACHE_KEY
+
+
+OFX_STATEMENT = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>USD
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240110120000[-5:EST]
+<TRNAMT>-25.00
+<FITID>2024011001
+<NAME>Groceries
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240131<TRNAMT>1250.00<FITID>2024013101<NAME>Salary</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.fixture(autouse=True)
+def rates():
+    cache.clear()
+    cache.set(RATES_CACHE_KEY, {'rates': {'EUR': 1, 'USD': 1.1, 'SEK': 11}, 'fetched_at': time.time()}, timeout=None)
+    yield
+    cache.clear()
+
+
+def _csv(*lines):
+    return io.StringIO('\n'.join(('date,type,category,amount,currency,external_id',) + lines) + '\n')
+
+
+@pytest.mark.django_db
+def test_csv_import_validates_converts_and_skips_reimported_rows(user):
+    CategoryFactory(name='Food')
+    rate_history.store_rates([('2024-01-01', 'SEK', '10.00'), ('2024-02-01', 'SEK', '12.50')])
+    rows = [f'2024-01-{day:02d},Expense,food,10,SEK,bank-{day}' for day in range(1, 8)]
+    csv_file = _csv(
+        *rows,
+        '2024-02-03,income,Food,100,SEK,',
+        '2024-02-04,expense,Travel,5,USD,bank-x',
+        '2024-02-05,expense,Food,-5,USD,bank-y',
+        '2024-02-06,expense,Food,5,XYZ,bank-z',
+        '2024-01-01,expense,Food,10,SEK,bank-1',  # repeated in the same file
+    )
+
+    importer = imports.TransactionImporter(user, chunk_size=3)
+    with CaptureQueriesContext(connection) as context:
+        report = importer.run(imports.read_csv(csv_file))
+
+    assert (report.created, report.duplicates, report.error_count) == (8, 1, 3)
+    assert [line for line, _ in report.errors] == [10, 11, 12]
+    assert 'Unknown category "Travel"' in report.errors[0][1]
+    assert 'Amount must be a positive number.' in report.errors[1][1]
+    # one insert per chunk of valid rows, not per row
+    inserts = [
+        query for query in context.captured_queries
+        if query['sql'].startswith('INSERT') and '"app_transaction"' in query['sql']
+    ]
+    assert len(inserts) == 3
+
+    january = Transaction.objects.get(user=user, external_id='bank-1')
+    assert (january.type, january.amount_in_usd) == ('expense', Decimal('1.00'))
+    assert Transaction.objects.get(user=user, external_id=None).amount_in_usd == Decimal('8.00')
+    assert find_inconsistencies([user.pk]) == []
+
+    # importing the file again only adds the row without an external ID
+    csv_file.seek(0)
+    report = imports.TransactionImporter(user).run(imports.read_csv(csv_file))
+    assert (report.created, report.duplicates) == (1, 8)
+    assert Transaction.objects.filter(user=user).count() == 9
+
+
+@pytest.mark.django_db
+def test_unreadable_file_imports_nothing(user):
+    CategoryFactory(name='Food')
+    # the undecodable bytes come after several 8 KB blocks, so chunks were written before the error
+    rows = '\n'.join(f'2024-01-{i % 28 + 1:02d},expense,Food,10,USD,row-{i}' for i in range(2000))
+    content = ('date,type,category,amount,currency,external_id\n' + rows + '\n').encode() + b'2024-01-11,\xff\xfe\n'
+
+    importer = imports.TransactionImporter(user, chunk_size=100)
+    with pytest.raises(UnicodeDecodeError):
+        importer.run(imports.read_csv(imports.open_text(io.BytesIO(content))))
+
+    assert not Transaction.objects.filter(user=user).exists()
+    assert find_inconsistencies([user.pk]) == []
+
+
+@pytest.mark.django_db
+def test_dry_run_skips_ids_repeated_in_a_later_chunk(user):
+    CategoryFactory(name='Food')
+    lines = ('2024-01-01,expense,Food,10,USD,a', '2024-01-02,expense,Food,10,USD,b', '2024-01-03,expense,Food,10,USD,a')
+
+    dry_run = imports.TransactionImporter(user, chunk_size=2, dry_run=True).run(imports.read_csv(_csv(*lines)))
+    report = imports.TransactionImporter(user, chunk_size=2).run(imports.read_csv(_csv(*lines)))
+
+    assert (dry_run.created, dry_run.duplicates) == (report.created, report.duplicates) == (2, 1)
+
+
+@pytest.mark.django_db
+def test_rows_inserted_by_a_concurrent_import_are_not_counted(user, monkeypatch):
+    category = CategoryFactory(name='Food')
+    importer = imports.TransactionImporter(user)
+    convert = importer.convert
+
+    def convert_while_another_import_inserts(chunk, report):
+        convert(chunk, report)
+        Transaction.objects.create(
+            user=user, category=category, type='expense', amount=10, currency='USD',
+            amount_in_usd=10, date='2024-01-02', external_id='b',
+        )
+
+    monkeypatch.setattr(importer, 'convert', convert_while_another_import_inserts)
+    report = importer.run(imports.read_csv(_csv('2024-01-01,expense,Food,10,USD,a', '2024-01-02,expense,Food,10,USD,b')))
+
+    assert (report.created, report.duplicates) == (1, 1)
+    assert Transaction.objects.filter(user=user).count() == 2
+    assert find_inconsistencies([user.pk]) == []
+
+
+@pytest.mark.django_db
+def test_ofx_import_command(user, tmp_path):
+    statement = tmp_path / 'statement.ofx'
+    statement.write_text(OFX_STATEMENT)
+
+    call_command('import_transactions', str(statement), '--user', user.username, '--dry-run',
+                 '--default-category', 'Bank', '--create-categories')
+    assert not Transaction.objects.exists() and not Category.objects.exists()
+
+    call_command('import_transactions', str(statement), '--user', str(user.pk),
+                 '--default-category', 'Bank', '--create-categories')
+    call_command('import_transactions', str(statement), '--user', str(user.pk),
+                 '--default-category', 'Bank')
+
+    transactions = Transaction.objects.filter(user=user).order_by('date')
+    assert [(t.type, t.amount, t.currency, t.category.name, t.external_id) for t in transactions] == [
+        ('expense', Decimal('25.00'), 'USD', 'Bank', '2024011001'),
+        ('income', Decimal('1250.00'), 'USD', 'Bank', '2024013101'),
+    ]
+    assert str(transactions[0].date) == '2024-01-10'
+
+
+@pytest.mark.django_db
+def test_import_upload_view(user, client):
+    CategoryFactory(name='Food')
+    client.force_login(user)
+    url = reverse('import-transactions')
+
+    assert client.get(url).status_code == 200
+
+    csv_file = _csv('2024-01-02,expense,Food,10,USD,a', '2024-01-03,expense,Rent,10,USD,b')
+    upload = SimpleUploadedFile('statement.csv', csv_file.getvalue().encode())
+    response = client.post(url, {'file': upload})
+    content = response.content.decode()
+
+    assert '1 transactions imported, 0 already imported, 1 rejected.' in content
+    assert 'Line 3: category: Unknown category &quot;Rent&quot;.' in content
+    assert Transaction.objects.filter(user=user).count() == 1
+
+    # categories are shared by all users, an upload never creates one
+    upload = SimpleUploadedFile('statement.csv', _csv('2024-01-04,expense,Rent,10,USD,c').getvalue().encode())
+    content = client.post(url, {'file': upload, 'create_categories': 'on'}).content.decode()
+
+    assert 'Unknown category &quot;Rent&quot;.' in content
+    assert not Category.objects.filter(name='Rent').exists()
@@ -0,0 +1,148 @@
+"""
+Tests for the request metrics middleware and query checks in `app/instrumentation.py`.
+"""
+
+
+import json
+import logging
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+
+from app import instrumentation
+from app.factories import PostFactory, UserFactory
+from app.models import Post
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    cache.clear()
+    instrumentation.reset_view_stats()
+    yield
+    instrumentation.reset_view_stats()
+
+
+@pytest.mark.django_db
+def test_server_timing_reports_queries_and_cache_lookups(client):
+    post = PostFactory()
+    url = reverse('post_page', args=[post.slug])
+
+    client.get(url)
+    response = client.get(url)
+    timing = response['Server-Timing']
+
+    assert timing.startswith('total;dur=') and 'db;dur=' in timing
+    # the second view is served from the cached sidebar blocks and comment thread
+    assert ', 0 duplicates"' in timing
+    assert 'cache;desc="3 hits, 0 misses"' in timing
+
+    stats = instrumentation.get_view_stats()['post_page']
+    assert stats['requests'] == 2 and stats['statuses'] == {'2xx': 2}
+    assert stats['cache_misses'] >= 1 and sum(stats['histogram_ms'].values()) == 2
+
+
+@pytest.mark.django_db
+def test_duplicate_queries_are_logged_as_warnings(caplog, settings):
+    settings.REQUEST_METRICS_SLOW_MS = 10_000
+
+    def view(request):
+        for _ in range(3):
+            User.objects.filter(username='reader').exists()
+        return HttpResponse('ok')
+
+    middleware = instrumentation.RequestMetricsMiddleware(view)
+    with caplog.at_level(logging.INFO, logger='app.instrumentation'):
+        response = middleware(RequestFactory().get('/reader'))
+
+    assert 'db;dur=' in response['Server-Timing'] and '3 queries, 2 duplicates' in response['Server-Timing']
+    record = caplog.records[-1]
+    assert record.levelno == logging.WARNING
+    logged = json.loads(record.getMessage())
+    assert logged['view'] == 'unresolved' and logged['duplicate_queries'] == 2
+    assert 'auth_user' in logged['duplicated_sql'][0]
+
+
+@pytest.mark.django_db
+def test_performance_stats_are_for_staff_only(client, settings):
+    settings.REQUEST_METRICS_SERVER_TIMING = False
+    user = UserFactory()
+    client.force_login(user)
+    url = reverse('performance-stats')
+
+    response = client.get(url)
+    assert response.status_code == 302 and 'Server-Timing' not in response
+
+    user.is_staff = True
+    user.save()
+    client.get(reverse('about'))
+    payload = client.get(url).json()
+
+    assert payload['views']['about']['requests'] == 1
+    assert set(payload['site_cache']) == {'hits', 'misses', 'hit_ratio'}
+    assert 'exchange_rates' in payload
+
+
+def test_fingerprint_groups_queries_by_shape():
+    first = instrumentation.fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s) AND "a"."name" = \'x\' LIMIT 21')
+    second = instrumentation.fingerprint('SELECT "a"."id"  FROM "a" WHERE "a"."id" IN (%s) AND "a"."name" = \'it\'\'s\' LIMIT 1')
+
+    assert first == second == 'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (...) AND "a"."name" = ? LIMIT ?'
+    assert instrumentation.fingerprint('INSERT INTO "t3" VALUES (%s, %s), (%s, %s)') == 'INSERT INTO "t3" VALUES (...)'
+
+
+@pytest.mark.django_db
+def test_n_plus_one_is_logged_with_its_origin(caplog, settings):
+    settings.REQUEST_METRICS_SLOW_MS = 10_000
+    settings.REQUEST_METRICS_SLOW_QUERY_MS = 0
+    PostFactory.create_batch(5)
+
+    def view(request):
+        # the author of each post is loaded by its own query
+        names = [post.author.username for post in Post.objects.all()]
+        return HttpResponse(', '.join(names))
+
+    middleware = instrumentation.RequestMetricsMiddleware(view)
+    with caplog.at_level(logging.INFO, logger='app.instrumentation'):
+        middleware(RequestFactory().get('/posts'))
+
+    slow = json.loads(caplog.records[0].getMessage())
+    assert slow['event'] == 'slow_query' and slow['origin'].startswith('app/tests/test_instrumentation.py:')
+
+    logged = json.loads(caplog.records[-1].getMessage())
+    assert caplog.records[-1].levelno == logging.WARNING
+    assert logged['slow_queries'] == 6
+    [pattern] = logged['n_plus_one']
+    assert pattern['count'] == 5 and '"auth_user"' in pattern['sql']
+    assert pattern['origin'].startswith('app/tests/test_instrumentation.py:')
+    assert instrumentation.get_view_stats()['unresolved']['n_plus_one_requests'] == 1
+
+
+@pytest.mark.django_db
+def test_query_budget_fails_on_n_plus_one(query_budget):
+    PostFactory.create_batch(3)
+
+    with query_budget(1) as metrics:
+        list(Post.objects.select_related('author'))
+    assert metrics.queries == 1
+
+    with pytest.raises(pytest.fail.Exception, match=r'N\+1: 3 x SELECT .*"auth_user"'):
+        with query_budget(10, n_plus_one_threshold=3):
+            [post.author for post in Post.objects.all()]
+
+    with pytest.raises(pytest.fail.Exception, match='2 queries run, the budget is 1'):
+        with query_budget(1):
+            Post.objects.count()
+            Post.objects.exists()
+
+
+def test_percentile_uses_the_nearest_rank():
+    samples = [10, 1, 9, 2, 8, 3, 7, 4, 6, 5]
+
+    assert instrumentation.percentile(samples, 0.95) == 10
+    assert instrumentation.percentile(samples, 0.9) == 9
+    assert instrumentation.percentile(samples, 0.5) == 5
+    assert instrumentation.percentile([3], 0.95) == 3
@@ -0,0 +1,182 @@
+"""
+Latency and query budget suite for every URL in `app/urls.py`.
+
+Each URL is requested several times against seeded data, and the test fails if
+a request runs more queries than the budget of the URL in `BUDGETS` or an N+1
+pattern (see `app/instrumentation.py`). New URLs must be given a budget, so
+query-heavy views are caught when they are added.
+
+The 95th percentile of the response time is only checked against its budget
+when the LATENCY_BUDGETS environment variable is set, as timings depend on the
+machine. The time budgets hold on a development machine with SQLite; set the
+LATENCY_BUDGET_SCALE environment variable (e.g. to 3) on slower machines.
+"""
+
+
+import os
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from app.factories import CategoryFactory, PostFactory, TagFactory, UserFactory, ProfileFactory
+from app.instrumentation import percentile
+from app.models import Comments, Transaction, WebSiteMeta
+from app.summaries import rebuild_daily_rollups, rebuild_summaries
+from app.urls import urlpatterns
+from app.utils import RATES_CACHE_KEY
+
+
+Budget = namedtuple('Budget', ['p95_ms', 'queries'])
+
+# Budget of each URL name: 95th percentile response time (ms) and max queries per request
+BUDGETS = {
+    'index': Budget(p95_ms=250, queries=10),
+    'post_page': Budget(p95_ms=250, queries=11),
+    'tag_page': Budget(p95_ms=250, queries=9),
+    'author_page': Budget(p95_ms=250, queries=9),
+    'search': Budget(p95_ms=250, queries=6),
+    'about': Budget(p95_ms=250, queries=4),
+    'register': Budget(p95_ms=250, queries=3),
+    'bookmark_post': Budget(p95_ms=150, queries=9),
+    'like_post': Budget(p95_ms=150, queries=9),
+    'all_bookmarked_posts': Budget(p95_ms=250, queries=4),
+    'my_posts': Budget(p95_ms=250, queries=4),
+    'all_posts': Budget(p95_ms=250, queries=5),
+    'expense_tracker': Budget(p95_ms=250, queries=7),
+    'transactions': Budget(p95_ms=250, queries=6),
+    'create-transaction': Budget(p95_ms=150, queries=4),
+    'update-transaction': Budget(p95_ms=250, queries=5),
+    'delete-transaction': Budget(p95_ms=150, queries=10),
+    'get-transactions': Budget(p95_ms=150, queries=5),
+    'export-transactions': Budget(p95_ms=250, queries=4),
+    'import-transactions': Budget(p95_ms=150, queries=3),
+    'statistic': Budget(p95_ms=150, queries=3),
+    'statistic-data': Budget(p95_ms=150, queries=4),
+    'performance-stats': Budget(p95_ms=150, queries=3),
+}
+
+ROUNDS = 10
+CHECK_TIMINGS = os.environ.get('LATENCY_BUDGETS', '') not in ('', '0')
+SCALE = float(os.environ.get('LATENCY_BUDGET_SCALE', 1))
+
+
+@pytest.fixture
+def seeded(client):
+    """
+    Fixture seeding posts, comments and transactions and logging in their user.
+
+    Returns:
+        dict: The logged-in 'user', a 'post', its 'tag' and a 'transaction' of
+              the user, and 'deletable' transactions for the delete requests.
+    """
+
+    cache.clear()
+    cache.set(RATES_CACHE_KEY, {'rates': {'EUR': 1, 'USD': 1.1}, 'fetched_at': time.time()}, timeout=None)
+
+    user = ProfileFactory().user
+    tag = TagFactory()
+    WebSiteMeta.objects.create(title='Finance Blog', description='Budgets and more', about='About us')
+
+    posts = [PostFactory(tags=[tag], author=user, is_featured=i == 0) for i in range(30)]
+    post = posts[0]
+    post.bookmarks.add(user)
+    Comments.objects.bulk_create(
+        Comments(content=f'Comment {i}', name='Reader', email='reader@example.com', website='', post=post, author=user)
+        for i in range(10)
+    )
+
+    # Transactions are bulk created, so the summaries are rebuilt afterwards
+    categories = [CategoryFactory() for _ in range(5)]
+    today = date.today()
+    Transaction.objects.bulk_create(
+        Transaction(
+            user=user, category=categories[i % 5], type='expense' if i % 3 else 'income',
+            amount=10 + i, currency='USD', amount_in_usd=10 + i, date=today - timedelta(days=i % 90),
+        )
+        for i in range(300)
+    )
+    rebuild_summaries([user.pk])
+    rebuild_daily_rollups([user.pk])
+
+    client.force_login(user)
+    transactions = list(Transaction.objects.filter(user=user).order_by('id'))
+    return {
+        'user': user,
+        'post': post,
+        'tag': tag,
+        'transaction': transactions[0],
+        'deletable': transactions[1:],
+    }
+
+
+def _request(client, name, seeded):
+    """
+    Sends the request of a URL name with seeded arguments.
+    """
+
+    post = seeded['post']
+
+    if name in ('post_page', 'bookmark_post', 'like_post'):
+        url = reverse(name, args=[post.slug])
+    elif name == 'tag_page':
+        url = reverse(name, args=[seeded['tag'].slug])
+    elif name == 'author_page':
+        url = reverse(name, args=[seeded['user'].profile.slug])
+    elif name == 'update-transaction':
+        url = reverse(name, args=[seeded['transaction'].pk])
+    elif name == 'delete-transaction':
+        url = reverse(name, args=[seeded['deletable'].pop().pk])
+    else:
+        url = reverse(name)
+
+    if name in ('bookmark_post', 'like_post'):
+        return client.post(url, {'post_id': post.id})
+    if name == 'delete-transaction':
+        return client.delete(url)
+    if name == 'search':
+        return client.get(url, {'q': post.title.split()[0]})
+    if name == 'statistic-data':
+        return client.get(url, {'days': 90})
+    if name == 'get-transactions':
+        return client.get(url, headers={'HX-Request': 'true'})
+    if name == 'export-transactions':
+        # the rows are only read while the streamed content is consumed
+        response = client.get(url, {'transaction_type': 'expense'})
+        b''.join(response.streaming_content)
+        return response
+    return client.get(url)
+
+
+def test_every_url_has_a_budget():
+    assert {pattern.name for pattern in urlpatterns} == set(BUDGETS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', sorted(BUDGETS))
+def test_url_stays_within_query_budget(name, seeded, client, query_budget):
+    for _ in range(ROUNDS):
+        with query_budget(BUDGETS[name].queries):
+            response = _request(client, name, seeded)
+        assert response.status_code < 400, f'{name} returned {response.status_code}'
+
+
+@pytest.mark.skipif(not CHECK_TIMINGS, reason='set LATENCY_BUDGETS=1 to check the response time budgets')
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', sorted(BUDGETS))
+def test_url_stays_within_time_budget(name, seeded, client):
+    budget = BUDGETS[name]
+    timings = []
+
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        response = _request(client, name, seeded)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code < 400, f'{name} returned {response.status_code}'
+
+    p95 = percentile(timings, 0.95)
+
+    assert p95 <= budget.p95_ms * SCALE, f'{name} p95 is {p95:.1f} ms (budget {budget.p95_ms * SCALE:.0f} ms)'
@@ -9,6 +9,7 @@ Test Methods:
     - test_queryset_get_expense_method: Ensures the `get_expenses` method only returns 'expense' transactions.
     - test_queryset_get_total_income_method: Verifies the `get_total_income` method correctly sums income.
     - test_queryset_get_total_expenses_method: Verifies the `get_total_expenses` method correctly sums expenses.
+    - test_queryset_summary_method: Verifies the `summary` method returns all figures from one query.
 
 Fixtures:
     - `transactions`: Provides 20 sample `Transaction` instances for testing purposes.
@@ -20,6 +21,9 @@ Dependencies:
 
 
 import pytest
+from django.core.management import call_command
+from app.factories import PostFactory
+from app.management.commands.explain_queries import find_sequential_scans
 from app.models import Transaction
 
 @pytest.mark.django_db
@@ -92,3 +96,47 @@ def test_queryset_get_total_expenses_method(transactions):
 
     # Assert that the total expenses from the method matches the expected total expenses
     assert total_expenses == expected_total_expenses
+
+
+@pytest.mark.django_db
+def test_queryset_summary_method(transactions, django_assert_num_queries):
+    """
+    Test the `summary` method of the `Transaction` model.
+
+    Verifies that the method returns the same totals as the separate aggregate
+    methods, plus count, date range and per-category figures, using a single query.
+    """
+
+    # Get all figures with one grouped query
+    with django_assert_num_queries(1):
+        summary = Transaction.objects.summary()
+
+    # Assert that the totals match the separate aggregate methods
+    assert summary['income'] == Transaction.objects.get_total_income()
+    assert summary['expenses'] == Transaction.objects.get_total_expenses()
+    assert summary['net'] == summary['income'] - summary['expenses']
+    assert summary['count'] == len(transactions)
+    assert summary['first_date'] == min(t.date for t in transactions)
+    assert summary['last_date'] == max(t.date for t in transactions)
+
+    # Assert that the per-category figures add up to the totals
+    assert sum(c['count'] for c in summary['categories']) == len(transactions)
+    assert sum(c['income'] for c in summary['categories']) == summary['income']
+    for category in summary['categories']:
+        expected = sum(t.amount_in_usd for t in transactions if t.category.name == category['name'] and t.type == 'expense')
+        assert category['expenses'] == expected
+
+
+def test_find_sequential_scans():
+    assert find_sequential_scans('Seq Scan on app_post  (cost=0.00..1.05 rows=5 width=8)') == ['app_post']
+    assert find_sequential_scans('5 0 0 SCAN app_transaction') == ['app_transaction']
+    assert find_sequential_scans('5 0 0 SCAN app_post USING INDEX post_view_count_idx') == []
+    assert find_sequential_scans('Index Scan using txn_user_date_idx on app_transaction') == []
+
+
+@pytest.mark.django_db
+def test_canonical_queries_use_indexes(transactions):
+    PostFactory.create_batch(3)
+
+    # fails if any of the tracker or listing queries falls back to a full table scan
+    call_command('explain_queries', '--strict')
@@ -0,0 +1,71 @@
+"""
+Tests for the post search engine in `app/search.py`.
+
+The tests run against the in-memory inverted index used on SQLite and check
+ranking, highlighting and incremental index maintenance on save/delete.
+"""
+
+
+import pytest
+from django.urls import reverse
+from app.factories import PostFactory
+from app.search import highlight, inverted_index, search_posts
+
+
+@pytest.fixture(autouse=True)
+def empty_index(db):
+    """
+    Fixture to start every test from an index matching the (empty) test database.
+    """
+    inverted_index.build()
+
+
+@pytest.mark.django_db
+def test_title_matches_rank_above_content_matches():
+    content_match = PostFactory(title='Monthly review', content='How to build a budget that works.')
+    title_match = PostFactory(title='Budget basics', content='Start by listing your expenses.')
+    PostFactory(title='Investing', content='Index funds explained.')
+
+    results = search_posts('budget')
+
+    assert [post.pk for post in results] == [title_match.pk, content_match.pk]
+    assert results[0].rank > results[1].rank
+
+
+@pytest.mark.django_db
+def test_all_query_words_must_match():
+    both = PostFactory(title='Saving money', content='Emergency fund first.')
+    PostFactory(title='Saving time', content='Automate your bills.')
+
+    assert [post.pk for post in search_posts('saving emergency')] == [both.pk]
+    assert search_posts('') == []
+
+
+@pytest.mark.django_db
+def test_index_follows_post_updates_and_deletes():
+    post = PostFactory(title='Crypto', content='Volatile assets.')
+    assert [p.pk for p in search_posts('crypto')] == [post.pk]
+
+    post.title = 'Bonds'
+    post.save()
+    assert search_posts('crypto') == []
+    assert [p.pk for p in search_posts('bonds')] == [post.pk]
+
+    post.delete()
+    assert search_posts('bonds') == []
+
+
+def test_highlight_marks_terms_and_escapes_html():
+    snippet = highlight('<p>Track your <b>budget</b> & spending</p>', ['budget'])
+
+    assert snippet == 'Track your <mark>budget</mark> &amp; spending'
+
+
+@pytest.mark.django_db
+def test_search_view_renders_ranked_snippets(client):
+    PostFactory(title='Budget basics', content='A simple budget for students.')
+
+    response = client.get(reverse('search'), {'q': 'budget'})
+
+    assert len(response.context['posts']) == 1
+    assert b'<mark>budget</mark>' in response.content
@@ -0,0 +1,61 @@
+"""
+Tests for the dataset seeder in `app/seeding.py` and the benchmark command.
+"""
+
+
+import json
+import time
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+
+from app.models import Comments, Post, Profile, Transaction
+from app.seeding import SCALES, Scale
+from app.summaries import find_inconsistencies
+from app.utils import RATES_CACHE_KEY
+
+
+TINY = Scale(users=3, transactions=300, posts=12, tags=4, comments=40, likes=20, bookmarks=10)
+
+
+@pytest.fixture(autouse=True)
+def rates():
+    cache.clear()
+    cache.set(RATES_CACHE_KEY, {'rates': {'EUR': 1, 'USD': 1.1}, 'fetched_at': time.time()}, timeout=None)
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_seed_data_command_creates_consistent_dataset():
+    options = {field: count for field, count in TINY._asdict().items()}
+    call_command('seed_data', '--seed', '7', '--batch-size', '25', **options)
+
+    assert Profile.objects.count() == 3
+    assert Post.objects.count() == 12 and Post.objects.filter(is_featured=True).count() == 1
+    assert Comments.objects.count() == 40 and Comments.objects.filter(parent__isnull=False).exists()
+    assert Transaction.objects.count() == 300
+
+    # the counters and summaries are rebuilt after the bulk inserts
+    assert sum(Post.objects.values_list('like_count', flat=True)) == Post.likes.through.objects.count() == 20
+    assert sum(Post.objects.values_list('bookmark_count', flat=True)) == 10
+    assert find_inconsistencies() == []
+
+
+@pytest.mark.django_db
+def test_run_benchmarks_writes_results_and_rolls_back(tmp_path, monkeypatch):
+    monkeypatch.setitem(SCALES, 'small', TINY)
+    output = tmp_path / 'results.json'
+
+    call_command('run_benchmarks', '--rounds', '2', '--output', str(output))
+
+    results = json.loads(output.read_text())
+    scale = results['scales'][0]
+    assert scale['scale'] == 'small' and scale['counts']['transactions'] == 300
+    assert {'index', 'post_page', 'export-transactions', 'delete-transaction'} <= set(scale['views'])
+    assert all(result['status'] < 400 for result in scale['views'].values())
+    assert set(scale['queryset_methods']) == {'get_expenses', 'get_income', 'get_total_expenses', 'get_total_income', 'summary'}
+    assert all(result['queries'] >= 1 for result in scale['queryset_methods'].values())
+
+    assert not Transaction.objects.exists() and not Post.objects.exists()
@@ -0,0 +1,112 @@
+"""
+Tests for the materialized transaction summaries in `app/summaries.py`.
+
+These tests check that the per-user and per-month totals follow transaction
+creates, updates and deletes, and that the consistency checker and rebuild
+detect and repair summaries that were bypassed by bulk writes.
+"""
+
+
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from app.factories import CategoryFactory, TransactionFactory
+from app.models import DailyTransactionRollup, MonthlyTransactionSummary, Transaction
+from app.summaries import find_inconsistencies, get_user_totals
+
+
+@pytest.mark.django_db
+def test_summaries_follow_transaction_changes(user):
+    income = TransactionFactory(user=user, type='income', amount_in_usd=100, date=datetime.date(2024, 1, 5))
+    expense = TransactionFactory(user=user, type='expense', amount_in_usd=40, date=datetime.date(2024, 1, 20))
+
+    assert get_user_totals(user) == (Decimal('100'), Decimal('40'))
+
+    # move the expense to another month and change its amount
+    expense.amount_in_usd = Decimal('25.50')
+    expense.date = datetime.date(2024, 2, 1)
+    expense.save()
+
+    assert get_user_totals(user) == (Decimal('100'), Decimal('25.50'))
+    months = {summary.month: summary for summary in MonthlyTransactionSummary.objects.filter(user=user)}
+    assert months[datetime.date(2024, 1, 1)].expenses == 0
+    assert months[datetime.date(2024, 2, 1)].expenses == Decimal('25.50')
+
+    income.delete()
+
+    assert get_user_totals(user) == (Decimal('0'), Decimal('25.50'))
+    assert find_inconsistencies() == []
+
+
+@pytest.mark.django_db
+def test_tracker_totals_come_from_summary(user_transactions, client):
+    user = user_transactions[0].user
+    client.force_login(user)
+
+    expected_income = sum(t.amount_in_usd for t in user_transactions if t.type == 'income')
+    response = client.get('/expense_tracker')
+
+    assert response.context['total_income'] == expected_income
+    assert response.context['total_income_filtered'] == expected_income
+
+
+@pytest.mark.django_db
+def test_check_and_rebuild_commands(user_transactions):
+    user = user_transactions[0].user
+
+    # bulk writes skip the signals and leave the summaries stale
+    Transaction.objects.filter(user=user).update(amount_in_usd=1)
+    assert find_inconsistencies()
+
+    with pytest.raises(CommandError):
+        call_command('check_transaction_summaries')
+
+    call_command('check_transaction_summaries', '--fix')
+    assert find_inconsistencies() == []
+
+    call_command('rebuild_transaction_summaries', '--user', str(user.pk))
+    assert sum(get_user_totals(user)) == len(user_transactions)
+
+
+def _rollup(user):
+    return {
+        (row.date, row.category.name, row.type): (row.total, row.count)
+        for row in DailyTransactionRollup.objects.filter(user=user, count__gt=0).select_related('category')
+    }
+
+
+@pytest.mark.django_db
+def test_daily_rollup_follows_transaction_changes(user):
+    food, rent = CategoryFactory(name='Food'), CategoryFactory(name='Rent')
+    day = datetime.date(2024, 3, 1)
+    TransactionFactory(user=user, type='expense', category=food, amount_in_usd=10, date=day)
+    expense = TransactionFactory(user=user, type='expense', category=food, amount_in_usd=5, date=day)
+
+    assert _rollup(user) == {(day, 'Food', 'expense'): (Decimal('15'), 2)}
+
+    # moving a transaction to another category moves it between rollup rows
+    expense.category = rent
+    expense.save()
+    assert _rollup(user) == {
+        (day, 'Food', 'expense'): (Decimal('10'), 1),
+        (day, 'Rent', 'expense'): (Decimal('5'), 1),
+    }
+
+    expense.delete()
+    assert _rollup(user) == {(day, 'Food', 'expense'): (Decimal('10'), 1)}
+
+
+@pytest.mark.django_db
+def test_backfill_daily_rollups_command(user_transactions):
+    user = user_transactions[0].user
+    expected = _rollup(user)
+
+    DailyTransactionRollup.objects.all().delete()
+    call_command('backfill_daily_rollups', '--user', str(user.pk))
+
+    assert _rollup(user) == expected
+    assert sum(count for _, count in expected.values()) == len(user_transactions)
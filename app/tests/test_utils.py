@@ -0,0 +1,285 @@
+"""
+Tests for the exchange rate helpers in `app/utils.py`.
+"""
+
+
+import datetime
+import time
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from app import rate_history, utils
+from app.factories import TransactionFactory
+from app.models import ExchangeRate, ExchangeRateSnapshot, Transaction
+from app.summaries import find_inconsistencies
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """
+    Fixture replacing the API call with a stub returning `api.rates` and counting calls.
+    """
+
+    class StubApi:
+        rates = {'EUR': 1, 'USD': 1.1}
+        calls = 0
+
+        def fetch(self):
+            self.calls += 1
+            return self.rates
+
+    stub = StubApi()
+    monkeypatch.setattr(utils, 'fetch_exchange_rates', stub.fetch)
+    return stub
+
+
+@pytest.fixture
+def background(monkeypatch):
+    """
+    Fixture collecting the background refreshes instead of starting threads.
+    """
+
+    scheduled = []
+    monkeypatch.setattr(utils, '_run_in_background', scheduled.append)
+    return scheduled
+
+
+@pytest.mark.django_db
+def test_stale_rates_are_served_while_one_worker_refreshes(api, background, settings):
+    cache.set(utils.RATES_CACHE_KEY, {'rates': {'USD': 1.0}, 'fetched_at': time.time() - settings.EXCHANGE_RATES_TTL - 1})
+
+    # both requests get the stale table, only the first schedules a refresh
+    assert utils.get_exchange_rates() == {'USD': 1.0}
+    assert utils.get_exchange_rates() == {'USD': 1.0}
+    assert len(background) == 1
+    assert api.calls == 0
+
+    background[0]()
+
+    assert utils.get_exchange_rates() == api.rates
+    assert ExchangeRateSnapshot.objects.get().rates == api.rates
+    assert rate_history.get_rate('USD', datetime.date.today()) == Decimal('1.1')
+    assert api.calls == 1
+
+
+@pytest.mark.django_db
+def test_cold_cache_falls_back_to_snapshot(api, background):
+    ExchangeRateSnapshot.objects.create(pk=1, rates={'USD': 1.2})
+
+    assert utils.get_exchange_rates() == {'USD': 1.2}
+    assert utils.get_exchange_rate_for_target_currency('USD') == 1.2
+    assert api.calls == 0
+    assert background == []
+
+
+@pytest.mark.django_db
+def test_failed_refresh_backs_off(api, background):
+    api.rates = None
+
+    # without any rates the first worker fetches on the request path, the others back off without waiting
+    assert utils.get_exchange_rates() is None
+    assert utils.get_exchange_rates() is None
+    assert api.calls == 1
+    # an amount is never converted at a made-up rate of 1
+    assert utils.get_exchange_rate_for_target_currency('USD') is None
+    assert utils.convert_to_EUR(Decimal('100'), 'USD') == 0
+
+    # once the lock expires, the next request retries
+    cache.delete(utils.REFRESH_LOCK_KEY)
+    api.rates = {'USD': 1.1}
+    assert utils.get_exchange_rates() == {'USD': 1.1}
+
+
+@pytest.mark.django_db
+def test_cold_cache_waits_for_the_worker_fetching_the_rates(api, monkeypatch):
+    # another worker holds the lock and caches the rates while this one waits
+    utils._acquire_refresh_lock()
+    monkeypatch.setattr(utils.time, 'sleep', lambda seconds: cache.set(
+        utils.RATES_CACHE_KEY, {'rates': {'USD': 1.3}, 'fetched_at': time.time()}
+    ))
+
+    assert utils.get_exchange_rate_for_target_currency('USD') == 1.3
+    assert api.calls == 0
+
+
+@pytest.mark.django_db
+def test_rate_history_is_the_last_fallback(api, monkeypatch):
+    monkeypatch.setattr(utils, 'RATES_WAIT_TIMEOUT', 0)
+    rate_history.store_rates([('2024-01-01', 'USD', '1.25'), ('2024-02-01', 'USD', '1.05')])
+    utils._acquire_refresh_lock()
+
+    assert utils.get_exchange_rates() == {'USD': 1.05}
+    assert utils.convert_to_EUR(Decimal('105'), 'USD') == Decimal('100.00')
+    assert api.calls == 0
+
+
+def test_api_call_has_a_timeout(monkeypatch, settings):
+    calls = []
+
+    def fake_get(url, **kwargs):
+        calls.append(kwargs)
+        raise utils.requests.Timeout('too slow')
+
+    monkeypatch.setattr(utils.requests, 'get', fake_get)
+
+    assert utils.fetch_exchange_rates() is None
+    assert calls == [{'timeout': settings.EXCHANGE_RATES_REQUEST_TIMEOUT}]
+
+
+@pytest.mark.django_db
+def test_conversion_uses_rate_of_transaction_date(api):
+    rate_history.store_rates([
+        ('2024-01-01', 'USD', '1.25'),
+        ('2024-02-01', 'USD', '1.00'),
+    ])
+
+    assert utils.convert_to_EUR(Decimal('100'), 'USD', datetime.date(2024, 1, 15)) == Decimal('80.00')
+    assert utils.convert_to_EUR(Decimal('100'), 'USD', datetime.date(2024, 3, 1)) == Decimal('100.00')
+    # dates before the history use the earliest rate
+    assert utils.convert_to_EUR(Decimal('100'), 'USD', datetime.date(2023, 6, 1)) == Decimal('80.00')
+    # currencies without history fall back to the latest rates
+    assert utils.convert_to_EUR(Decimal('110'), 'USD') == Decimal('100.00')
+    assert api.calls == 1
+
+
+@pytest.mark.django_db
+def test_new_rates_are_applied_without_reloading_the_history(django_assert_num_queries):
+    rate_history.store_rates([('2024-01-01', 'USD', '1.25'), ('2024-02-01', 'SEK', '11.00')])
+    assert rate_history.get_rate('USD', datetime.date(2024, 1, 2)) == Decimal('1.25')
+
+    # the rates of a day written by another process are applied from the cache
+    rate_history.invalidate([('USD', datetime.date(2024, 1, 10), Decimal('1.20'))])
+    rate_history.record_rates({'USD': '1.10', 'GBP': '0.85'}, date=datetime.date(2024, 1, 5))
+    with django_assert_num_queries(0):
+        assert rate_history.get_rate('USD', datetime.date(2024, 1, 7)) == Decimal('1.10')
+        assert rate_history.get_rate('USD', datetime.date(2024, 1, 12)) == Decimal('1.20')
+        assert rate_history.get_rate('GBP', datetime.date(2024, 1, 5)) == Decimal('0.85')
+        assert rate_history.get_rate('SEK', datetime.date(2024, 3, 1)) == Decimal('11.00')
+
+    # a version without its rows in the cache makes the history reload, dropping the unsaved rate
+    rate_history.invalidate()
+    with django_assert_num_queries(1):
+        assert rate_history.get_rate('USD', datetime.date(2024, 1, 12)) == Decimal('1.10')
+    assert len(rate_history.get_history()) == 4
+
+
+@pytest.mark.django_db
+def test_rows_repeated_in_a_batch_keep_the_last_rate():
+    written = rate_history.store_rates([
+        ('2024-01-01', 'SEK', '11.5'),
+        ('2024-01-02', 'SEK', '11.6'),
+        (datetime.date(2024, 1, 1), 'SEK', '11.4'),
+    ])
+
+    assert written == 2
+    assert ExchangeRate.objects.get(currency='SEK', date=datetime.date(2024, 1, 1)).rate == Decimal('11.4')
+    assert rate_history.get_rate('SEK', datetime.date(2024, 1, 1)) == Decimal('11.4')
+
+
+@pytest.mark.django_db
+def test_import_exchange_rates_command(tmp_path):
+    csv_file = tmp_path / 'rates.csv'
+    csv_file.write_text('date,currency,rate\n2024-01-01,sek,11.5\n2024-01-02,SEK,11.6\n')
+    json_file = tmp_path / 'rates.json'
+    json_file.write_text('{"2024-01-02": {"SEK": 11.7, "USD": 1.1}}')
+
+    call_command('import_exchange_rates', str(csv_file))
+    # importing again overwrites the rates of the same day
+    call_command('import_exchange_rates', str(json_file))
+
+    assert ExchangeRate.objects.count() == 3
+    assert rate_history.get_rate('SEK', datetime.date(2024, 1, 1)) == Decimal('11.5')
+    assert rate_history.get_rate('SEK', datetime.date(2024, 1, 5)) == Decimal('11.7')
+
+
+@pytest.mark.django_db
+def test_prefetch_command_warms_the_cache(rates_api, settings):
+    settings.EXCHANGE_RATES_REFRESH_ON_REQUEST = False
+
+    call_command('prefetch_exchange_rates')
+
+    assert rates_api.requests == 1
+    assert utils.get_exchange_rates() == rates_api.rates
+    assert utils.get_fetch_stats()['failures'] == 0
+    assert rates_api.requests == 1
+
+
+@pytest.mark.django_db
+def test_workers_pick_up_a_newer_snapshot(settings):
+    settings.EXCHANGE_RATES_REFRESH_ON_REQUEST = False
+    ExchangeRateSnapshot.objects.create(pk=1, rates={'USD': 1.1})
+    assert utils.get_exchange_rates() == {'USD': 1.1}
+
+    # a prefetcher running in another process updates the snapshot
+    ExchangeRateSnapshot.objects.update_or_create(pk=1, defaults={'rates': {'USD': 2.0}})
+    assert utils.get_exchange_rates() == {'USD': 1.1}
+
+    # the rates read from the snapshot expire after EXCHANGE_RATES_SNAPSHOT_TIMEOUT
+    cache.delete(utils.RATES_CACHE_KEY)
+
+    assert utils.get_exchange_rates() == {'USD': 2.0}
+
+
+@pytest.mark.django_db
+def test_prefetch_command_records_failures(rates_api, settings, monkeypatch):
+    settings.EXCHANGE_RATES_REFRESH_ON_REQUEST = False
+    rates_api.status = 503
+    delays = []
+    monkeypatch.setattr('app.management.commands.prefetch_exchange_rates.time.sleep', delays.append)
+
+    with pytest.raises(CommandError):
+        call_command('prefetch_exchange_rates')
+    call_command('prefetch_exchange_rates', '--loop', '--count', '2', '--interval', '600')
+
+    stats = utils.get_fetch_stats()
+    assert stats['failures'] == stats['consecutive_failures'] == 3
+    assert stats['last_success'] is None
+    # failed fetches are retried sooner than the interval
+    assert delays == [60]
+
+    # requests never call the API themselves
+    assert utils.get_exchange_rates() is None
+    assert rates_api.requests == 3
+
+
+@pytest.mark.django_db
+def test_reconvert_transactions_command(user, api, monkeypatch):
+    january = TransactionFactory(user=user, amount=100, currency='USD', amount_in_usd=100, date=datetime.date(2024, 1, 10))
+    march = TransactionFactory(user=user, amount=100, currency='USD', amount_in_usd=100, date=datetime.date(2024, 3, 10))
+    unknown = TransactionFactory(user=user, amount=100, currency='XYZ', amount_in_usd=7, date=datetime.date(2024, 1, 10))
+    rate_history.store_rates([('2024-01-01', 'USD', '1.25'), ('2024-03-01', 'USD', '1.00')])
+
+    # a dry run lists the changes without writing them
+    call_command('reconvert_transactions', '--dry-run', '--chunk-size', '2')
+    january.refresh_from_db()
+    assert january.amount_in_usd == 100
+
+    call_command('reconvert_transactions', '--chunk-size', '2')
+    for transaction in (january, march, unknown):
+        transaction.refresh_from_db()
+
+    assert january.amount_in_usd == Decimal('80.00')
+    assert march.amount_in_usd == 100
+    assert unknown.amount_in_usd == 7
+    # the summaries follow the bulk update
+    assert find_inconsistencies([user.pk]) == []
+
+    # with a currency filter the affected users are rebuilt a chunk at a time
+    other = TransactionFactory(amount=50, currency='USD', amount_in_usd=50, date=datetime.date(2024, 1, 10))
+    rate_history.store_rates([('2024-01-01', 'USD', '2.00')])
+    monkeypatch.setattr('app.management.commands.reconvert_transactions.USERS_PER_REBUILD', 1)
+    call_command('reconvert_transactions', '--currency', 'USD')
+
+    assert Transaction.objects.get(pk=other.pk).amount_in_usd == 25
+    assert find_inconsistencies([user.pk, other.user_id]) == []
@@ -1,9 +1,23 @@
+import json
+import re
+import time
 from datetime import datetime, timedelta
 import pytest
 from django.urls import reverse
-from app.models import Category, Transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from app.models import Category, Comments, Transaction, Post
 from pytest_django.asserts import assertTemplateUsed
-from app.utils import convert_to_EUR
+from app.utils import RATES_CACHE_KEY, convert_to_EUR
+from app.currencies import get_currency_catalogue
+from app import view_counter
+from app.view_counter import flush_view_counts, get_pending_views
+from app import site_cache
+from app.models import WebSiteMeta
+from app.factories import CategoryFactory, CommentFactory, PostFactory, TagFactory, TransactionFactory, UserFactory
+from app.reactions import get_bookmarked_post_ids, get_liked_post_ids
 
 @pytest.mark.django_db
 def test_total_values_appear_on_list_page(user_transactions, client):
@@ -163,3 +177,481 @@ def test_delete_transaction_request(user, transaction_dict_params, client):
 
     # check the request has DELETED the transaction
     assert Transaction.objects.filter(user=user).count() == 0
+
+
+@pytest.mark.django_db
+def test_post_page_buffers_views(post, client, settings):
+    cache.clear()
+    settings.VIEW_COUNT_FLUSH_INTERVAL = 3600
+    settings.VIEW_COUNT_MAX_BUFFER = 100
+    last_updated = post.last_updated
+
+    for _ in range(3):
+        response = client.get(reverse('post_page', kwargs={'slug': post.slug}))
+
+    # views are shown on the page but not yet written to the post row
+    assert response.context['post'].view_count == 3
+    post.refresh_from_db()
+    assert post.view_count == 0
+
+    assert flush_view_counts() == 3
+    post.refresh_from_db()
+    assert post.view_count == 3
+    assert post.last_updated == last_updated
+
+    # nothing is left to flush
+    assert flush_view_counts() == 0
+
+
+@pytest.mark.django_db
+def test_post_page_flushes_when_buffer_is_full(post, client, settings):
+    cache.clear()
+    settings.VIEW_COUNT_FLUSH_INTERVAL = 3600
+    settings.VIEW_COUNT_MAX_BUFFER = 1
+
+    client.get(reverse('post_page', kwargs={'slug': post.slug}))
+
+    post.refresh_from_db()
+    assert post.view_count == 1
+
+
+@pytest.mark.django_db
+def test_flush_view_counts_command(post, client, settings):
+    cache.clear()
+    settings.VIEW_COUNT_FLUSH_INTERVAL = 3600
+    settings.VIEW_COUNT_MAX_BUFFER = 100
+
+    client.get(reverse('post_page', kwargs={'slug': post.slug}))
+    client.get(reverse('post_page', kwargs={'slug': post.slug}))
+    call_command('flush_view_counts')
+
+    assert Post.objects.get(pk=post.pk).view_count == 2
+
+
+@pytest.mark.django_db
+def test_flush_reads_pending_posts_from_the_cache(client, settings):
+    cache.clear()
+    settings.VIEW_COUNT_FLUSH_INTERVAL = 3600
+    settings.VIEW_COUNT_MAX_BUFFER = 100
+    viewed, other = PostFactory(), PostFactory()
+
+    for _ in range(2):
+        client.get(reverse('post_page', kwargs={'slug': viewed.slug}))
+
+    # only the viewed post is updated, without loading the IDs of every post
+    with CaptureQueriesContext(connection) as context:
+        assert flush_view_counts() == 2
+    assert not any('SELECT' in query['sql'] for query in context.captured_queries)
+    assert Post.objects.get(pk=other.pk).view_count == 0
+
+    # a post viewed again after its flush is pending again
+    client.get(reverse('post_page', kwargs={'slug': viewed.slug}))
+    assert flush_view_counts() == 1
+    assert Post.objects.get(pk=viewed.pk).view_count == 3
+
+
+@pytest.mark.django_db
+def test_concurrent_claims_never_count_views_twice(post, monkeypatch):
+    cache.clear()
+    key = view_counter._cache_key(post.pk)
+    cache.set(key, 5, timeout=None)
+
+    # another flush claims the same 5 views between this flush's read and its decrement
+    real_get_many = cache.get_many
+
+    def get_many_then_claim(keys):
+        values = real_get_many(keys)
+        cache.decr(key, 5)
+        return values
+
+    monkeypatch.setattr(cache, 'get_many', get_many_then_claim)
+    assert view_counter._claim([post.pk]) == {}
+    assert cache.get(key) == 0
+
+
+def _count_queries(client, url):
+    # measure a cold sidebar cache, so the listings are actually queried
+    cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page', ['index', 'tag_page', 'author_page', 'post_page'])
+def test_post_card_pages_have_fixed_query_count(page, client, settings):
+    cache.clear()
+    settings.VIEW_COUNT_MAX_BUFFER = 100
+    tag = TagFactory()
+    first_post = PostFactory(tags=[tag], is_featured=True)
+    author = first_post.author
+
+    urls = {
+        'index': reverse('index'),
+        'tag_page': reverse('tag_page', kwargs={'slug': tag.slug}),
+        'author_page': reverse('author_page', kwargs={'slug': author.profile.slug}),
+        'post_page': reverse('post_page', kwargs={'slug': first_post.slug}),
+    }
+
+    # warm up the session and cache so both measurements start from the same state
+    client.get(urls[page])
+    queries_with_one_post = _count_queries(client, urls[page])
+
+    # every extra card comes with its own author, profile and tag
+    for _ in range(5):
+        PostFactory(tags=[TagFactory(), tag])
+        PostFactory(tags=[tag], author=author)
+
+    queries_with_many_posts = _count_queries(client, urls[page])
+
+    assert queries_with_many_posts == queries_with_one_post
+    assert queries_with_many_posts <= 12
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page, max_queries', [('index', 9), ('post_page', 11), ('statistic-data', 3)])
+def test_pages_stay_within_query_budget(page, max_queries, user, client, settings, query_budget):
+    cache.clear()
+    settings.VIEW_COUNT_MAX_BUFFER = 100
+    client.force_login(user)
+
+    # post cards with their own author profile and tags, a thread with replies, and several categories
+    tag = TagFactory()
+    posts = [PostFactory(tags=[tag, TagFactory()], is_featured=i < 3) for i in range(8)]
+    for _ in range(8):
+        comment = CommentFactory(post=posts[0], author=UserFactory())
+        CommentFactory(post=posts[0], parent=comment, author=UserFactory())
+    today = datetime.now().date()
+    for i in range(8):
+        TransactionFactory(user=user, type='expense', category=CategoryFactory(), date=today - timedelta(days=i))
+
+    # the budget also fails the test if a query is repeated per card, comment or category
+    url = reverse(page, args=[posts[0].slug]) if page == 'post_page' else reverse(page)
+    with query_budget(max_queries) as metrics:
+        response = client.get(url, {'days': 30} if page == 'statistic-data' else {})
+
+    assert response.status_code == 200
+    assert metrics.queries > 0
+
+
+@pytest.mark.django_db
+def test_all_posts_keyset_pagination(client, settings):
+    settings.POSTS_PAGE_SIZE = 4
+    posts = PostFactory.create_batch(10)
+
+    response = client.get(reverse('all_posts'))
+    page = response.context['all_posts']
+    seen = [post.slug for post in page]
+
+    # listing cards do not load the post content
+    assert 'content' in page.object_list[0].get_deferred_fields()
+
+    # follow the cursors through the htmx "load more" fragments
+    cursor = page.next_cursor
+    while cursor:
+        response = client.get(reverse('all_posts'), {'cursor': cursor}, HTTP_HX_REQUEST='true')
+        content = response.content.decode()
+        assert '<html' not in content
+        seen += re.findall(r'/post/([\w-]+)"', content)
+        cursor = next(iter(re.findall(r'cursor=([\w=-]+)"', content)), None)
+
+    expected = sorted(posts, key=lambda post: (post.last_updated, post.pk), reverse=True)
+    assert seen == [post.slug for post in expected]
+
+
+@pytest.mark.django_db
+def test_bookmarked_posts_pagination_and_invalid_cursor(user, client, settings):
+    settings.POSTS_PAGE_SIZE = 2
+    client.force_login(user)
+    for post in PostFactory.create_batch(3):
+        post.bookmarks.add(user)
+    PostFactory()
+
+    response = client.get(reverse('all_bookmarked_posts'))
+    page = response.context['bookmarked_posts']
+    assert len(page) == 2 and page.has_next()
+
+    response = client.get(reverse('all_bookmarked_posts'), {'cursor': page.next_cursor})
+    assert len(response.context['bookmarked_posts']) == 1
+    assert not response.context['bookmarked_posts'].has_next()
+
+    assert client.get(reverse('all_bookmarked_posts'), {'cursor': 'not-a-cursor'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_index_sidebars_are_served_from_cache(client):
+    cache.clear()
+    PostFactory.create_batch(3)
+    WebSiteMeta.objects.create(title='Blog', description='About money', about='Hello')
+
+    cold_queries = _count_queries(client, reverse('index'))
+    stats_before = site_cache.get_stats()
+
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse('index'))
+
+    assert len(context.captured_queries) < cold_queries
+    assert response.context['website_info'].title == 'Blog'
+    assert site_cache.get_stats()['hits'] == stats_before['hits'] + 4
+
+
+@pytest.mark.django_db
+def test_site_cache_is_invalidated_on_content_changes(client):
+    cache.clear()
+    PostFactory()
+    meta = WebSiteMeta.objects.create(title='Blog', description='About money', about='Hello')
+
+    client.get(reverse('index'))
+    new_post = PostFactory()
+    meta.title = 'New title'
+    meta.save()
+
+    response = client.get(reverse('index'))
+
+    assert new_post in response.context['recent_posts']
+    assert response.context['website_info'].title == 'New title'
+
+
+@pytest.mark.django_db
+def test_statistic_data_payload(user, client, django_assert_max_num_queries):
+    client.force_login(user)
+    today = datetime.now().date()
+    rent = Category.objects.create(name='Rent')
+    food = Category.objects.create(name='Food')
+    TransactionFactory(user=user, type='expense', category=rent, amount_in_usd=500, date=today)
+    TransactionFactory(user=user, type='expense', category=food, amount_in_usd=20, date=today - timedelta(days=2))
+    TransactionFactory(user=user, type='expense', category=food, amount_in_usd=30, date=today - timedelta(days=2))
+    TransactionFactory(user=user, type='income', category=rent, amount_in_usd=1000, date=today)
+    TransactionFactory(user=user, type='expense', category=food, amount_in_usd=99, date=today - timedelta(days=8))
+
+    # session, user and a single query over the daily rollup
+    with django_assert_max_num_queries(3):
+        response = client.get(reverse('statistic-data'), {'days': 7})
+    data = response.json()
+
+    assert data['total_expenses'] == 550
+    assert data['total_income'] == 1000
+    assert data['net'] == 450
+    assert data['categories'] == [{'name': 'Rent', 'total': 500}, {'name': 'Food', 'total': 50}]
+
+    # every day of the window is present, days without expenses are zero
+    assert len(data['daily']['dates']) == 7
+    assert data['daily']['dates'][-1] == today.isoformat()
+    assert data['daily']['expenses'][-1] == 500
+    assert data['daily']['expenses'][-3] == 50
+    assert sum(data['daily']['expenses']) == 550
+
+    # custom range including the older expense
+    start = (today - timedelta(days=8)).isoformat()
+    data = client.get(reverse('statistic-data'), {'start': start, 'end': today.isoformat()}).json()
+    assert data['total_expenses'] == 649
+    assert len(data['daily']['dates']) == 9
+
+
+@pytest.mark.django_db
+def test_statistic_data_rejects_invalid_windows(user, client):
+    client.force_login(user)
+
+    assert client.get(reverse('statistic-data'), {'days': 12}).status_code == 400
+    assert client.get(reverse('statistic-data'), {'start': '2024-02-01', 'end': '2024-01-01'}).status_code == 400
+    assert client.get(reverse('statistic-data'), {'start': 'yesterday'}).status_code == 400
+    assert client.get(reverse('statistic')).status_code == 200
+
+
+@pytest.mark.django_db
+def test_transaction_forms_use_memoized_currency_catalogue(user, client):
+    client.force_login(user)
+    cache.set(RATES_CACHE_KEY, {'rates': {'USD': 1.1, 'SEK': 11.5, 'EUR': 1}, 'fetched_at': time.time()}, timeout=None)
+    transaction = TransactionFactory(user=user, currency='SEK')
+
+    catalogue = get_currency_catalogue()
+    assert catalogue.codes == ['EUR', 'SEK', 'USD']
+    assert get_currency_catalogue() is catalogue
+
+    content = client.get(reverse('update-transaction', kwargs={'pk': transaction.pk})).content.decode()
+    assert '<option value="SEK" selected>SEK</option>' in content
+    assert '<option value="USD">USD - US Dollar</option>' in content
+
+    # a new rate table version builds a new catalogue
+    cache.set(RATES_CACHE_KEY, {'rates': {'USD': 1.1}, 'fetched_at': time.time() + 1}, timeout=None)
+    assert get_currency_catalogue().codes == ['USD']
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_expense_tracker_keyset_scroll_keeps_filters(user_transactions, client, settings):
+    settings.PAGE_SIZE = 3
+    user = user_transactions[0].user
+    client.force_login(user)
+
+    response = client.get(reverse('expense_tracker'), {'transaction_type': 'expense'})
+    seen = [transaction.pk for transaction in response.context['transactions']]
+    next_url = response.context['next_page_url']
+
+    # follow the next-page URLs of the htmx "revealed" rows, which keep the filter
+    while next_url:
+        assert 'transaction_type=expense' in next_url
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(next_url.replace('&amp;', '&'), HTTP_HX_REQUEST='true')
+        assert not any('COUNT(' in query['sql'] for query in context.captured_queries)
+
+        content = response.content.decode()
+        seen += [int(pk) for pk in re.findall(r'/transactions/(\d+)/update/', content)]
+        next_url = next(iter(re.findall(r'hx-get="(/get-transactions/\?[^"]+)"', content)), None)
+
+    expected = sorted(
+        (t for t in user_transactions if t.type == 'expense'), key=lambda t: (t.date, t.pk), reverse=True,
+    )
+    assert seen == [t.pk for t in expected]
+    assert client.get(reverse('get-transactions'), {'cursor': 'bad'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_like_and_bookmark_counters(post, user, client):
+    cache.clear()
+    client.force_login(user)
+    url = reverse('like_post', args=[post.slug])
+
+    client.post(url, {'post_id': post.id})
+    post.refresh_from_db()
+    assert post.like_count == 1
+    assert get_liked_post_ids(user) == {post.id}
+
+    response = client.get(reverse('post_page', args=[post.slug]))
+    assert response.context['post_is_liked'] and response.context['number_of_likes'] == 1
+    assert not response.context['is_bookmarked']
+
+    # toggling again removes the like
+    client.post(url, {'post_id': post.id})
+    post.refresh_from_db()
+    assert post.like_count == 0
+    assert get_liked_post_ids(user) == set()
+
+    # changes through the M2M managers keep counters and cached sets in sync
+    client.post(reverse('bookmark_post', args=[post.slug]), {'post_id': post.id})
+    assert get_bookmarked_post_ids(user) == {post.id}
+    post.likes.add(user, UserFactory())
+    user.bookmarks.clear()
+    post.refresh_from_db()
+    assert (post.like_count, post.bookmark_count) == (2, 0)
+    assert get_bookmarked_post_ids(user) == set()
+    assert get_liked_post_ids(user) == {post.id}
+
+
+@pytest.mark.django_db
+def test_htmx_like_and_bookmark_toggles_return_fragments(post, user, client):
+    cache.clear()
+    client.force_login(user)
+    views_before = get_pending_views(post)
+
+    with CaptureQueriesContext(connection) as context:
+        response = client.post(reverse('like_post', args=[post.slug]), {'post_id': post.id}, HTTP_HX_REQUEST='true')
+    content = response.content.decode()
+
+    assert response.status_code == 200
+    assert '<html' not in content and 'fa-solid fa-heart' in content and '<span>1</span>' in content
+    # session, user, post, and the locked toggle with its write
+    assert len(context.captured_queries) <= 9
+
+    response = client.post(reverse('bookmark_post', args=[post.slug]), {'post_id': post.id}, HTTP_HX_REQUEST='true')
+    assert 'fa-solid fa-bookmark' in response.content.decode()
+
+    # no page render, so no view is counted
+    assert get_pending_views(post) == views_before
+
+    # without htmx the toggle still redirects to the post, and anonymous users are sent to log in
+    response = client.post(reverse('like_post', args=[post.slug]), {'post_id': post.id})
+    assert response.status_code == 302 and response.url == reverse('post_page', args=[post.slug])
+    client.logout()
+    response = client.post(reverse('like_post', args=[post.slug]), {'post_id': post.id})
+    assert response.status_code == 302 and 'login' in response.url
+
+
+@pytest.mark.django_db
+def test_post_page_renders_nested_comment_thread_from_one_query(post, client):
+    cache.clear()
+    url = reverse('post_page', args=[post.slug])
+
+    def comment(content, parent=None):
+        return Comments.objects.create(
+            content=content, name='Reader', email='reader@example.com', website='', post=post, parent=parent,
+        )
+
+    def comment_queries():
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200
+        queries = sum('"app_comments"' in query['sql'] for query in context.captured_queries)
+        return response.content.decode(), queries
+
+    parent = comment('Root comment')
+    for depth in range(1, 6):
+        parent = comment(f'Reply at depth {depth}', parent)
+
+    content, queries = comment_queries()
+    assert queries == 1
+    assert 'Reply at depth 5' in content and '<span>6</span>' in content
+    assert content.count('class="public-reply"') == 5
+
+    # served from the cache, with the token of the request in the reply forms
+    content, queries = comment_queries()
+    assert queries == 0
+    assert '__comment_thread_csrf_token__' not in content
+    assert content.count('name = "parent"') == 6
+
+    # a new comment invalidates the thread, which is still loaded with one query
+    for i in range(20):
+        comment(f'Comment {i}')
+    content, queries = comment_queries()
+    assert queries == 1
+    assert 'Comment 19' in content and '<span>26</span>' in content
+
+
+@pytest.mark.django_db
+def test_deep_comment_thread_renders_with_balanced_markup(post, client):
+    cache.clear()
+    parent = None
+    for depth in range(300):
+        parent = Comments.objects.create(
+            content=f'Reply at depth {depth}', name='Reader', email='reader@example.com',
+            website='', post=post, parent=parent,
+        )
+    Comments.objects.create(content='Second root', name='Reader', email='reader@example.com', website='', post=post)
+
+    response = client.get(reverse('post_page', args=[post.slug]))
+    thread = str(response.context['comment_thread'])
+
+    assert 'Reply at depth 299' in thread and thread.index('Reply at depth 299') < thread.index('Second root')
+    assert thread.count('<div') == thread.count('</div>')
+    # the second root is not nested in the first thread
+    assert thread.count('class="user-comment"') == 2
+
+
+@pytest.mark.django_db
+def test_export_transactions_streams_filtered_rows(user_transactions, client, settings):
+    settings.EXPORT_CHUNK_SIZE = 3
+    user = user_transactions[0].user
+    TransactionFactory.create_batch(5)  # other users' transactions are never exported
+    client.force_login(user)
+    url = reverse('export-transactions')
+
+    response = client.get(url, {'transaction_type': 'expense'})
+    assert response.streaming
+    assert response['Content-Disposition'] == 'attachment; filename="transactions.csv"'
+
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    expenses = Transaction.objects.filter(user=user, type='expense').order_by('date', 'id')
+    assert lines[0] == 'id,date,type,category,amount,currency,amount_in_eur'
+    assert [int(line.split(',')[0]) for line in lines[1:]] == [t.id for t in expenses]
+
+    response = client.get(url, {'format': 'ndjson'})
+    assert response['Content-Type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert len(rows) == len(user_transactions)
+    first = Transaction.objects.filter(user=user).order_by('date', 'id').select_related('category').first()
+    assert rows[0]['category'] == first.category.name and rows[0]['amount'] == str(first.amount)
+
+    assert client.get(url, {'format': 'xml'}).status_code == 400
+    assert client.get(url, {'start_date': 'not-a-date'}).status_code == 400
+
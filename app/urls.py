@@ -26,5 +26,9 @@ urlpatterns = [
     path('transactions/<int:pk>/update/', views.update_transaction, name='update-transaction'),
     path('transactions/<int:pk>/delete/', views.delete_transaction, name='delete-transaction'),
     path('get-transactions/', views.get_transactions, name='get-transactions'),
+    path('transactions/export', views.export_transactions, name='export-transactions'),
+    path('transactions/import', views.import_transactions, name='import-transactions'),
     path('statistic', views.view_statistic, name='statistic'),
+    path('statistic/data', views.statistic_data, name='statistic-data'),
+    path('stats/performance', views.performance_stats, name='performance-stats'),
 ]
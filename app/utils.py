@@ -3,25 +3,59 @@ Module to handle fetching and converting exchange rates for different currencies
 
 This module provides functions to fetch exchange rates from an external API,
 cache them to improve performance, and convert an amount from any currency to EUR
-based on the latest rates. It uses Django's caching mechanism to avoid making
-repeated API calls and to store the rates for efficient access.
+based on the latest rates.
+
+The rate table is served with stale-while-revalidate semantics: once the cached
+table is older than `settings.EXCHANGE_RATES_TTL`, it is still returned while a
+single worker (guarded by a lock in the shared cache) refreshes it in the
+background. Every successful fetch is also stored in the database as the
+last-known-good snapshot, so a cold cache or an API outage falls back to the
+snapshot instead of blocking the request on the upstream API. The fetched rates
+are also added to the rate history (see `app/rate_history.py`), which converts
+dated transactions with the rate in effect on their date and is the last
+fallback when there is no snapshot either.
+
+In production the `prefetch_exchange_rates` command refreshes the rates before
+they go stale, so requests are always served from the cache. With
+`settings.EXCHANGE_RATES_REFRESH_ON_REQUEST` disabled, request handlers never
+call the API themselves.
 """
 
 
-import os
+import logging
+import threading
+import time
 from decimal import Decimal
 
 import requests
 
 from django.conf import settings
 from django.core.cache import cache
+from django.db import close_old_connections
 
+from app import rate_history
+from app.instrumentation import record_cache
+from app.models import ExchangeRateSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+RATES_CACHE_KEY = 'conversion_rates'
+REFRESH_LOCK_KEY = 'conversion_rates:refresh_lock'
+FETCH_STATS_KEY = 'conversion_rates:stats'
+
+# Seconds between checks of the cache while another worker fetches the first rates, and the
+# longest a request waits for them before falling back to the rate history
+RATES_WAIT_INTERVAL = 0.05
+RATES_WAIT_TIMEOUT = 0.3
 
 
 def fetch_exchange_rates():
     """
     Fetches the latest exchange rates via an API call.
 
+    The call is bounded by `settings.EXCHANGE_RATES_REQUEST_TIMEOUT` seconds.
+
     Returns:
         dict or None: A dictionary of conversion rates or None if the request fails.
     """
@@ -30,90 +64,274 @@ def fetch_exchange_rates():
 
     # API call to fetch exchange rates
     try:
-        response = requests.get(full_url)
+        response = requests.get(full_url, timeout=settings.EXCHANGE_RATES_REQUEST_TIMEOUT)
         response.raise_for_status() # Raise an exception if the request was unsuccessful
         data = response.json()
         return data['conversion_rates']
 
-    except requests.RequestException as error:
-        print(f'Error in API call: {error}')
+    except (requests.RequestException, ValueError, KeyError) as error:
+        logger.warning('Error in exchange rate API call: %s', error)
         return None
 
 
-def get_exchange_rate_for_target_currency(target_currency):
+def refresh_exchange_rates():
     """
-    Retrieves the exchange rate for a specific target currency from the cache
-    or makes an API call to fetch the rates.
+    Fetches the rates from the API and stores them in the cache, the database snapshot and the rate history.
 
-    If the exchange rates are not found in the cache, it fetches them using
-    `fetch_exchange_rates()` and caches the result.
+    Returns:
+        dict or None: The fresh conversion rates, or None if the API call failed.
+    """
 
-    Args:
-        target_currency (str): The currency for which to fetch the exchange rate.
+    rates = fetch_exchange_rates()
+    if not rates:
+        return None
+
+    cache.set(RATES_CACHE_KEY, {'rates': rates, 'fetched_at': time.time()}, timeout=None)
+    ExchangeRateSnapshot.objects.update_or_create(pk=1, defaults={'rates': rates})
+    rate_history.record_rates(rates)
+    return rates
+
+
+def prefetch_exchange_rates():
+    """
+    Refreshes the rates and records the latency and outcome of the fetch.
+
+    The refresh lock is released after a successful refresh. After a failure it
+    is kept until it expires, so workers back off from a failing API for
+    `settings.EXCHANGE_RATES_LOCK_TIMEOUT` seconds.
 
     Returns:
-        float: The exchange rate for the target currency, or None if not available.
+        dict or None: The fresh conversion rates, or None if the API call failed.
     """
 
-    # Try to get the exchange rates from the cache
-    exchange_rates = cache.get('conversion_rates')
+    started = time.perf_counter()
+    try:
+        rates = refresh_exchange_rates()
+    except Exception:
+        logger.exception('Refreshing the exchange rates failed')
+        rates = None
+    _record_fetch(bool(rates), time.perf_counter() - started)
 
-    # If the exchange rates are not in the cache, fetch them from the API and store them in the cache
-    if not exchange_rates:
-        exchange_rates = fetch_exchange_rates()
+    if rates:
+        cache.delete(REFRESH_LOCK_KEY)
+    return rates
 
-        if not exchange_rates:
-            # # If the API call fails, return a default value of 1 (EUR as base currency)
-            return 1
 
-        # Cache the exchange rates for 1 hour
-        cache.set('conversion_rates', exchange_rates, timeout=3600)
+def _record_fetch(success, latency):
+    """
+    Adds the outcome of a fetch to the statistics stored in the cache.
+    """
 
-    return exchange_rates.get(target_currency, None) # Return None if target_currency is not found
+    stats = cache.get(FETCH_STATS_KEY) or {
+        'fetches': 0,
+        'failures': 0,
+        'consecutive_failures': 0,
+        'last_success': None,
+        'last_failure': None,
+        'last_latency': None,
+    }
+
+    stats['fetches'] += 1
+    stats['last_latency'] = latency
+    if success:
+        stats['consecutive_failures'] = 0
+        stats['last_success'] = time.time()
+    else:
+        stats['failures'] += 1
+        stats['consecutive_failures'] += 1
+        stats['last_failure'] = time.time()
 
+    cache.set(FETCH_STATS_KEY, stats, timeout=None)
+    logger.info('Exchange rate fetch %s in %.3fs', 'succeeded' if success else 'failed', latency)
 
-def get_exchange_rates():
+
+def get_fetch_stats():
+    """
+    Returns the statistics of the exchange rate fetches.
+
+    Returns:
+        dict or None: The number of 'fetches', 'failures' and 'consecutive_failures',
+                      the timestamps of the 'last_success' and 'last_failure' and
+                      the 'last_latency' in seconds, or None if nothing was fetched yet.
+    """
+
+    return cache.get(FETCH_STATS_KEY)
+
+
+def _acquire_refresh_lock():
+    """
+    Return True if this worker may refresh the rates, False if another one already does.
     """
-    Retrieves the latest exchange rates from the cache or makes an API call to fetch them.
 
-    If the exchange rates are not in the cache, it fetches them using `fetch_exchange_rates()`
-    and caches the result.
+    return cache.add(REFRESH_LOCK_KEY, True, timeout=settings.EXCHANGE_RATES_LOCK_TIMEOUT)
+
+
+def _run_in_background(func):
+    """
+    Runs a function in a daemon thread, closing its database connection afterwards.
+    """
+
+    def target():
+        try:
+            func()
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _load_snapshot():
+    """
+    Returns the last-known-good rates stored in the database as a cache entry, or None.
+    """
+
+    snapshot = ExchangeRateSnapshot.objects.filter(pk=1).first()
+    if snapshot is None:
+        return None
+    return {'rates': snapshot.rates, 'fetched_at': snapshot.fetched_at.timestamp()}
+
+
+def _wait_for_rates():
+    """
+    Waits for the worker holding the refresh lock to cache the first rates.
+
+    The wait is bounded by `RATES_WAIT_TIMEOUT`, a fraction of the API call,
+    so requests do not block on the API; it is skipped while the workers back
+    off from a failing API.
 
     Returns:
-        dict or None: A dictionary of conversion rates or None if fetching fails.
+        dict or None: The cache entry, or None if no rates were cached in time.
     """
 
-    # Try to get the exchange rates from the cache
-    exchange_rates = cache.get('conversion_rates')
+    stats = get_fetch_stats()
+    if stats and stats['consecutive_failures']:
+        return None
+
+    deadline = time.monotonic() + RATES_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(RATES_WAIT_INTERVAL)
+        entry = cache.get(RATES_CACHE_KEY)
+        if entry is not None:
+            return entry
+    return None
 
-    # If the exchange rates are not in the cache, fetch them from the API and store them in the cache
-    if not exchange_rates:
-        exchange_rates = fetch_exchange_rates()
 
-        if not exchange_rates:
-            # # If the API call fails, return None
-            return None
+def _load_history():
+    """
+    Returns the latest rate of every currency of the rate history as a cache entry, or None.
+
+    The entry is not cached, so the next request picks up fetched rates as soon as there are any.
+    """
 
-        # Cache the exchange rates for 1 hour
-        cache.set('conversion_rates', exchange_rates, timeout=3600)
+    rates = rate_history.get_history().latest_rates()
+    if not rates:
+        return None
+    return {'rates': {currency: float(rate) for currency, rate in rates.items()}, 'fetched_at': 0}
 
-    return exchange_rates
 
+def get_rate_table():
+    """
+    Retrieves the latest rate table without waiting for the API whenever possible.
+
+    The rates are read from the cache, or from the database snapshot if the
+    cache is cold; rates read from the snapshot are cached for
+    `settings.EXCHANGE_RATES_SNAPSHOT_TIMEOUT` seconds only. If they are older
+    than `settings.EXCHANGE_RATES_TTL`, they are still returned and one worker
+    refreshes them in the background. The API is only called on the request
+    path when there are no rates at all, and never if
+    `settings.EXCHANGE_RATES_REFRESH_ON_REQUEST` is disabled; the other workers
+    then wait at most `RATES_WAIT_TIMEOUT` seconds for the fetched rates.
+    Without any fetched rates, the latest rates of the rate history are used.
 
-def convert_to_EUR(amount, currency):
+    Returns:
+        dict or None: The 'rates' and the 'fetched_at' timestamp, which also
+                      identifies the version of the table, or None if no
+                      rates are available.
+    """
+
+    # Try to get the exchange rates from the cache, then from the last-known-good snapshot
+    entry = cache.get(RATES_CACHE_KEY)
+    record_cache(entry is not None)
+    if entry is None:
+        entry = _load_snapshot()
+        if entry is not None:
+            # Kept for a while only, so a newer snapshot written by another process is picked up
+            cache.set(RATES_CACHE_KEY, entry, timeout=settings.EXCHANGE_RATES_SNAPSHOT_TIMEOUT)
+
+    # Leave refreshing to the prefetcher
+    if not settings.EXCHANGE_RATES_REFRESH_ON_REQUEST:
+        return entry or _load_history()
+
+    # Nothing to serve yet: a single worker fetches the rates, the others wait for it
+    if entry is None:
+        if _acquire_refresh_lock():
+            entry = cache.get(RATES_CACHE_KEY) if prefetch_exchange_rates() else None
+        else:
+            entry = _wait_for_rates()
+        return entry or _load_history()
+
+    # Serve the stale rates while a single worker refreshes them
+    if time.time() - entry['fetched_at'] > settings.EXCHANGE_RATES_TTL and _acquire_refresh_lock():
+        _run_in_background(prefetch_exchange_rates)
+
+    return entry
+
+
+def get_exchange_rates():
+    """
+    Retrieves the latest exchange rates, as described in `get_rate_table()`.
+
+    Returns:
+        dict or None: A dictionary of conversion rates or None if no rates are available.
+    """
+
+    entry = get_rate_table()
+    return entry['rates'] if entry else None
+
+
+def get_exchange_rate_for_target_currency(target_currency):
+    """
+    Retrieves the exchange rate for a specific target currency.
+
+    Args:
+        target_currency (str): The currency for which to fetch the exchange rate.
+
+    Returns:
+        float: The exchange rate for the target currency, or None if no rates are
+               available or the currency is not found.
+    """
+
+    exchange_rates = get_exchange_rates()
+
+    if not exchange_rates:
+        # Never fall back to a rate of 1, which would store the raw amount as EUR
+        return None
+
+    return exchange_rates.get(target_currency, None) # Return None if target_currency is not found
+
+
+def convert_to_EUR(amount, currency, date=None):
     """
     Converts a given amount to EUR based on the exchange rate.
 
+    If a date is given, the historical rate in effect on that date is used, so
+    back-dated transactions are converted correctly without any API call. The
+    latest rate is used if no date is given or the currency has no history.
+
     Args:
         amount (float): The amount to convert.
         currency (str): The currency code of the given amount.
+        date (date, optional): The date of the transaction.
 
     Returns:
         float: The amount converted to EUR, or 0 if the exchange rate is unavailable.
     """
 
-    # Get exchange rate for target currency
-    exchange_rate = get_exchange_rate_for_target_currency(currency)
+    exchange_rate = rate_history.get_rate(currency, date) if date else None
+
+    # Fall back to the latest exchange rate for target currency
+    if exchange_rate is None:
+        exchange_rate = get_exchange_rate_for_target_currency(currency)
 
     if exchange_rate:
 
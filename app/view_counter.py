@@ -0,0 +1,280 @@
+"""
+Module to buffer post page views and write them to the database in batches.
+
+Instead of saving the whole `Post` row on every page view, each hit increments a
+per-post counter in Django's cache. The pending counters are periodically flushed
+to `Post.view_count` with atomic `F()` updates, grouped so that all posts with the
+same number of pending views are updated by a single query.
+
+The counters and the list of posts with pending views live in the cache, so it
+must be shared by the worker processes (see `app/checks.py`): any process, e.g.
+the `flush_view_counts` command, can then flush the views recorded by the others,
+and a worker restart loses nothing.
+
+A post is added to the pending list on its first view since it was last flushed.
+The list is an append-only log of cache keys numbered by an atomic counter, read
+from a cursor by the flush. A flush claims the views of each post by decrementing
+its counter before the database update, so views recorded meanwhile are kept for
+the next flush and two flushes running at once never write the same views twice.
+
+Settings:
+    VIEW_COUNT_FLUSH_INTERVAL: Seconds between automatic flushes of the buffer.
+    VIEW_COUNT_MAX_BUFFER: Number of buffered posts that triggers an early flush.
+"""
+
+
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from app.models import Post
+
+
+CACHE_KEY_PREFIX = 'post_views'
+
+# Keys of the pending log: the number of the last entry, and the last entry read by a flush
+SEQUENCE_KEY = f'{CACHE_KEY_PREFIX}:sequence'
+CURSOR_KEY = f'{CACHE_KEY_PREFIX}:cursor'
+# First missing entry met by the last flush, skipped if it is still missing at the next one
+GAP_KEY = f'{CACHE_KEY_PREFIX}:gap'
+FLUSH_LOCK_KEY = f'{CACHE_KEY_PREFIX}:flush_lock'
+
+# Seconds a log entry and a post's pending marker are kept; an expired marker only means the post
+# is added to the log again on its next view
+PENDING_TIMEOUT = 86400
+FLUSH_LOCK_TIMEOUT = 300
+
+# Time of the last flush triggered by this process
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+
+def _cache_key(post_id):
+    """
+    Build the cache key holding the pending view count of a post.
+    """
+
+    return f'{CACHE_KEY_PREFIX}:{post_id}'
+
+
+def _marker_key(post_id):
+    """
+    Build the cache key marking a post as already in the pending log.
+    """
+
+    return f'{CACHE_KEY_PREFIX}:pending:{post_id}'
+
+
+def _entry_key(number):
+    """
+    Build the cache key of an entry of the pending log.
+    """
+
+    return f'{CACHE_KEY_PREFIX}:log:{number}'
+
+
+def _add_pending(post_id):
+    """
+    Appends a post to the pending log.
+
+    Returns:
+        int: The number of entries not read by a flush yet.
+    """
+
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    try:
+        number = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # The log was evicted from the cache, start it again
+        cache.set_many({SEQUENCE_KEY: 1, CURSOR_KEY: 0}, timeout=None)
+        number = 1
+
+    cache.set(_entry_key(number), post_id, timeout=PENDING_TIMEOUT)
+    return number - (cache.get(CURSOR_KEY) or 0)
+
+
+def record_view(post):
+    """
+    Buffers a single view of the given post.
+
+    The view is added to the post's cache counter. When the flush interval has
+    elapsed or the buffer holds too many posts, the pending views are written
+    to the database.
+
+    Args:
+        post (Post): The post that was viewed.
+    """
+
+    global _last_flush
+
+    key = _cache_key(post.pk)
+
+    # Create the counter if it does not exist yet, then increment it atomically
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+    # The first view since the last flush of the post adds it to the pending log.
+    # The marker is set after the counter, so a flush removing it always sees this view.
+    buffered = 0
+    if cache.add(_marker_key(post.pk), True, timeout=PENDING_TIMEOUT):
+        buffered = _add_pending(post.pk)
+
+    with _lock:
+        interval_elapsed = time.monotonic() - _last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL
+        buffer_full = buffered >= settings.VIEW_COUNT_MAX_BUFFER
+
+        if not (interval_elapsed or buffer_full):
+            return
+
+        _last_flush = time.monotonic()
+
+    flush_view_counts()
+
+
+def get_pending_views(post):
+    """
+    Returns the number of views of the post that are not yet saved to the database.
+
+    Args:
+        post (Post): The post to check.
+
+    Returns:
+        int: The number of buffered views.
+    """
+
+    return max(cache.get(_cache_key(post.pk)) or 0, 0)
+
+
+def _read_pending():
+    """
+    Reads the posts of the pending log that no flush has read yet.
+
+    An entry missing from the cache is usually being written by `_add_pending`,
+    so the cursor stops before it and the entry is read again by the next
+    flush. If it is still missing then, its writer is gone and it is skipped.
+
+    Returns:
+        tuple: The set of post IDs and the number of the last entry that can be marked as read.
+    """
+
+    start = cache.get(CURSOR_KEY) or 0
+    end = cache.get(SEQUENCE_KEY) or 0
+    entries = cache.get_many([_entry_key(number) for number in range(start + 1, end + 1)])
+
+    cursor = None
+    for number in range(start + 1, end + 1):
+        if cursor is None and _entry_key(number) not in entries:
+            if cache.get(GAP_KEY) != number:
+                cache.set(GAP_KEY, number, timeout=PENDING_TIMEOUT)
+                cursor = number - 1
+    return set(entries.values()), end if cursor is None else cursor
+
+
+def _claim(post_ids):
+    """
+    Takes the pending views of posts out of their counters.
+
+    Each counter is decremented by the count read before, atomically. If another
+    flush took some of these views in between, the counter drops below zero and
+    the views taken twice are given back.
+
+    Returns:
+        dict: Post IDs mapped to the number of views claimed.
+    """
+
+    keys = {_cache_key(post_id): post_id for post_id in post_ids}
+    claimed = {}
+
+    for key, count in cache.get_many(keys.keys()).items():
+        if not count or count < 0:
+            continue
+        try:
+            remaining = cache.decr(key, count)
+        except ValueError:
+            continue
+
+        # remaining + count is the value of the counter right before the decrement
+        taken = min(count, max(remaining + count, 0))
+        if taken < count:
+            cache.incr(key, count - taken)
+        if taken:
+            claimed[keys[key]] = taken
+
+    return claimed
+
+
+def _give_back(claimed):
+    """
+    Adds claimed views back to their counters, after a failed database update.
+    """
+
+    for post_id, count in claimed.items():
+        key = _cache_key(post_id)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, count)
+
+
+def flush_view_counts(post_ids=None):
+    """
+    Writes the buffered views to `Post.view_count`.
+
+    The views of each post are claimed from its cache counter first (see
+    `_claim()`), then posts are grouped by their number of claimed views, so
+    each group is updated by one `UPDATE ... SET view_count = view_count + n`
+    query. If the update fails, the views are put back in the counters.
+
+    Only one flush runs at a time across processes; a flush started while
+    another one holds the lock does nothing.
+
+    Args:
+        post_ids (iterable, optional): Posts to flush. Defaults to the posts of the pending log.
+
+    Returns:
+        int: The total number of views written to the database.
+    """
+
+    if not cache.add(FLUSH_LOCK_KEY, True, timeout=FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        cursor = None
+        if post_ids is None:
+            post_ids, cursor = _read_pending()
+            # Views arriving after the markers are removed add their post to the log again
+            cache.delete_many([_marker_key(post_id) for post_id in post_ids])
+
+        claimed = _claim(post_ids)
+
+        # Group posts by the number of views to add
+        posts_by_increment = defaultdict(list)
+        for post_id, count in claimed.items():
+            posts_by_increment[count].append(post_id)
+
+        try:
+            with transaction.atomic():
+                for increment, ids in posts_by_increment.items():
+                    Post.objects.filter(pk__in=ids).update(
+                        view_count=Coalesce(F('view_count'), Value(0)) + increment
+                    )
+        except Exception:
+            _give_back(claimed)
+            raise
+
+        if cursor is not None:
+            start = cache.get(CURSOR_KEY) or 0
+            cache.set(CURSOR_KEY, cursor, timeout=None)
+            cache.delete_many([_entry_key(number) for number in range(start + 1, cursor + 1)])
+
+        return sum(claimed.values())
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
@@ -10,26 +10,32 @@ interaction such as subscribing and commenting.
 """
 
 
-import datetime
+import csv
 import time
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django_htmx.http import retarget
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
 from django.conf import settings
 
 from django.contrib.auth.models import User
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Count
 
 from app.models import Comments, Post, Tag, Profile, WebSiteMeta, Transaction, Category
-from app.forms import CommentForm, SubscribeForm, NewUserForm, TransactionForm
+from app.forms import CommentForm, SubscribeForm, NewUserForm, TransactionForm, TransactionImportForm
 from app.filters import TransactionFilter
-from .utils import get_exchange_rates, convert_to_EUR
+from . import comments, exports, imports, instrumentation, search, site_cache, statistics
+from .utils import convert_to_EUR, get_fetch_stats
+from .currencies import get_currency_catalogue
+from .view_counter import record_view, get_pending_views
+from .pagination import KeysetPaginator, InvalidCursor
+from .summaries import get_user_totals
+from .reactions import get_bookmarked_post_ids, get_liked_post_ids, toggle as toggle_reaction
 
 
 def post_page(request, slug):
@@ -46,27 +52,16 @@ def post_page(request, slug):
         HttpResponse: The rendered post page with context.
     """
 
-    # Fetch the post object based on the slug
-    post = Post.objects.get(slug=slug)
-
-    # Retrieve top-level comments for the post
-    comments = Comments.objects.filter(post=post, parent=None)
+    # Fetch the post object based on the slug, together with its author and tags
+    post = Post.objects.for_cards().get(slug=slug)
 
     # Initialize comment form for new comment submissions
     form = CommentForm()
 
-    # Bookmark logic
-    bookmarked = False
-    if post.bookmarks.filter(id=request.user.id).exists():
-        bookmarked = True
-    is_bookmarked = bookmarked
-
-    # Likes logic
-    liked = False
-    if post.likes.filter(id=request.user.id).exists():
-        liked = True
+    # Bookmark and like state from the user's cached bookmarked and liked posts
+    is_bookmarked = post.id in get_bookmarked_post_ids(request.user)
+    post_is_liked = post.id in get_liked_post_ids(request.user)
     number_of_likes = post.number_of_likes()
-    post_is_liked = liked
     
     # Handle comment form submission
     if request.POST:
@@ -96,24 +91,27 @@ def post_page(request, slug):
                 comment.save()
                 return HttpResponseRedirect(reverse('post_page', kwargs={'slug':slug}))
 
-    # Update view count for the post
-    if post.view_count is None:
-        post.view_count = 1
-    else:
-        post.view_count = post.view_count + 1
-    post.save()
+    # Buffer the view instead of saving the whole post on every request
+    record_view(post)
+
+    # Show the stored view count together with the views not yet flushed to the database
+    post.view_count = (post.view_count or 0) + get_pending_views(post)
+
+    # Render the whole comment thread from one query, or take it from the cache
+    comment_thread, comment_count = comments.get_thread(request, post)
 
     # Retrieve top posts based on view count (ordered in descending order)
-    top_posts = Post.objects.all().order_by('-view_count')[:3]
+    top_posts = site_cache.get_top_posts()
 
     # Retrieve recent posts ordered by last updated
-    recent_posts = Post.objects.all().order_by('-last_updated')[:3]
+    recent_posts = site_cache.get_recent_posts()
 
     # Context data for rendering the post page
     context = {
         'post':post,
         'form':form,
-        'comments':comments,
+        'comment_thread': comment_thread,
+        'comment_count': comment_count,
         'is_bookmarked':is_bookmarked, 
         'post_is_liked': post_is_liked,
         'number_of_likes': number_of_likes,
@@ -138,29 +136,23 @@ def index(request):
     """
 
     # Fetch all posts
-    posts = Post.objects.all()
+    posts = Post.objects.for_cards()
 
     # Retrieve top posts based on view count (ordered in descending order)
-    top_posts = Post.objects.all().order_by('-view_count')[:3]
+    top_posts = site_cache.get_top_posts()
 
     # Retrieve recent posts ordered by last updated
-    recent_posts = Post.objects.all().order_by('-last_updated')[:3]
+    recent_posts = site_cache.get_recent_posts()
 
-    # Fetch the featured post
-    featured_post = Post.objects.filter(is_featured=True)
+    # Fetch the first featured post, if there is one
+    featured_post = site_cache.get_featured_post()
 
     # Initialize the subscription form and set success message to None initially
     subscribe_form = SubscribeForm()
     subscribe_successful = None
-    website_info = None
 
     # Fetch website meta data if it exists
-    if WebSiteMeta.objects.all().exists():
-        website_info = WebSiteMeta.objects.all()[0]
-
-    # If there's a featured posts in database, set it to the first one in the queryset
-    if featured_post:
-        featured_post = featured_post[0]
+    website_info = site_cache.get_website_info()
 
     # Handle subscription form submission
     if request.POST:
@@ -206,10 +198,10 @@ def tag_page(request, slug):
     tag = Tag.objects.get(slug=slug)
 
     # Retrieve top posts with fetched tag ordered by view count
-    top_posts = Post.objects.filter(tags__in=[tag.id]).order_by('-view_count')[:3]
+    top_posts = site_cache.get_top_posts(tag=tag)
 
     # Retrieve recent posts with fetched tag ordered by last updated
-    recent_posts = Post.objects.filter(tags__in=[tag.id]).order_by('-last_updated')[:3]
+    recent_posts = site_cache.get_recent_posts(tag=tag)
     
     # Get all available tags
     tags = Tag.objects.all()
@@ -241,16 +233,16 @@ def author_page(request, slug):
     """
 
     # Fetch the profile of the author based on the slug
-    profile = Profile.objects.get(slug=slug)
+    profile = Profile.objects.select_related('user').get(slug=slug)
 
     # Retrieve top posts by the author, ordered by view count
-    top_posts = Post.objects.filter(author=profile.user).order_by('-view_count')[:2]
+    top_posts = Post.objects.filter(author=profile.user).top(limit=2)
 
     # Retrieve recent posts by the author, ordered by last updated
-    recent_posts = Post.objects.filter(author=profile.user).order_by('-last_updated')[:3]
+    recent_posts = Post.objects.filter(author=profile.user).recent()
 
     # Retrieve top authors, ordered by the number of posts written
-    top_authors = User.objects.annotate(number=Count('post')).order_by('-number')
+    top_authors = User.objects.select_related('profile').annotate(number=Count('post')).order_by('-number')
 
     # Get all profiles for displaying the authors
     profiles = Profile.objects.all()
@@ -271,7 +263,8 @@ def search_posts(request):
     View to handle the search functionality for posts.
 
     Searches posts based on a query parameter ('q') in the GET request.
-    Displays posts whose title or content contains the search query.
+    Displays posts whose title or content matches the search query, ordered by
+    relevance and with a highlighted snippet of the matching content.
 
     Args:
         request: The HTTP request object.
@@ -281,15 +274,10 @@ def search_posts(request):
     """
 
     # Initialize search query to an empty string if no query is provided
-    search_query=''
-    if request.GET.get('q'):
-        search_query = request.GET.get('q')
-    
-    # Perform a search in both title and content of posts, case-insensitive
-    posts = Post.objects.filter(title__icontains=search_query) | Post.objects.filter(content__icontains=search_query)
+    search_query = request.GET.get('q', '').strip()
 
-    # !!!!!!!!!!!!!!! ----REMOVE in production
-    print('Search:',search_query)
+    # Perform a ranked full-text search in both title and content of posts
+    posts = search.search_posts(search_query)
 
     # Context data for rendering the search results page
     context = {'posts':posts, 'search_query':search_query}
@@ -309,11 +297,8 @@ def about(request):
         HttpResponse: The rendered about page with website metadata context.
     """
 
-    website_info = None
-
     # Fetching meta data if exists
-    if WebSiteMeta.objects.all().exists():
-        website_info = WebSiteMeta.objects.all()[0]
+    website_info = site_cache.get_website_info()
 
     # Context data for rendering the search results page
     context = {'website_info':website_info}
@@ -349,46 +334,58 @@ def register_user(request):
     return render(request, 'registration/registration.html', context)
 
 
+@login_required
+@require_http_methods(['POST'])
 def bookmark_post(request, slug):
     """
     View to toggle a bookmark on a post for the current user.
 
+    HTMX requests get only the updated bookmark button instead of the whole post page.
+
     Args:
         request: The HTTP request object.
         slug (str): The slug of the post to be bookmarked.
 
     Returns:
-        HttpResponseRedirect: Redirects back to the post page.
+        HttpResponse: The bookmark button fragment for HTMX requests,
+                      otherwise a redirect back to the post page.
     """
 
-    post = get_object_or_404(Post, id=request.POST.get('post_id'))
-    if post.bookmarks.filter(id=request.user.id).exists():
-        post.bookmarks.remove(request.user) # Remove bookmark if it exists
-    else:
-        post.bookmarks.add(request.user) # Add bookmark if it doesn't exist
+    post = get_object_or_404(Post.objects.only('id', 'slug', 'bookmark_count'), id=request.POST.get('post_id'))
+    is_bookmarked, _ = toggle_reaction('bookmark', post, request.user) # Remove the bookmark if it exists, add it otherwise
+
+    if request.htmx:
+        context = {'post': post, 'is_bookmarked': is_bookmarked}
+        return render(request, 'app/post.html#bookmark_button', context)
 
-    # Context data for rendering the search results page
     return HttpResponseRedirect(reverse('post_page', args=[str(slug)]))
 
 
+@login_required
+@require_http_methods(['POST'])
 def like_post(request, slug):
     """
     View to toggle a like on a post for the current user.
 
+    HTMX requests get only the updated like button with the new number of likes
+    instead of the whole post page.
+
     Args:
         request: The HTTP request object.
         slug (str): The slug of the post to be liked.
 
     Returns:
-        HttpResponseRedirect: Redirects back to the post page.
+        HttpResponse: The like button fragment for HTMX requests,
+                      otherwise a redirect back to the post page.
     """
 
-    post = get_object_or_404(Post, id=request.POST.get('post_id'))
-    if post.likes.filter(id=request.user.id).exists():
-        post.likes.remove(request.user) # Remove like if it exists
-    else:
-        post.likes.add(request.user) # Add like if it doesn't exist
-    
+    post = get_object_or_404(Post.objects.only('id', 'slug', 'like_count'), id=request.POST.get('post_id'))
+    post_is_liked, number_of_likes = toggle_reaction('like', post, request.user) # Remove the like if it exists, add it otherwise
+
+    if request.htmx:
+        context = {'post': post, 'post_is_liked': post_is_liked, 'number_of_likes': number_of_likes}
+        return render(request, 'app/post.html#like_button', context)
+
     return HttpResponseRedirect(reverse('post_page', args=[str(slug)]))
 
 
@@ -396,6 +393,9 @@ def all_bookmarked_posts(request):
     """
     View to display all posts bookmarked by the current user.
 
+    Posts are paginated by cursor; HTMX requests for the next page receive
+    only the list fragment.
+
     Args:
         request: The HTTP request object.
 
@@ -403,10 +403,15 @@ def all_bookmarked_posts(request):
         HttpResponse: The rendered bookmarked posts page.
     """
 
-    bookmarked_posts = Post.objects.filter(bookmarks=request.user)
+    bookmarked_posts = Post.objects.filter(bookmarks=request.user).only('title', 'slug', 'last_updated')
+    page = _get_posts_page(request, bookmarked_posts)
 
     # Context data for rendering the search results page
-    context = {'bookmarked_posts': bookmarked_posts}
+    context = {'bookmarked_posts': page}
+
+    if request.htmx:
+        return render(request, 'app/all_bookmarked_posts.html#post_list', context)
+
     return render(request, 'app/all_bookmarked_posts.html', context)
 
 
@@ -414,6 +419,9 @@ def my_posts(request):
     """
     View to display all posts authored by the current user.
 
+    Posts are paginated by cursor; HTMX requests for the next page receive
+    only the list fragment.
+
     Args:
         request: The HTTP request object.
 
@@ -421,10 +429,15 @@ def my_posts(request):
         HttpResponse: The rendered user posts page.
     """
 
-    all_user_posts = Post.objects.filter(author=request.user)
+    all_user_posts = Post.objects.filter(author=request.user).only('title', 'slug', 'last_updated')
+    page = _get_posts_page(request, all_user_posts)
 
     # Context data for rendering the search results page
-    context = {'all_user_posts': all_user_posts}
+    context = {'all_user_posts': page}
+
+    if request.htmx:
+        return render(request, 'app/my_posts.html#post_list', context)
+
     return render(request, 'app/my_posts.html', context)
 
 
@@ -432,6 +445,9 @@ def all_posts(request):
     """
     View to display all posts.
 
+    Posts are paginated by cursor and loaded without their content; HTMX
+    requests for the next page receive only the list fragment.
+
     Args:
         request: The HTTP request object.
 
@@ -439,14 +455,33 @@ def all_posts(request):
         HttpResponse: The rendered all posts page.
     """
 
-    all_posts = Post.objects.all()
+    all_posts = _get_posts_page(request, Post.objects.for_listing())
 
     # Context data for rendering the search results page
     context = {'all_posts': all_posts}
 
+    if request.htmx:
+        return render(request, 'app/all_posts.html#post_list', context)
+
     return render(request, 'app/all_posts.html', context)
 
 
+def _get_posts_page(request, posts):
+    """
+    Returns the page of posts selected by the 'cursor' query parameter,
+    newest first.
+
+    Raises:
+        Http404: If the cursor is not valid.
+    """
+
+    paginator = KeysetPaginator(posts, ('last_updated', 'id'), settings.POSTS_PAGE_SIZE)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid page cursor.')
+
+
 @login_required
 def transactions_list(request):
     """
@@ -459,8 +494,12 @@ def transactions_list(request):
         queryset=Transaction.objects.filter(user=request.user).select_related('category')
     )
 
-    total_income = transaction_filter.qs.get_total_income()
-    total_expenses = transaction_filter.qs.get_total_expenses()
+    # Without filters the totals are the user's stored running totals
+    if transaction_filter.has_active_filters():
+        summary = transaction_filter.qs.summary()  # one grouped query for both totals
+        total_income, total_expenses = summary['income'], summary['expenses']
+    else:
+        total_income, total_expenses = get_user_totals(request.user)
 
     # Context data for rendering the search results page
     context = {
@@ -483,9 +522,8 @@ def expense_tracker(request):
     Supports HTMX requests for partial page rendering.
     """
 
-    all_transactions = Transaction.objects.all().filter(user=request.user).select_related('category')
-    total_income = all_transactions.get_total_income()
-    total_expenses = all_transactions.get_total_expenses()
+    # Read the user's overall totals from the stored running totals
+    total_income, total_expenses = get_user_totals(request.user)
 
     # Logic for filtering expenses
     transaction_filter = TransactionFilter(
@@ -493,13 +531,15 @@ def expense_tracker(request):
         queryset=Transaction.objects.filter(user=request.user).select_related('category')
     )
 
-    # Handle pagination
-    paginator = Paginator(transaction_filter.qs, settings.PAGE_SIZE)  # Show 5 transactions per page.
-    transaction_page = paginator.page(1) # Show the first page of results.
+    # Handle pagination: the first page, the next pages are loaded by `get_transactions`
+    transaction_page, next_page_url = _get_transactions_page(request, transaction_filter.qs)
 
-    # Filtered totals
-    total_income_filtered = transaction_filter.qs.get_total_income()
-    total_expenses_filtered = transaction_filter.qs.get_total_expenses()
+    # Filtered totals (the overall totals if no filter is applied)
+    if transaction_filter.has_active_filters():
+        summary = transaction_filter.qs.summary()  # one grouped query for both totals
+        total_income_filtered, total_expenses_filtered = summary['income'], summary['expenses']
+    else:
+        total_income_filtered, total_expenses_filtered = total_income, total_expenses
 
     # Context data for rendering the search results page
     context = {
@@ -509,7 +549,8 @@ def expense_tracker(request):
         'total_income': total_income,
         'total_expenses': total_expenses,
         'net_income': total_income - total_expenses,
-        'transactions': transaction_page
+        'transactions': transaction_page,
+        'next_page_url': next_page_url,
     }
 
     if request.htmx:
@@ -524,17 +565,13 @@ def create_transaction(request):
     Creates a new transaction for the user with a form that dynamically loads currency options.
     """
 
-    # Fetch available currencies from an API.
-    api_data = get_exchange_rates()
-    if api_data:
-        currencies = [(code, code) for code in api_data.keys()]  # Dynamically set currency choices
-    else:
-        currencies = []
+    # Currencies of the current exchange rate table, built once per table version
+    catalogue = get_currency_catalogue()
 
     if request.method == 'POST':
 
         # Initialize the form with posted data and dynamic currency choices
-        form = TransactionForm(request.POST, currencies=currencies)
+        form = TransactionForm(request.POST, catalogue=catalogue)
 
         # Check if form data is valid
         if form.is_valid():
@@ -544,7 +581,7 @@ def create_transaction(request):
             transaction.user = request.user # Associate transaction with the current user
 
             # Convert transaction amount to EUR and save it to `amount_in_usd` field
-            transaction.amount_in_usd = convert_to_EUR(transaction.amount, transaction.currency)
+            transaction.amount_in_usd = convert_to_EUR(transaction.amount, transaction.currency, transaction.date)
             transaction.save()  # Save the transaction to the database
 
             # Render a success message on successful transaction creation
@@ -558,29 +595,57 @@ def create_transaction(request):
 
     else:
         # For GET requests, initialize an empty form with dynamic currency choices
-        form = TransactionForm(currencies=currencies)
+        form = TransactionForm(catalogue=catalogue)
 
     context = {'form': form}
     return render(request, 'app/partials/create-transaction.html', context)
 
 
+@login_required
+def import_transactions(request):
+    """
+    Imports the current user's transactions from an uploaded CSV file or OFX bank statement.
+
+    The file is read as a stream and imported in chunks (see `app/imports.py`);
+    the page reports the created, already imported and rejected rows.
+    """
+
+    if request.method == 'POST':
+        form = TransactionImportForm(request.POST, request.FILES)
+
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            import_format = form.cleaned_data['format'] or imports.guess_format(upload.name)
+            importer = imports.TransactionImporter(request.user)
+
+            try:
+                rows = imports.read_file(
+                    imports.open_text(upload.file), import_format, form.cleaned_data['default_category'],
+                )
+                report = importer.run(rows)
+            except (UnicodeDecodeError, csv.Error) as error:
+                form.add_error('file', f'Could not read the file, nothing was imported: {error}')
+            else:
+                context = {'report': report}
+                return render(request, 'app/partials/import-transactions-report.html', context)
+    else:
+        form = TransactionImportForm()
+
+    context = {'form': form}
+    return render(request, 'app/partials/import-transactions.html', context)
+
 @login_required
 def update_transaction(request, pk):
     """
     Handles the update of an existing transaction for the current user.
 
-    This view fetches available currencies from an API to populate choices in the transaction form.
-    If the form is valid and either 'amount' or 'currency' has changed, it recalculates the 
+    The currency choices of the form come from the catalogue of the current exchange rate table.
+    If the form is valid and 'amount', 'currency' or 'date' has changed, it recalculates the
     `amount_in_usd` before saving. If invalid, it re-renders the form with error messages.
     """
  
-    # Fetch available currencies from an external API
-    api_data = get_exchange_rates()
-    if api_data:
-        currencies = [(code, code) for code in api_data.keys()] # Default to empty list if API fails
-    else:
-        print('API IS DOWN')
-        currencies = []
+    # Currencies of the current exchange rate table, built once per table version
+    catalogue = get_currency_catalogue()
 
     # Retrieve the transaction to be updated, ensuring it belongs to the current user
     transaction = get_object_or_404(Transaction, pk=pk, user=request.user)
@@ -588,15 +653,15 @@ def update_transaction(request, pk):
     if request.method == 'POST':
 
         # Initialize the form with POST data, currency choices, and the existing transaction instance
-        form = TransactionForm(request.POST, currencies=currencies, instance=transaction)
+        form = TransactionForm(request.POST, catalogue=catalogue, instance=transaction)
 
         # Check if the form data is valid
         if form.is_valid():
             transaction = form.save(commit=False) # Prepare to save but hold off to allow further changes
 
-            # Recalculate `amount_in_usd` if either 'amount' or 'currency' has changed
-            if form.has_changed() and ('amount' in form.changed_data or 'currency' in form.changed_data):
-                transaction.amount_in_usd = convert_to_EUR(transaction.amount, transaction.currency)
+            # Recalculate `amount_in_usd` if 'amount', 'currency' or 'date' has changed
+            if form.has_changed() and {'amount', 'currency', 'date'} & set(form.changed_data):
+                transaction.amount_in_usd = convert_to_EUR(transaction.amount, transaction.currency, transaction.date)
 
             transaction.save()  # Save the updated transaction to the database
 
@@ -610,12 +675,11 @@ def update_transaction(request, pk):
             return retarget(response, '#transaction-block')
     else:
         # For GET requests, initialize a form with the existing transaction instance and currency choices
-        form = TransactionForm(currencies=currencies)
-
+        form = TransactionForm(instance=transaction, catalogue=catalogue)
 
     # Render the update transaction form with the existing transaction data
     context = {
-        'form': TransactionForm(instance=transaction, currencies=currencies),
+        'form': form,
         'transaction': transaction,
     }
     return render(request, 'app/update-transaction.html', context)
@@ -651,27 +715,27 @@ def get_transactions(request):
     Fetch and paginate transactions for the current user, rendering the results.
 
     This view applies filtering and pagination to the user's transactions based on
-    query parameters. It returns the specified page of filtered transactions, allowing
-    for dynamic reloading and rendering in the expense tracker interface.
+    query parameters. It returns the page of filtered transactions after the given
+    cursor, allowing for dynamic reloading and rendering in the expense tracker interface.
     """
 
-    time.sleep(10)  # Simulate a delay of 1 second
+    # Opt-in artificial delay to try out the infinite-scroll loading indicator in development
+    if settings.DEBUG and settings.TRANSACTIONS_DEBUG_DELAY:
+        time.sleep(settings.TRANSACTIONS_DEBUG_DELAY)
 
-    # Get the requested page number from query parameters; default to page 1 if unspecified
-    page = request.GET.get('page', 1)
-    
     # Apply filtering to transactions based on user and query parameters
     transaction_filter = TransactionFilter(
         request.GET,
         queryset=Transaction.objects.filter(user=request.user).select_related('category')
     )
 
-    # Paginate the filtered queryset with the defined page size
-    paginator = Paginator(transaction_filter.qs, settings.PAGE_SIZE)  # Show 5 transactions per page.
+    # Get the page after the 'cursor' query parameter, without counting the filtered transactions
+    transaction_page, next_page_url = _get_transactions_page(request, transaction_filter.qs)
 
     # Context dictionary for rendering the template with paginated transactions
     context = {
-        'transactions': paginator.page(page)  # Get the transactions for the specified page
+        'transactions': transaction_page,
+        'next_page_url': next_page_url,
     }
 
     # Render the filtered and paginated transactions to a specific section in the template
@@ -682,69 +746,108 @@ def get_transactions(request):
     )
 
 
-@login_required
-def view_statistic(request):
+def _get_transactions_page(request, transactions):
     """
-    Display a summary of financial statistics for the current user.
+    Returns the page of transactions selected by the 'cursor' query parameter,
+    newest first, and the URL of the next page.
+
+    The next page URL keeps the filter parameters of the request, so infinite
+    scrolling continues within the filtered transactions.
 
-    This view calculates and aggregates data on income, expenses, spending per category,
-    and daily expenses. The results are then passed to the context
-    for rendering on the statistics page.
+    Raises:
+        Http404: If the cursor is not valid.
     """
 
-    # Calculate the date 30 days ago from today
-    last_30_days = datetime.date.today() - datetime.timedelta(days=30)
+    paginator = KeysetPaginator(transactions, ('date', 'id'), settings.PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid page cursor.')
 
-    # Query for total expenses over the last 30 days
-    expense_data_last_30_days = Transaction.objects.filter(date__gt=last_30_days, type='expense', user=request.user)
-    last_month_expenses = expense_data_last_30_days.aggregate(Sum('amount_in_usd'))
+    next_page_url = None
+    if page.has_next():
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_page_url = f"{reverse('get-transactions')}?{params.urlencode()}"
 
-    # Query for total income over the last 30 days
-    income_data_last_30_days = Transaction.objects.filter(date__gt=last_30_days, type='income', user=request.user)
-    last_month_income = income_data_last_30_days.aggregate(Sum('amount_in_usd'))
+    return page, next_page_url
 
-    # Aggregate expenses by category over the last 30 days
-    category_names = []
-    category_sums = []
 
-    expenses_by_category_last_30_days = (
-        Transaction.objects
-        .filter(date__gt=last_30_days, type='expense', user=request.user)
-        .values('category').order_by('category')
-        .annotate(sum=Sum('amount_in_usd'))
-    )
+@login_required
+@require_http_methods(['GET'])
+def export_transactions(request):
+    """
+    Stream the current user's transactions as a CSV or NDJSON file.
 
-    # Retrieve category names and corresponding sums
-    for expense in expenses_by_category_last_30_days:
-        category_name = Category.objects.get(id=expense['category']).name
-        category_names.append(category_name)
-        category_sums.append(expense['sum'])
-    
-    # Aggregate expenses by day over the last 30 days
-    last_7_days_dates = []
-    last_7_days_sums = []
-    expenses_by_day_last_30_days = (
-        Transaction.objects
-        .filter(date__gt=last_30_days, type='expense', user=request.user)
-        .values('date')
-        .order_by('date')
-        .annotate(sum=Sum('amount_in_usd'))
-    )
+    Takes the same query parameters as the expense tracker filter, plus 'format'
+    ('csv', the default, or 'ndjson'). The rows are read and encoded chunk by
+    chunk while the response is sent, so the export runs in constant memory.
+    """
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return HttpResponseBadRequest(f'Unsupported export format: {export_format}.')
 
-    # Retrieve dates and corresponding sums for daily expenses over the last 30 days
-    for expense in expenses_by_day_last_30_days:
-        last_7_days_dates.append(expense['date'])
-        last_7_days_sums.append(expense['sum'])
+    # Apply the same filters as the expense tracker
+    transaction_filter = TransactionFilter(request.GET, queryset=Transaction.objects.filter(user=request.user))
+    if not transaction_filter.is_valid():
+        return HttpResponseBadRequest('Invalid filter parameters.')
+
+    content_type, extension = exports.FORMATS[export_format]
+    response = StreamingHttpResponse(exports.stream(transaction_filter.qs, export_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="transactions.{extension}"'
+    return response
+
+@login_required
+def view_statistic(request):
+    """
+    Display the financial statistics page for the current user.
+
+    The page itself runs no statistics queries: the charts and totals are loaded
+    asynchronously from `statistic_data` for the selected date window.
+    """
 
-    # Compile data into the context dictionary for template rendering
     context = {
-        'category_names': category_names,
-        'category_sums': category_sums,
-        'last_7_days_dates': last_7_days_dates,
-        'last_7_days_sums': last_7_days_sums,
-        'last_month_expenses' : last_month_expenses,
-        'last_month_income' : last_month_income,
+        'windows': statistics.WINDOW_CHOICES,
+        'default_window': statistics.DEFAULT_WINDOW,
     }
-    
-    # Render the statistics page with the aggregated data
+
+    # Render the statistics page; the data is fetched by the page's script
     return render(request, 'app/statistic.html', context)
+
+
+@login_required
+def statistic_data(request):
+    """
+    Return the statistics of the current user as JSON.
+
+    The window is selected with the 'days' query parameter (7, 30, 90 or 365) or
+    with a custom 'start'/'end' date range. The payload contains income and
+    expense totals, expenses per category and zero-filled daily expenses, all
+    computed from a single query over the user's `DailyTransactionRollup` rows.
+    """
+
+    try:
+        start, end = statistics.parse_window(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse(statistics.compute_statistics(request.user, start, end))
+
+
+@staff_member_required
+def performance_stats(request):
+    """
+    Return the request metrics of this worker process as JSON, for staff users only.
+
+    The payload contains the aggregated time, query and cache measurements and
+    the response time histogram of every view (see `app/instrumentation.py`),
+    the hit and miss counters of the site cache and the exchange rate fetch statistics.
+    """
+
+    return JsonResponse({
+        'views': instrumentation.get_view_stats(),
+        'site_cache': site_cache.get_stats(),
+        'exchange_rates': get_fetch_stats(),
+    })
+
@@ -70,6 +70,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
+    "app.instrumentation.RequestMetricsMiddleware",
 ]
 
 ROOT_URLCONF = "finance_blogapp.urls"
@@ -107,6 +108,13 @@ DATABASES = {
     }
 }
 
+# The buffered view counters, reaction sets, comment threads and exchange rates are shared by
+# all worker processes through this cache, so production needs a shared backend, e.g.
+# CACHE_URL=redis://host:6379/0 (`manage.py check --deploy` fails on a per-process cache)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -160,6 +168,58 @@ DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
 LOGIN_REDIRECT_URL = '/'
 PAGE_SIZE = 5
+POSTS_PAGE_SIZE = 12
+
+# Buffered post view counter: seconds between flushes and max posts held before an early flush
+VIEW_COUNT_FLUSH_INTERVAL = 60
+VIEW_COUNT_MAX_BUFFER = 100
+
+# Seconds the cached sidebar blocks (top/recent/featured posts, site meta) are kept
+SITE_CACHE_TIMEOUT = 300
+
+# Seconds the cached sets of posts a user liked or bookmarked are kept
+REACTIONS_CACHE_TIMEOUT = 300
+
+# Seconds the rendered comment thread of a post is kept
+COMMENT_THREAD_CACHE_TIMEOUT = 300
+
+# Maximum number of posts returned by the search page
+SEARCH_RESULTS_LIMIT = 20
+
+# Exchange rates: seconds before the cached table is refreshed in the background,
+# hard timeout of the API call, and how long a refresh lock is held (also the back-off after a failure)
+EXCHANGE_RATES_TTL = 3600
+EXCHANGE_RATES_REQUEST_TIMEOUT = 5
+EXCHANGE_RATES_LOCK_TIMEOUT = 60
+
+# Seconds between refreshes of the `prefetch_exchange_rates --loop` command (keep below the TTL).
+# Once the prefetcher runs, requests can be kept from ever calling the API.
+EXCHANGE_RATES_PREFETCH_INTERVAL = 1800
+EXCHANGE_RATES_REFRESH_ON_REQUEST = env.bool('EXCHANGE_RATES_REFRESH_ON_REQUEST', default=True)
+
+# Seconds the rates read from the database snapshot stay cached before the snapshot is read again
+EXCHANGE_RATES_SNAPSHOT_TIMEOUT = 300
+
+# Seconds of artificial delay added to each infinite-scroll page of transactions (only with DEBUG on)
+TRANSACTIONS_DEBUG_DELAY = env.float('TRANSACTIONS_DEBUG_DELAY', default=0)
+
+
+# Rows read from the database and encoded per chunk of a streamed transaction export
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows converted and inserted per chunk of a bulk transaction import
+IMPORT_CHUNK_SIZE = 1000
+
+# Per-request timing, query and cache metrics (see `app/instrumentation.py`): on/off, the
+# Server-Timing response header, and the response time (ms) above which requests are logged as warnings
+REQUEST_METRICS_ENABLED = env.bool('REQUEST_METRICS_ENABLED', default=True)
+REQUEST_METRICS_SERVER_TIMING = env.bool('REQUEST_METRICS_SERVER_TIMING', default=True)
+REQUEST_METRICS_SLOW_MS = 500
+
+# Query checks of the request metrics: the time (ms) above which a query is logged with the code
+# that ran it, and the number of SELECTs of the same shape in one request reported as an N+1 pattern
+REQUEST_METRICS_SLOW_QUERY_MS = 100
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = 5
 
 
 # Default primary key field type